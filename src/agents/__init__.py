@@ -1,4 +1,13 @@
-from .orchestrator import AgentOrchestrator
-from .llm_module import LLMModule
-
 __all__ = ['AgentOrchestrator', 'LLMModule']
+
+
+def __getattr__(name):
+    # Imported on first use: agents.fake_ollama must be importable before config
+    # (the pipeline benchmark sets OLLAMA_HOST from the fake server's port)
+    if name == 'AgentOrchestrator':
+        from .orchestrator import AgentOrchestrator
+        return AgentOrchestrator
+    if name == 'LLMModule':
+        from .llm_module import LLMModule
+        return LLMModule
+    raise AttributeError(f"module 'agents' has no attribute {name!r}")
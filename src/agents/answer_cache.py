@@ -0,0 +1,185 @@
+"""
+Semantic Answer Cache
+
+Near-duplicate questions ("c'est quoi la loi d'Ohm", "explique la loi d'Ohm")
+are answered from a cache instead of paying RAG + LLM + TTS again:
+- Entries are keyed by subject and query embedding (cosine >= threshold)
+- Each entry stores the generated text, the RAG payload and the AudioChunks
+- Entries are tied to the subject's knowledge-base version, so a re-ingest
+  invalidates them automatically
+- LRU eviction bounded by entry count and total audio bytes
+"""
+
+import sys
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_MB, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_S
+
+
+@dataclass
+class CachedAnswer:
+    """A cached turn: everything needed to replay process_stream + audio"""
+    key: str
+    subject: str
+    query: str
+    embedding: np.ndarray
+    text: str
+    rag: dict
+    index_version: int
+    audio_chunks: list = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    hits: int = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.text.encode('utf-8')) + sum(len(c.audio_bytes) for c in self.audio_chunks)
+
+
+class SemanticAnswerCache:
+    """
+    Thread-safe semantic cache of complete answers.
+
+    Usage:
+        entry, similarity = cache.lookup(subject, embedding, index_version)
+        key = cache.store(subject, query, embedding, text, rag, index_version)
+        cache.attach_audio(key, audio_chunks)
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 max_mb: float = ANSWER_CACHE_MAX_MB, ttl_s: float = ANSWER_CACHE_TTL_S):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_s = ttl_s
+
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()  # LRU order
+        self._matrices: Dict[str, Tuple[List[str], np.ndarray]] = {}      # subject -> (keys, normalized embeddings)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _subject_matrix(self, subject: str) -> Tuple[List[str], np.ndarray]:
+        """Stacked embeddings of a subject's entries (rebuilt lazily after changes)"""
+        cached = self._matrices.get(subject)
+        if cached is None:
+            keys = [k for k, e in self._entries.items() if e.subject == subject]
+            matrix = np.stack([self._entries[k].embedding for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+            cached = self._matrices[subject] = (keys, matrix)
+        return cached
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size_bytes
+            self._matrices.pop(entry.subject, None)
+
+    def lookup(self, subject: str, embedding, index_version: int) -> Tuple[Optional[CachedAnswer], float]:
+        """
+        Find the closest cached answer for this subject.
+
+        Returns:
+            (entry, similarity) on a hit, (None, best_similarity) on a miss
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            keys, matrix = self._subject_matrix(subject)
+            if not keys:
+                self.misses += 1
+                return None, 0.0
+
+            similarities = matrix @ query
+            for row in np.argsort(-similarities):
+                similarity = float(similarities[row])
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[keys[row]]
+                if entry.index_version != index_version or now - entry.created > self.ttl_s:
+                    # Knowledge base re-ingested or entry too old
+                    self._remove(entry.key)
+                    self.invalidations += 1
+                    continue
+                entry.hits += 1
+                self._entries.move_to_end(entry.key)
+                self.hits += 1
+                return entry, similarity
+
+            self.misses += 1
+            return None, float(similarities.max())
+
+    def store(self, subject: str, query: str, embedding, text: str, rag: dict, index_version: int) -> str:
+        """Cache a freshly generated answer, returns its key (for attach_audio)"""
+        entry = CachedAnswer(
+            key=uuid.uuid4().hex,
+            subject=subject,
+            query=query,
+            embedding=self._normalize(embedding),
+            text=text,
+            rag=rag,
+            index_version=index_version,
+        )
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._bytes += entry.size_bytes
+            self._matrices.pop(subject, None)
+            self._evict()
+        return entry.key
+
+    def attach_audio(self, key: str, audio_chunks: list):
+        """Attach the synthesized AudioChunks of an answer"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            self._bytes -= entry.size_bytes
+            entry.audio_chunks = list(audio_chunks)
+            self._bytes += entry.size_bytes
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until both limits are met"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def invalidate(self, subject: str = None):
+        """Drop every entry of a subject (or the whole cache)"""
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if subject is None or e.subject == subject]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def get_stats(self) -> dict:
+        """Hit-rate metrics"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(self._bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
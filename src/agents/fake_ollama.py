@@ -0,0 +1,324 @@
+"""
+Fake Ollama Server
+
+Offline stand-in for Ollama, so the whole pipeline can be tested and
+benchmarked without real models. Speaks enough of the HTTP API for
+LLMClient, the residency manager and the `ollama` package:
+- POST /api/chat      scripted answer streamed as NDJSON at a fixed token rate
+- POST /api/generate  empty prompt = load/unload (keep_alive=0), else scripted
+- GET  /api/ps, /api/tags, /api/version
+
+Models are "loaded" on first use (load_delay_s, reported as load_duration)
+and unloaded after keep_alive, so cold starts can be simulated too.
+
+Usage:
+    python src/agents/fake_ollama.py --port 11435 --tps 40
+    OLLAMA_HOST=http://127.0.0.1:11435 python src/main.py
+
+    # or in-process (tests, benchmarks)
+    server = FakeOllamaServer(tokens_per_second=50)
+    host = server.start_in_thread()
+"""
+
+import re
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+DEFAULT_RESPONSE = (
+    "Bonne question ! Voici l'essentiel. La réponse tient en quelques phrases courtes. "
+    "Retiens bien la formule, puis entraîne-toi sur un exemple."
+)
+ROUTER_RESPONSE = "GENERAL"
+DEFAULT_MODELS = {"qwen2.5:1.5b": 1900, "llama3.2:1b": 1700, "gemma:2b": 3000}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _parse_keep_alive(value, default_s: float) -> float:
+    """Ollama keep_alive: seconds (number) or duration string ("5m", "30s", "1h")"""
+    if value is None:
+        return default_s
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*', str(value))
+    if not match:
+        return default_s
+    number, unit = float(match.group(1)), match.group(2)
+    return number * {"": 1, "s": 1, "m": 60, "h": 3600}[unit]
+
+
+class FakeOllamaServer:
+    """
+    Scripted Ollama-compatible HTTP server.
+
+    Args:
+        responses: [(substring, answer)] matched against the last user message
+        default_response: answer when nothing matches
+        tokens_per_second: streaming rate
+        first_token_delay_s: prefill time before the first token
+        load_delay_s: extra delay when the model is not resident
+        models: {model_name: size_mb} served by /api/tags
+        model_overrides: per-model {"tokens_per_second", "first_token_delay_s", "load_delay_s"}
+    """
+
+    def __init__(self, responses: List[Tuple[str, str]] = None, default_response: str = DEFAULT_RESPONSE,
+                 tokens_per_second: float = 30.0, first_token_delay_s: float = 0.05, load_delay_s: float = 0.0,
+                 keep_alive_s: float = 300.0, models: Dict[str, int] = None, model_overrides: Dict[str, dict] = None,
+                 host: str = "127.0.0.1", port: int = 11435):
+        self.responses = responses or []
+        self.default_response = default_response
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay_s = first_token_delay_s
+        self.load_delay_s = load_delay_s
+        self.keep_alive_s = keep_alive_s
+        self.models = dict(DEFAULT_MODELS if models is None else models)
+        self.model_overrides = model_overrides or {}
+        self.host = host
+        self.port = port
+
+        self._loaded: Dict[str, float] = {}  # model -> expiry timestamp
+        self.requests = 0
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    # ---- Scripting ----
+
+    def _setting(self, model: str, name: str):
+        return self.model_overrides.get(model, {}).get(name, getattr(self, name))
+
+    def _answer(self, messages: List[dict]) -> str:
+        system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        for pattern, answer in self.responses:
+            if pattern.lower() in user.lower():
+                return answer
+        if "classificateur" in system.lower():
+            return ROUTER_RESPONSE
+        return self.default_response
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        return [t for t in re.split(r'(?<=\s)(?=\S)', text) if t]
+
+    async def _load(self, model: str, keep_alive) -> float:
+        """Simulate model residency, returns load time in seconds"""
+        now = time.time()
+        load_s = 0.0
+        if self._loaded.get(model, 0) < now:
+            load_s = self._setting(model, "load_delay_s")
+            if load_s:
+                await asyncio.sleep(load_s)
+        ttl = _parse_keep_alive(keep_alive, self.keep_alive_s)
+        if ttl == 0:
+            self._loaded.pop(model, None)
+        else:
+            self._loaded[model] = float("inf") if ttl < 0 else time.time() + ttl
+        return load_s
+
+    def _final_chunk(self, model: str, started: float, load_s: float, prompt: str, n_tokens: int, chat: bool) -> dict:
+        total_ns = int((time.time() - started) * 1e9)
+        chunk = {
+            "model": model,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": total_ns,
+            "load_duration": int(load_s * 1e9),
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "prompt_eval_duration": int(self._setting(model, "first_token_delay_s") * 1e9),
+            "eval_count": n_tokens,
+            "eval_duration": max(0, total_ns - int(load_s * 1e9)),
+        }
+        if chat:
+            chunk["message"] = {"role": "assistant", "content": ""}
+        else:
+            chunk["response"] = ""
+        return chunk
+
+    # ---- Handlers ----
+
+    def _check_model(self, model: str):
+        if not model:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "model is required"}),
+                                     content_type="application/json")
+        # Any model name is "pulled": register it with a default size
+        self.models.setdefault(model, 2000)
+
+    async def _stream(self, request, model: str, text: str, prompt: str, keep_alive, chat: bool):
+        started = time.time()
+        load_s = await self._load(model, keep_alive)
+        tokens = self._tokens(text)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        delay = 1.0 / self._setting(model, "tokens_per_second")
+        try:
+            await response.prepare(request)
+            await asyncio.sleep(self._setting(model, "first_token_delay_s"))
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(delay)
+                chunk = {"model": model, "created_at": _now(), "done": False}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": token}
+                else:
+                    chunk["response"] = token
+                await response.write((json.dumps(chunk) + "\n").encode("utf-8"))
+            final = self._final_chunk(model, started, load_s, prompt, len(tokens), chat)
+            await response.write((json.dumps(final) + "\n").encode("utf-8"))
+            await response.write_eof()
+        except ConnectionResetError:
+            # Client cancelled the stream (like Ollama, stop generating)
+            pass
+        return response
+
+    async def _complete(self, model: str, text: str, prompt: str, keep_alive, chat: bool) -> web.Response:
+        started = time.time()
+        load_s = await self._load(model, keep_alive)
+        tokens = self._tokens(text)
+        if tokens:
+            await asyncio.sleep(self._setting(model, "first_token_delay_s")
+                                + (len(tokens) - 1) / self._setting(model, "tokens_per_second"))
+        body = self._final_chunk(model, started, load_s, prompt, len(tokens), chat)
+        if chat:
+            body["message"]["content"] = text
+        else:
+            body["response"] = text
+        return web.json_response(body)
+
+    async def handle_chat(self, request):
+        payload = await request.json()
+        model = payload.get("model", "")
+        self._check_model(model)
+        self.requests += 1
+        messages = payload.get("messages", [])
+        text = self._answer(messages)
+        prompt = " ".join(m.get("content", "") for m in messages)
+        if payload.get("stream", True):
+            return await self._stream(request, model, text, prompt, payload.get("keep_alive"), chat=True)
+        return await self._complete(model, text, prompt, payload.get("keep_alive"), chat=True)
+
+    async def handle_generate(self, request):
+        payload = await request.json()
+        model = payload.get("model", "")
+        self._check_model(model)
+        prompt = payload.get("prompt", "")
+        if not prompt:
+            # Load / unload only
+            load_s = await self._load(model, payload.get("keep_alive"))
+            body = self._final_chunk(model, time.time() - load_s, load_s, "", 0, chat=False)
+            body["done_reason"] = "unload" if model not in self._loaded else "load"
+            return web.json_response(body)
+        self.requests += 1
+        text = self._answer([{"role": "user", "content": prompt}])
+        if payload.get("stream", True):
+            return await self._stream(request, model, text, prompt, payload.get("keep_alive"), chat=False)
+        return await self._complete(model, text, prompt, payload.get("keep_alive"), chat=False)
+
+    async def handle_ps(self, request):
+        now = time.time()
+        models = []
+        for model, expiry in list(self._loaded.items()):
+            if expiry < now:
+                del self._loaded[model]
+                continue
+            size = self.models.get(model, 0) * 1024 * 1024
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=min(expiry - now, 10 ** 8))
+            models.append({"name": model, "model": model, "size": size, "size_vram": 0,
+                           "expires_at": expires_at.isoformat()})
+        return web.json_response({"models": models})
+
+    async def handle_tags(self, request):
+        return web.json_response({"models": [
+            {"name": m, "model": m, "size": mb * 1024 * 1024, "modified_at": _now()} for m, mb in self.models.items()
+        ]})
+
+    async def handle_version(self, request):
+        return web.json_response({"version": "0.0.0-fake"})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_post("/api/generate", self.handle_generate)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/api/version", self.handle_version)
+        return app
+
+    # ---- Lifecycle ----
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def run(self):
+        """Serve forever (blocking)"""
+        web.run_app(self.make_app(), host=self.host, port=self.port, print=None)
+
+    def start_in_thread(self) -> str:
+        """Serve from a daemon thread, returns the base URL once listening"""
+        ready = threading.Event()
+
+        def _serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.make_app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            if self.port == 0:
+                self.port = self._runner.addresses[0][1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_serve, daemon=True, name="fake-ollama")
+        self._thread.start()
+        ready.wait(timeout=10)
+        return self.url
+
+    def stop(self):
+        """Stop a server started with start_in_thread()"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tps", type=float, default=30.0, help="Tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Seconds to 'load' a cold model")
+    parser.add_argument("--script", type=str, help='JSON file: {"responses": [[substring, answer], ...], "default": "..."}')
+
+    args = parser.parse_args()
+    responses, default = [], DEFAULT_RESPONSE
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+        responses = [tuple(r) for r in script.get("responses", [])]
+        default = script.get("default", default)
+
+    server = FakeOllamaServer(responses=responses, default_response=default, tokens_per_second=args.tps,
+                              first_token_delay_s=args.first_token_delay, load_delay_s=args.load_delay,
+                              host=args.host, port=args.port)
+    print(f"Fake Ollama listening on {server.url} ({args.tps} tok/s)")
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Async LLM Client (Ollama HTTP API)
+
+Replaces the synchronous module-level `ollama.chat` calls:
+- AsyncLLMClient: aiohttp, one pooled session per event loop (keep-alive
+  connections), connect/read timeouts, optional first-token timeout,
+  cancellation by cancelling the awaiting task
+- BlockingLLMClient: the same client driven from a background event loop,
+  for synchronous callers (process_stream); streams can be cancelled
+- Structured errors (LLMError and subclasses) instead of "Error: ..." tokens
+
+Works against a real Ollama or the offline stand-in in agents/fake_ollama.py.
+"""
+
+import sys
+import json
+import queue
+import asyncio
+import threading
+import weakref
+import concurrent.futures
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import OLLAMA_HOST, LLM_CONNECT_TIMEOUT_S, LLM_READ_TIMEOUT_S, LLM_MAX_CONNECTIONS
+
+
+# ---- Errors ----
+
+class LLMError(Exception):
+    """Base class for LLM client errors"""
+
+    def __init__(self, message: str, model: str = None, status: int = None):
+        super().__init__(message)
+        self.model = model
+        self.status = status
+
+    def to_dict(self) -> dict:
+        return {"type": type(self).__name__, "message": str(self), "model": self.model, "status": self.status}
+
+
+class LLMConnectionError(LLMError):
+    """Ollama is unreachable"""
+
+
+class LLMTimeoutError(LLMError):
+    """Connect, read or first-token timeout"""
+
+
+class LLMModelNotFoundError(LLMError):
+    """The model is not pulled on the server"""
+
+
+class LLMResponseError(LLMError):
+    """The server answered with an error"""
+
+
+class LLMCancelledError(LLMError):
+    """The request was cancelled by the caller"""
+
+
+# ---- Async client ----
+
+class AsyncLLMClient:
+    """
+    Pooled async client for the Ollama HTTP API.
+
+    One aiohttp session (and connection pool) is kept per event loop, so the
+    same client object can be shared by the server loop and the background
+    loop of BlockingLLMClient.
+    """
+
+    def __init__(self, host: str = OLLAMA_HOST, max_connections: int = LLM_MAX_CONNECTIONS,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT_S, read_timeout: float = LLM_READ_TIMEOUT_S):
+        self.host = host.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+    def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close the session of the current event loop"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @staticmethod
+    def _raise_for_status(status: int, body: str, model: str):
+        try:
+            message = json.loads(body).get("error", body)
+        except ValueError:
+            message = body
+        if status == 404:
+            raise LLMModelNotFoundError(message, model=model, status=status)
+        raise LLMResponseError(message, model=model, status=status)
+
+    async def _post_json(self, path: str, payload: dict, model: str = None) -> dict:
+        try:
+            async with self._session().post(f"{self.host}{path}", json=payload) as response:
+                body = await response.text()
+                if response.status != 200:
+                    self._raise_for_status(response.status, body, model)
+                return json.loads(body) if body else {}
+        except LLMError:
+            raise
+        except asyncio.TimeoutError as e:
+            raise LLMTimeoutError(f"Timeout on {path}", model=model) from e
+        except aiohttp.ClientConnectionError as e:
+            raise LLMConnectionError(f"Cannot reach {self.host}: {e}", model=model) from e
+        except aiohttp.ClientError as e:  # payload, redirect, ... errors
+            raise LLMConnectionError(f"Request to {self.host}{path} failed: {e}", model=model) from e
+        except ValueError as e:  # a 200 reply that is not JSON
+            raise LLMResponseError(f"Invalid JSON from {path}: {e}", model=model) from e
+
+    async def chat_stream(self, model: str, messages: List[dict], options: dict = None, keep_alive=None,
+                          first_token_timeout: float = None) -> AsyncIterator[dict]:
+        """
+        Stream /api/chat chunks (dicts as sent by Ollama, last one has done=True).
+
+        Args:
+            first_token_timeout: fail with LLMTimeoutError if the first chunk
+                takes longer than this (model load + prefill)
+        """
+        payload = {"model": model, "messages": messages, "stream": True}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + first_token_timeout if first_token_timeout is not None else None
+
+        async def _until_deadline(awaitable):
+            # Ollama only sends headers once the model is loaded, so the deadline covers both
+            try:
+                return await asyncio.wait_for(awaitable, max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError as e:
+                raise LLMTimeoutError(f"No first token within {first_token_timeout:.1f}s", model=model) from e
+
+        try:
+            request = self._session().post(f"{self.host}/api/chat", json=payload)
+            response = await (_until_deadline(request) if deadline is not None else request)
+            async with response:
+                if response.status != 200:
+                    self._raise_for_status(response.status, await response.text(), model)
+
+                waiting_first = deadline is not None
+                while True:
+                    if waiting_first:
+                        line = await _until_deadline(response.content.readline())
+                        waiting_first = False
+                    else:
+                        line = await response.content.readline()
+                    if not line:
+                        break
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise LLMResponseError(chunk["error"], model=model)
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+        except LLMError:
+            raise
+        except asyncio.TimeoutError as e:
+            raise LLMTimeoutError("Read timeout while streaming", model=model) from e
+        except aiohttp.ClientConnectionError as e:
+            raise LLMConnectionError(f"Cannot reach {self.host}: {e}", model=model) from e
+        except aiohttp.ClientError as e:
+            raise LLMConnectionError(f"Stream from {self.host} failed: {e}", model=model) from e
+        except ValueError as e:
+            raise LLMResponseError(f"Invalid JSON chunk: {e}", model=model) from e
+
+    async def chat(self, model: str, messages: List[dict], options: dict = None, keep_alive=None) -> dict:
+        """Non-streaming /api/chat"""
+        payload = {"model": model, "messages": messages, "stream": False}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return await self._post_json("/api/chat", payload, model)
+
+    async def generate(self, model: str, prompt: str = "", keep_alive=None) -> dict:
+        """Non-streaming /api/generate (an empty prompt just loads/unloads the model)"""
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return await self._post_json("/api/generate", payload, model)
+
+    async def ps(self) -> dict:
+        """Models currently loaded (/api/ps)"""
+        try:
+            async with self._session().get(f"{self.host}/api/ps") as response:
+                body = await response.text()
+                if response.status != 200:
+                    self._raise_for_status(response.status, body, None)
+                return json.loads(body)
+        except LLMError:
+            raise
+        except asyncio.TimeoutError as e:
+            raise LLMTimeoutError("Timeout on /api/ps") from e
+        except aiohttp.ClientConnectionError as e:
+            raise LLMConnectionError(f"Cannot reach {self.host}: {e}") from e
+        except aiohttp.ClientError as e:
+            raise LLMConnectionError(f"Request to {self.host}/api/ps failed: {e}") from e
+        except ValueError as e:
+            raise LLMResponseError(f"Invalid JSON from /api/ps: {e}") from e
+
+
+# ---- Blocking bridge ----
+
+class _LoopThread:
+    """A daemon thread running an event loop forever"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="llm-client-loop")
+        self.thread.start()
+
+
+_loop_thread: Optional[_LoopThread] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+    return _loop_thread.loop
+
+
+_DONE = object()
+
+
+class LLMStream:
+    """
+    Synchronous view of an async chat stream.
+
+    Iterate to get chunks; read(timeout) waits at most timeout seconds for
+    the next one; cancel() aborts the HTTP request (the model stops generating).
+    """
+
+    def __init__(self, agen_factory, loop: asyncio.AbstractEventLoop, model: str = None):
+        self.model = model
+        self._queue: "queue.Queue" = queue.Queue()
+        self._finished = False
+        self._future = asyncio.run_coroutine_threadsafe(self._pump(agen_factory), loop)
+
+    async def _pump(self, agen_factory):
+        try:
+            async for chunk in agen_factory():
+                self._queue.put(chunk)
+            self._queue.put(_DONE)
+        except asyncio.CancelledError:
+            self._queue.put(LLMCancelledError("Request cancelled", model=self.model))
+            raise
+        except LLMError as e:
+            self._queue.put(e)
+        except Exception as e:
+            self._queue.put(LLMError(f"Unexpected client error: {e}", model=self.model))
+
+    def read(self, timeout: float = None) -> dict:
+        """
+        Next chunk.
+
+        Raises:
+            StopIteration at the end of the stream, LLMTimeoutError if nothing
+            arrived within timeout, other LLMError subclasses on failure
+        """
+        if self._finished:
+            raise StopIteration
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise LLMTimeoutError(f"No chunk within {timeout:.1f}s", model=self.model)
+        if item is _DONE:
+            self._finished = True
+            raise StopIteration
+        if isinstance(item, LLMError):
+            self._finished = True
+            raise item
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> dict:
+        return self.read()
+
+    def cancel(self):
+        """Abort the request (no-op if already finished)"""
+        self._finished = True
+        self._future.cancel()
+
+
+class BlockingLLMClient:
+    """Synchronous facade over AsyncLLMClient, backed by one background event loop"""
+
+    def __init__(self, async_client: AsyncLLMClient = None):
+        self.async_client = async_client or AsyncLLMClient()
+        self.loop = _background_loop()
+
+    def _run(self, coro, timeout: float = None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise LLMTimeoutError(f"No response within {timeout:.1f}s")
+
+    def chat_stream(self, model: str, messages: List[dict], **kwargs) -> LLMStream:
+        return LLMStream(lambda: self.async_client.chat_stream(model, messages, **kwargs), self.loop, model=model)
+
+    def chat(self, model: str, messages: List[dict], timeout: float = None, **kwargs) -> dict:
+        return self._run(self.async_client.chat(model, messages, **kwargs), timeout)
+
+    def generate(self, model: str, prompt: str = "", keep_alive=None, timeout: float = None) -> dict:
+        return self._run(self.async_client.generate(model, prompt, keep_alive=keep_alive), timeout)
+
+    def ps(self, timeout: float = None) -> dict:
+        return self._run(self.async_client.ps(), timeout)
+
+
+_clients: Dict[str, BlockingLLMClient] = {}
+_async_clients: Dict[str, AsyncLLMClient] = {}
+
+
+def get_async_client(host: str = OLLAMA_HOST) -> AsyncLLMClient:
+    """Shared AsyncLLMClient for a host"""
+    with _loop_lock:
+        client = _async_clients.get(host)
+        if client is None:
+            client = _async_clients[host] = AsyncLLMClient(host)
+    return client
+
+
+def get_blocking_client(host: str = OLLAMA_HOST) -> BlockingLLMClient:
+    """Shared BlockingLLMClient for a host (shares the async client's pools)"""
+    client = _clients.get(host)
+    if client is None:
+        candidate = BlockingLLMClient(get_async_client(host))
+        with _loop_lock:
+            client = _clients.setdefault(host, candidate)
+    return client
@@ -1,37 +1,81 @@
-import ollama
+import sys
+from pathlib import Path
+
+# Add parent to path for sibling imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agents.llm_client import get_blocking_client, LLMError
 
 class LLMModule:
-    def __init__(self, model="qwen2.5:1.5b"):
+    def __init__(self, model="qwen2.5:1.5b", residency=None, client=None):
         self.model = model
         self.model_name = model  # For display purposes
+        self.residency = residency  # Optional ModelResidencyManager shared by all subjects
+        self.client = client or get_blocking_client()
         print(f"LLM initialized with model: {self.model}")
 
-    def generate_response(self, prompt, system_instruction="Tu es un professeur virtuel expert. Utilise le contexte fourni pour répondre précisément. Si la réponse n'est pas dans le contexte, dis-le."):
+    def _messages(self, prompt, system_instruction):
+        return [
+            {'role': 'system', 'content': system_instruction},
+            {'role': 'user', 'content': prompt},
+        ]
+
+    def _keep_alive(self):
+        """keep_alive chosen by the residency manager (None = server default)"""
+        if self.residency is not None:
+            return self.residency.before_request(self.model)
+        return None
+
+    def _record_load(self, response, stats, success):
+        """Report whether this request paid a cold model load (success: the server answered)"""
+        load_ns = response.get('load_duration') or 0
+        cold = self.residency.after_request(self.model, load_ns, success) if self.residency is not None else None
+        if stats is not None:
+            stats['load_ms'] = load_ns / 1e6
+            stats['cold_load'] = cold
+
+    def generate_response(self, prompt, system_instruction="Tu es un professeur virtuel expert. Utilise le contexte fourni pour répondre précisément. Si la réponse n'est pas dans le contexte, dis-le.", stats=None):
+        response = None
         try:
-            messages = [
-                {'role': 'system', 'content': system_instruction},
-                {'role': 'user', 'content': prompt},
-            ]
-            response = ollama.chat(model=self.model, messages=messages)
+            response = self.client.chat(self.model, self._messages(prompt, system_instruction), keep_alive=self._keep_alive())
             return response['message']['content']
-        except Exception as e:
+        except LLMError as e:
             print(f"Error generating response: {e}")
+            if stats is not None:
+                stats['error'] = e.to_dict()
             return "Désolé, je ne peux pas répondre pour le moment."
+        finally:
+            if self.residency is not None or stats is not None:
+                self._record_load(response or {}, stats, success=response is not None)
 
-    def generate_response_stream(self, prompt, system_instruction="Tu es un professeur virtuel expert."):
+    def generate_response_stream(self, prompt, system_instruction="Tu es un professeur virtuel expert.", stats=None,
+                                 first_token_timeout=None):
         """
         Yields chunks of text as they are generated.
+        If stats is a dict, it receives 'cold_load' and 'load_ms' once the stream ends.
+        If first_token_timeout is set, the request is cancelled when the model
+        has produced nothing after that many seconds (load + prefill).
+        
+        Raises:
+            LLMError (LLMConnectionError, LLMTimeoutError, ...) on failure.
+            Closing the generator early cancels the request on the server.
         """
+        last_chunk = None
+        stream = self.client.chat_stream(self.model, self._messages(prompt, system_instruction),
+                                         keep_alive=self._keep_alive(), first_token_timeout=first_token_timeout)
         try:
-            messages = [
-                {'role': 'system', 'content': system_instruction},
-                {'role': 'user', 'content': prompt},
-            ]
-            stream = ollama.chat(model=self.model, messages=messages, stream=True)
             for chunk in stream:
+                last_chunk = chunk
                 content = chunk['message']['content']
-                yield content
-        except Exception as e:
+                if content:
+                    yield content
+        except LLMError as e:
             print(f"Error generating stream: {e}")
-            yield f"Error: {e}"
-
+            if stats is not None:
+                stats['error'] = e.to_dict()
+            raise
+        finally:
+            stream.cancel()  # no-op when finished, aborts generation if the consumer stopped early
+            if self.residency is not None or stats is not None:
+                # The final chunk (done=True) carries load_duration
+                self._record_load(last_chunk or {}, stats, success=last_chunk is not None)
@@ -0,0 +1,246 @@
+"""
+Ollama Model Residency Manager
+
+All subject LLMs share one local Ollama server. On small machines they
+don't all fit in memory at once, so alternating subjects keeps evicting
+and reloading models (multi-second first-token spikes). This manager:
+- Knows each model's memory footprint (config defaults, refined by /api/ps)
+- Tracks recent traffic per model (exponentially decayed request counts)
+- Preloads and keeps alive the hot models that fit in the memory budget
+- Explicitly unloads cold models when space is needed, never one in use,
+  and never one this app does not manage (other Ollama users, embedders)
+- Reports per request whether a cold load happened (Ollama's load_duration)
+"""
+
+import math
+import sys
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from agents.llm_client import get_blocking_client, LLMError
+from config import (OLLAMA_MEMORY_BUDGET_MB, OLLAMA_MODEL_FOOTPRINTS_MB, OLLAMA_KEEP_ALIVE_HOT,
+                    OLLAMA_KEEP_ALIVE_COLD, OLLAMA_TRAFFIC_HALF_LIFE_S, OLLAMA_COLD_LOAD_THRESHOLD_MS)
+
+DEFAULT_FOOTPRINT_MB = 2000
+REBALANCE_INTERVAL_S = 30
+MIN_HOT_SCORE = 0.05     # decayed traffic below this no longer keeps a model hot
+UNLOAD_TIMEOUT_S = 5     # unloads can run on the request path (before_request)
+PRELOAD_TIMEOUT_S = 60
+
+
+class ModelResidencyManager:
+    """
+    Decides which Ollama models stay resident.
+
+    Usage (see LLMModule):
+        keep_alive = residency.before_request(model)
+        ... client.chat_stream(..., keep_alive=keep_alive) ...
+        residency.after_request(model, load_duration_ns, success)
+    """
+
+    def __init__(self, memory_budget_mb: int = OLLAMA_MEMORY_BUDGET_MB, footprints_mb: Dict[str, int] = None,
+                 half_life_s: float = OLLAMA_TRAFFIC_HALF_LIFE_S, client=None):
+        self.client = client or get_blocking_client()
+        self.memory_budget_mb = memory_budget_mb
+        self.footprints_mb = dict(OLLAMA_MODEL_FOOTPRINTS_MB if footprints_mb is None else footprints_mb)
+        self._managed = set(self.footprints_mb)   # models this manager may evict
+        self.half_life_s = half_life_s
+
+        self._lock = threading.Lock()
+        self._scores: Dict[str, float] = {}       # decayed request counts
+        self._score_time: Dict[str, float] = {}
+        self._resident: Dict[str, int] = {}       # model -> MB, as last seen by Ollama
+        self._in_flight: Dict[str, int] = {}
+        self._last_rebalance = 0.0
+        self.cold_loads = 0
+        self.requests = 0
+
+        self.refresh()
+
+    # ---- Bookkeeping ----
+
+    def footprint(self, model: str) -> int:
+        """Memory footprint of a model in MB"""
+        return self._resident.get(model) or self.footprints_mb.get(model, DEFAULT_FOOTPRINT_MB)
+
+    def _score(self, model: str, now: float) -> float:
+        """Decayed traffic score at time now"""
+        score = self._scores.get(model, 0.0)
+        if score:
+            elapsed = now - self._score_time[model]
+            score *= math.pow(0.5, elapsed / self.half_life_s)
+        return score
+
+    def refresh(self) -> bool:
+        """Re-read the set of resident models from Ollama (/api/ps), False if Ollama could not be queried"""
+        try:
+            loaded = self.client.ps(timeout=5).get('models', [])
+        except LLMError as e:
+            print(f"Residency: cannot query Ollama ({e})")
+            return False
+        resident = {}
+        for entry in loaded:
+            name = entry.get('model') or entry.get('name')
+            resident[name] = int(entry.get('size', 0) / (1024 * 1024)) or self.footprints_mb.get(name, DEFAULT_FOOTPRINT_MB)
+        with self._lock:
+            self._resident = resident
+            # Keep learned footprints for models that get unloaded later
+            self.footprints_mb.update(resident)
+        return True
+
+    def is_resident(self, model: str) -> bool:
+        return model in self._resident
+
+    def hot_models(self) -> List[str]:
+        """Models with recent traffic, ranked, that fit together in the memory budget"""
+        now = time.time()
+        with self._lock:
+            scores = {m: self._score(m, now) for m in self._scores}
+        ranked = sorted((m for m, score in scores.items() if score >= MIN_HOT_SCORE), key=scores.get, reverse=True)
+        hot, used = [], 0
+        for model in ranked:
+            size = self.footprint(model)
+            if used + size <= self.memory_budget_mb:
+                hot.append(model)
+                used += size
+        return hot
+
+    def keep_alive_for(self, model: str) -> str:
+        """Ollama keep_alive for a request: hot models stay loaded longer"""
+        return OLLAMA_KEEP_ALIVE_HOT if model in self.hot_models() else OLLAMA_KEEP_ALIVE_COLD
+
+    # ---- Request hooks ----
+
+    def before_request(self, model: str) -> str:
+        """
+        Register a request for model and make room for it if needed.
+
+        Returns:
+            keep_alive value to pass to Ollama
+        """
+        now = time.time()
+        with self._lock:
+            self._scores[model] = self._score(model, now) + 1.0
+            self._score_time[model] = now
+            self._managed.add(model)
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            self.requests += 1
+            needs_room = model not in self._resident
+
+        if needs_room:
+            self._make_room(self.footprint(model), keep={model})
+        return self.keep_alive_for(model)
+
+    def after_request(self, model: str, load_duration_ns: Optional[int] = None, success: bool = True) -> bool:
+        """
+        Release model and record whether the request paid a cold load.
+
+        success: Ollama answered (the model is loaded); a failed request
+        (unreachable server, timeout before the first token, unknown model)
+        leaves the residency as it was.
+
+        Returns:
+            True if Ollama had to load the model for this request
+        """
+        load_ms = (load_duration_ns or 0) / 1e6
+        cold = success and load_ms >= OLLAMA_COLD_LOAD_THRESHOLD_MS
+        with self._lock:
+            self._in_flight[model] = max(0, self._in_flight.get(model, 0) - 1)
+            if success:
+                self._resident[model] = self.footprint(model)
+            if cold:
+                self.cold_loads += 1
+            rebalance_due = time.time() - self._last_rebalance >= REBALANCE_INTERVAL_S
+            if rebalance_due:
+                self._last_rebalance = time.time()
+
+        if rebalance_due:
+            threading.Thread(target=self.rebalance, daemon=True).start()
+        return cold
+
+    # ---- Loading / eviction ----
+
+    def _unload(self, model: str):
+        """Ask Ollama to evict a model now"""
+        try:
+            self.client.generate(model, keep_alive=0, timeout=UNLOAD_TIMEOUT_S)
+            print(f"Residency: evicted {model}")
+        except LLMError as e:
+            print(f"Residency: failed to evict {model} ({e})")
+        with self._lock:
+            self._resident.pop(model, None)
+
+    def _make_room(self, needed_mb: int, keep=()):
+        """Evict the coldest idle resident models until needed_mb fits in the budget"""
+        now = time.time()
+        with self._lock:
+            used = sum(self._resident.values())
+            candidates = sorted(
+                (m for m in self._resident if m in self._managed and m not in keep and not self._in_flight.get(m)),
+                key=lambda m: self._score(m, now)
+            )
+        for model in candidates:
+            if used + needed_mb <= self.memory_budget_mb:
+                break
+            used -= self._resident.get(model, 0)
+            self._unload(model)
+
+    def preload(self, models: List[str], background: bool = True):
+        """Load models ahead of their first request (empty-prompt generate)"""
+        now = time.time()
+        with self._lock:
+            # Models we are asked to preload count as hot until real traffic says otherwise
+            for model in models:
+                self._managed.add(model)
+                if model not in self._scores:
+                    self._scores[model] = 1.0
+                    self._score_time[model] = now
+
+        def _load():
+            for model in models:
+                if self.is_resident(model):
+                    continue
+                self._make_room(self.footprint(model), keep={model})
+                try:
+                    start = time.time()
+                    self.client.generate(model, keep_alive=OLLAMA_KEEP_ALIVE_HOT, timeout=PRELOAD_TIMEOUT_S)
+                    with self._lock:
+                        self._resident[model] = self.footprint(model)
+                    print(f"Residency: preloaded {model} ({time.time() - start:.1f}s)")
+                except LLMError as e:
+                    print(f"Residency: failed to preload {model} ({e})")
+
+        if background:
+            threading.Thread(target=_load, daemon=True, name="ollama-preload").start()
+        else:
+            _load()
+
+    def rebalance(self):
+        """Evict idle managed models that fell out of the hot set, preload the hot ones"""
+        if not self.refresh():
+            return  # residency unknown: skip this cycle rather than act on stale data
+        hot = self.hot_models()
+        with self._lock:
+            idle_cold = [m for m in self._resident
+                         if m in self._managed and m not in hot and not self._in_flight.get(m)]
+        for model in idle_cold:
+            self._unload(model)
+        self.preload(hot, background=False)
+
+    def get_stats(self) -> dict:
+        """Residency statistics"""
+        now = time.time()
+        with self._lock:
+            scores = {m: round(self._score(m, now), 2) for m in self._scores}
+            resident = dict(self._resident)
+        return {
+            "memory_budget_mb": self.memory_budget_mb,
+            "resident": resident,
+            "traffic": scores,
+            "requests": self.requests,
+            "cold_loads": self.cold_loads,
+        }
@@ -5,9 +5,20 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from agents.llm_module import LLMModule
+from agents.llm_client import LLMError, LLMTimeoutError
+from agents.model_residency import ModelResidencyManager
+from agents.answer_cache import SemanticAnswerCache
 from rag.rag_module import RAGModule
-from config import KNOWLEDGE_BASE_DIR, LLM_MODEL_MATH, LLM_MODEL_PHYSICS, LLM_MODEL_ENGLISH, LLM_MODEL_GENERAL
+from rag.embeddings import get_query_encoder
+from rag.context_packer import ContextPacker, token_budget_for
+from rag.kb_watcher import KnowledgeBaseWatcher
+from config import (KNOWLEDGE_BASE_DIR, LLM_MODEL_MATH, LLM_MODEL_PHYSICS, LLM_MODEL_ENGLISH, LLM_MODEL_GENERAL,
+                    SPECULATIVE_RETRIEVAL, OLLAMA_PRELOAD_MODELS, ANSWER_CACHE_ENABLED,
+                    LLM_FIRST_TOKEN_DEADLINES_S, LLM_FIRST_TOKEN_DEADLINE_S, LLM_FALLBACK_MODELS,
+                    KB_WATCH_ENABLED)
+from concurrent.futures import ThreadPoolExecutor
 import json
+import re
 import time
 
 class AgentOrchestrator:
@@ -23,11 +34,18 @@ class AgentOrchestrator:
     def __init__(self):
         print("Initializing Orchestrator...")
         
+        # One residency manager for the shared Ollama server
+        self.residency = ModelResidencyManager()
+        
         # Initialize Specialized LLMs per subject (using config)
-        self.llm_math = LLMModule(model=LLM_MODEL_MATH)
-        self.llm_physics = LLMModule(model=LLM_MODEL_PHYSICS)
-        self.llm_english = LLMModule(model=LLM_MODEL_ENGLISH)
-        self.llm_general = LLMModule(model=LLM_MODEL_GENERAL)
+        self.llm_math = LLMModule(model=LLM_MODEL_MATH, residency=self.residency)
+        self.llm_physics = LLMModule(model=LLM_MODEL_PHYSICS, residency=self.residency)
+        self.llm_english = LLMModule(model=LLM_MODEL_ENGLISH, residency=self.residency)
+        self.llm_general = LLMModule(model=LLM_MODEL_GENERAL, residency=self.residency)
+        self._fallback_llms = {}
+        
+        # Warm up the hot models while the knowledge bases load
+        self.residency.preload(OLLAMA_PRELOAD_MODELS)
         
         # Initialize Specialized RAG Agents
         self.rag_math = RAGModule(collection_name="math_agent")
@@ -39,6 +57,35 @@ class AgentOrchestrator:
         self.rag_physics.ingest(str(KNOWLEDGE_BASE_DIR / "physics"))
         self.rag_english.ingest(str(KNOWLEDGE_BASE_DIR / "english"))
         
+        # Subjects that have a knowledge base (GENERAL has none)
+        self.rag_agents = {
+            "MATH": self.rag_math,
+            "PHYSICS": self.rag_physics,
+            "ENGLISH": self.rag_english,
+        }
+        
+        # Re-index a subject in the background when its knowledge base folder changes
+        # (answer cache entries follow index_version, so stale answers expire with the swap)
+        self.kb_watcher = None
+        if KB_WATCH_ENABLED and not self.rag_math.read_only:
+            self.kb_watcher = KnowledgeBaseWatcher({
+                "MATH": (self.rag_math, str(KNOWLEDGE_BASE_DIR / "math")),
+                "PHYSICS": (self.rag_physics, str(KNOWLEDGE_BASE_DIR / "physics")),
+                "ENGLISH": (self.rag_english, str(KNOWLEDGE_BASE_DIR / "english")),
+            })
+            self.kb_watcher.start()
+        
+        # Worker pool for speculative retrieval while the LLM router is thinking
+        self.speculative_enabled = SPECULATIVE_RETRIEVAL
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=len(self.rag_agents), thread_name_prefix="rag-speculative")
+        
+        # Semantic answer cache (same query encoder as the RAG modules, so lookups are free)
+        self.query_encoder = get_query_encoder()
+        self.answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
+        
+        # Merges overlapping chunks and fits the context into each model's token budget
+        self.context_packer = ContextPacker()
+        
         print("Orchestrator initialized.")
 
     def route_query(self, text):
@@ -46,6 +93,16 @@ class AgentOrchestrator:
         Uses Keywords first, then LLM to classify the query.
         Returns: 'MATH', 'PHYSICS', 'ENGLISH', or 'GENERAL'
         """
+        subject = self._route_by_keywords(text)
+        if subject is not None:
+            return subject
+        return self._route_by_llm(text)
+
+    def _route_by_keywords(self, text):
+        """
+        Fast path: keyword matching.
+        Returns the subject, or None when no keyword matched.
+        """
         text_lower = text.lower()
         
         # 1. Keyword Routing (Fast Path)
@@ -70,8 +127,11 @@ class AgentOrchestrator:
         if any(k in text_lower for k in english_keywords):
             print("Routing: Keyword Match -> ENGLISH")
             return "ENGLISH"
-            
-        # 2. LLM Routing (Slow Fallback)
+        
+        return None
+
+    def _route_by_llm(self, text):
+        """Slow fallback: ask the general LLM to classify the query."""
         print("Routing: No keyword match, falling back to LLM...")
         prompt = f"""
         Tu es un routeur intelligent. Analyse la demande suivante et classe-la dans une des catégories :
@@ -93,6 +153,76 @@ class AgentOrchestrator:
         except:
             return "GENERAL"
 
+    def _start_speculative_retrieval(self, text, n_results, levels=None):
+        """
+        Launch retrieval on every subject knowledge base in the background.
+        
+        Used while the LLM router is still classifying the query, so that
+        routing and RAG latencies overlap instead of adding up.
+        Returns: {subject: Future[(documents, metadatas)]}
+        """
+        return {
+            subject: self._retrieval_pool.submit(rag.retrieve, text, n_results=n_results, levels=levels)
+            for subject, rag in self.rag_agents.items()
+        }
+
+    def _discard_speculative(self, futures, keep=None):
+        """Cancel (or ignore, if already running) the speculative lookups we don't need"""
+        for subject, future in futures.items():
+            if subject != keep:
+                future.cancel()
+
+    @staticmethod
+    def _cache_scope(subject, levels=None):
+        """Answer-cache partition: answers retrieved for one level set are not replayed for another"""
+        return f"{subject}@{','.join(sorted(levels))}" if levels else subject
+
+    def _index_version(self, subject):
+        """Knowledge-base version of a subject (cached answers are tied to it)"""
+        rag = self.rag_agents.get(subject)
+        return rag.index_version if rag is not None else 0
+
+    def _replay_cached(self, entry, agent_name, model_name, similarity, metrics):
+        """Replay a cached answer through the same events as process_stream"""
+        print(f"  ♻️ Answer cache hit ({similarity:.2f}): '{entry.query}'")
+        yield ('routing', {'agent': agent_name, 'model': model_name,
+                           'cache_hit': True, 'cached_audio': bool(entry.audio_chunks)})
+        yield ('rag', entry.rag)
+        
+        # Word-sized tokens so the UI still renders progressively
+        tokens = [t for t in re.split(r'(?<=\s)(?=\S)', entry.text) if t]
+        for token in tokens:
+            yield ('llm_chunk', token)
+        for chunk in entry.audio_chunks:
+            yield ('audio_chunk', chunk)
+        
+        metrics['model'] = model_name
+        metrics['tokens'] = len(tokens)
+        metrics['cache_hit'] = True
+        metrics['cache_similarity'] = similarity
+        metrics['answer_cache'] = self.answer_cache.get_stats()
+        yield ('metrics', metrics)
+
+    def _fallback_llm(self, failed_model):
+        """
+        Model to retry on when failed_model missed its first-token deadline.
+        Prefers models already resident in Ollama (no load), then the smallest.
+        Returns None if there is no other candidate.
+        """
+        candidates = [m for m in LLM_FALLBACK_MODELS if m != failed_model]
+        if not candidates:
+            return None
+        # Stable sort: config order breaks ties
+        candidates.sort(key=lambda m: (not self.residency.is_resident(m), self.residency.footprint(m)))
+        model = candidates[0]
+        
+        llm = next((l for l in (self.llm_math, self.llm_physics, self.llm_english, self.llm_general) if l.model == model), None)
+        if llm is None:
+            llm = self._fallback_llms.get(model)
+            if llm is None:
+                llm = self._fallback_llms[model] = LLMModule(model=model, residency=self.residency)
+        return llm
+
     def get_llm_for_subject(self, subject):
         """Returns the appropriate LLM instance for the subject"""
         if subject == "MATH":
@@ -104,9 +234,10 @@ class AgentOrchestrator:
         else:
             return self.llm_general
 
-    def process(self, text):
+    def process(self, text, levels=None):
         """
         Main pipeline: Route -> Retrieve -> Generate
+        levels: optional student level(s) restricting retrieval (see RAGModule.retrieve)
         Returns: (response_text, source_name, agent_name, context, metrics)
         """
         metrics = {}
@@ -129,7 +260,7 @@ class AgentOrchestrator:
         start_rag = time.time()
         if category == "MATH":
             agent_name = "Agent Maths"
-            contexts, metadatas = self.rag_math.retrieve(text, n_results=3)
+            contexts, metadatas = self.rag_math.retrieve(text, n_results=3, levels=levels)
             if contexts:
                 context = "\n\n".join(contexts)
                 source_name = ", ".join([m.get('source', 'Inconnu') for m in metadatas])
@@ -137,7 +268,7 @@ class AgentOrchestrator:
             
         elif category == "PHYSICS":
             agent_name = "Agent Physique"
-            contexts, metadatas = self.rag_physics.retrieve(text, n_results=3)
+            contexts, metadatas = self.rag_physics.retrieve(text, n_results=3, levels=levels)
             if contexts:
                 context = "\n\n".join(contexts)
                 source_name = ", ".join([m.get('source', 'Inconnu') for m in metadatas])
@@ -145,7 +276,7 @@ class AgentOrchestrator:
             
         elif category == "ENGLISH":
             agent_name = "Agent Anglais"
-            contexts, metadatas = self.rag_english.retrieve(text, n_results=3)
+            contexts, metadatas = self.rag_english.retrieve(text, n_results=3, levels=levels)
             if contexts:
                 context = "\n\n".join(contexts)
                 source_name = ", ".join([m.get('source', 'Inconnu') for m in metadatas])
@@ -167,20 +298,34 @@ class AgentOrchestrator:
         
         return response_text, source_name, agent_name, context, metrics
 
-    def process_stream(self, text):
+    def process_stream(self, text, levels=None):
         """
         Generator that yields:
         - ('routing', {'agent': agent_name, 'model': model_name})
         - ('rag', {context, source})
         - ('llm_chunk', token)
+        - ('audio_chunk', AudioChunk)  (only when replaying a cached answer)
+        - ('error', error_dict)  (the LLM failed: after the apology chunk, before metrics)
         - ('metrics', metrics_dict)
+        
+        On a fresh answer, metrics['answer_cache_key'] can be passed to
+        answer_cache.attach_audio() once the audio has been synthesized.
+        
+        levels: optional student level(s) restricting retrieval (see RAGModule.retrieve)
         """
         metrics = {'stt': 0, 'routing': 0, 'rag': 0, 'llm': 0, 'tts': 0, 'total': 0}
+        N_RESULTS = 5  # Increased from 3 to 5
         
-        # 1. Routing
+        # 1. Routing (keywords first; if we must ask the LLM, retrieve speculatively meanwhile)
         start_routing = time.time()
-        subject = self.route_query(text)
+        speculative = {}
+        subject = self._route_by_keywords(text)
+        if subject is None:
+            if self.speculative_enabled:
+                speculative = self._start_speculative_retrieval(text, N_RESULTS, levels)
+            subject = self._route_by_llm(text)
         metrics['routing'] = time.time() - start_routing
+        metrics['speculative'] = bool(speculative)
         
         # Get LLM for this subject
         llm = self.get_llm_for_subject(subject)
@@ -195,8 +340,19 @@ class AgentOrchestrator:
             agent_name = "ENGLISH"
         else:
             agent_name = "GENERAL"
+        
+        # Near-duplicate of an already answered question? Replay it.
+        query_embedding = None
+        if self.answer_cache is not None:
+            query_embedding = self.query_encoder.encode(text)
+            cached, similarity = self.answer_cache.lookup(self._cache_scope(subject, levels), query_embedding,
+                                                          self._index_version(subject))
+            if cached is not None:
+                self._discard_speculative(speculative)
+                yield from self._replay_cached(cached, agent_name, model_name, similarity, metrics)
+                return
             
-        yield ('routing', {'agent': agent_name, 'model': model_name})
+        yield ('routing', {'agent': agent_name, 'model': model_name, 'cache_hit': False})
         
         # 2. RAG Retrieval (now with 5 chunks for more context)
         start_rag = time.time()
@@ -204,53 +360,62 @@ class AgentOrchestrator:
         source_name = "Aucune source"
         chunks_details = []  # For frontend display
         
-        N_RESULTS = 5  # Increased from 3 to 5
+        # Keep the speculative result for the chosen subject, drop the others
+        self._discard_speculative(speculative, keep=subject)
+        if subject in speculative:
+            context_list, metadata = speculative[subject].result()
+        elif subject in self.rag_agents:
+            context_list, metadata = self.rag_agents[subject].retrieve(text, n_results=N_RESULTS, levels=levels)
+        else:
+            context_list, metadata = [], []
         
         if subject == "MATH":
-            context_list, metadata = self.rag_math.retrieve(text, n_results=N_RESULTS)
             system_prompt = "Tu es un professeur de Mathématiques. Sois CONCIS. Utilise des phrases COURTES. Va droit au but."
         elif subject == "PHYSICS":
-            context_list, metadata = self.rag_physics.retrieve(text, n_results=N_RESULTS)
             system_prompt = "Tu es un professeur de Physique. Sois CONCIS. Utilise des phrases COURTES. Va droit au but."
         elif subject == "ENGLISH":
-            context_list, metadata = self.rag_english.retrieve(text, n_results=N_RESULTS)
             system_prompt = "Tu es un professeur d'Anglais. Sois CONCIS. Utilise des phrases COURTES. Donne des exemples."
         else:
-            context_list = []
-            metadata = []
             system_prompt = "Tu es un assistant. Sois CONCIS. Utilise des phrases COURTES. Va droit au but."
         
         # Process retrieved chunks
         if context_list:
-            # Build context string
-            context = "\n\n---\n\n".join(context_list) if isinstance(context_list, list) else context_list
+            # Build context string: merged, de-duplicated, within the model's token budget
+            packed = self.context_packer.pack(context_list, metadata, token_budget=token_budget_for(model_name))
+            context = packed.text
+            metrics.update(packed.get_stats())
+            print(f"  📦 Context: {packed.tokens_after} tokens ({packed.tokens_saved} saved, {packed.chunks_merged} merged)")
             
-            # Build source names and chunk details for logging
-            if isinstance(metadata, list):
-                source_name = ", ".join(set([m.get('source', 'Inconnu') for m in metadata]))
-                for i, (chunk, meta) in enumerate(zip(context_list, metadata)):
-                    chunk_info = {
-                        'index': i + 1,
-                        'source': meta.get('source', 'Inconnu'),
-                        'level': meta.get('level', 'unknown'),
-                        'preview': chunk[:200] + "..." if len(chunk) > 200 else chunk
-                    }
-                    chunks_details.append(chunk_info)
-                    print(f"  📄 Chunk {i+1}: [{meta.get('level', '?')}/{meta.get('source', '?')}] {chunk[:100]}...")
-            else:
-                source_name = metadata.get('source', 'Inconnu') if metadata else 'Inconnu'
+            # Sources and chunk details of what the model actually gets (merged, de-duplicated, within budget)
+            packed_metas = [meta for _, metas in packed.passages for meta in metas]
+            if packed_metas:
+                source_name = ", ".join(dict.fromkeys(m.get('source', 'Inconnu') for m in packed_metas))
+            for i, (passage, metas) in enumerate(packed.passages):
+                meta = metas[0]
+                chunk_info = {
+                    'index': i + 1,
+                    'source': meta.get('source', 'Inconnu'),
+                    'level': meta.get('level', 'unknown'),
+                    'chunks': len(metas),  # retrieved chunks merged into this passage
+                    'preview': passage[:200] + "..." if len(passage) > 200 else passage
+                }
+                chunks_details.append(chunk_info)
+                print(f"  📄 Passage {i+1} ({len(metas)} chunks): [{meta.get('level', '?')}/{meta.get('source', '?')}] {passage[:100]}...")
         
+        chunks_count = sum(detail['chunks'] for detail in chunks_details)
         metrics['rag'] = time.time() - start_rag
-        metrics['chunks_count'] = len(chunks_details)
-        print(f"  ✅ RAG: {len(chunks_details)} chunks retrieved in {metrics['rag']:.2f}s")
+        metrics['chunks_count'] = chunks_count
+        print(f"  ✅ RAG: {len(context_list)} chunks retrieved, {chunks_count} in context ({metrics['rag']:.2f}s)")
         
         # Yield RAG info with chunk details for frontend
-        yield ('rag', {
+        index_version = self._index_version(subject)
+        rag_event = {
             'context': context, 
             'source': source_name,
             'chunks': chunks_details,
-            'chunks_count': len(chunks_details)
-        })
+            'chunks_count': chunks_count
+        }
+        yield ('rag', rag_event)
         
         # 3. LLM Generation (Streaming)
         if context:
@@ -261,17 +426,63 @@ class AgentOrchestrator:
         print(f"  🤖 LLM: Starting generation with {model_name}...")
         start_llm = time.time()
         token_count = 0
+        llm_stats = {}
+        response_parts = []
         
-        # Stream tokens using the subject-specific LLM
-        for chunk in llm.generate_response_stream(full_prompt, system_instruction=system_prompt):
-            token_count += 1
-            yield ('llm_chunk', chunk)
+        # Stream tokens using the subject-specific LLM, within the subject's first-token deadline
+        deadline = LLM_FIRST_TOKEN_DEADLINES_S.get(subject, LLM_FIRST_TOKEN_DEADLINE_S)
+        metrics['fallback'] = None
+        try:
+            try:
+                for chunk in llm.generate_response_stream(full_prompt, system_instruction=system_prompt, stats=llm_stats,
+                                                          first_token_timeout=deadline):
+                    token_count += 1
+                    response_parts.append(chunk)
+                    yield ('llm_chunk', chunk)
+            except LLMTimeoutError:
+                fallback = self._fallback_llm(llm.model) if token_count == 0 else None
+                if fallback is None:
+                    raise
+                # Cold or overloaded model: the request is already cancelled, retry on the fallback
+                metrics['fallback'] = {
+                    'from': model_name,
+                    'to': fallback.model_name,
+                    'reason': 'first_token_deadline',
+                    'deadline_s': deadline,
+                    'waited_s': time.time() - start_llm,
+                }
+                print(f"  ⏱️ No first token from {model_name} within {deadline:.1f}s, falling back to {fallback.model_name}")
+                llm, model_name, llm_stats = fallback, fallback.model_name, {}
+                # Same deadline: a cold fallback must not leave the student waiting indefinitely
+                for chunk in llm.generate_response_stream(full_prompt, system_instruction=system_prompt, stats=llm_stats,
+                                                          first_token_timeout=deadline):
+                    token_count += 1
+                    response_parts.append(chunk)
+                    yield ('llm_chunk', chunk)
+        except LLMError as e:
+            metrics['llm_error'] = e.to_dict()
+            print(f"  ❌ LLM: {e}")
+            yield ('llm_chunk', "Désolé, je ne peux pas répondre pour le moment.")
+            yield ('error', metrics['llm_error'])
         
         metrics['llm'] = time.time() - start_llm
         metrics['model'] = model_name
         metrics['tokens'] = token_count
+        metrics['cold_load'] = llm_stats.get('cold_load', False)
+        metrics['model_load_ms'] = llm_stats.get('load_ms', 0)
+        if metrics['cold_load']:
+            print(f"  🧊 Cold load of {model_name}: {metrics['model_load_ms']:.0f}ms")
         print(f"  ✅ LLM: Generated {token_count} tokens in {metrics['llm']:.2f}s")
         
+        # Remember the answer for near-duplicate questions
+        metrics['cache_hit'] = False
+        if self.answer_cache is not None:
+            if response_parts and 'llm_error' not in metrics:
+                metrics['answer_cache_key'] = self.answer_cache.store(
+                    self._cache_scope(subject, levels), text, query_embedding, "".join(response_parts), rag_event, index_version
+                )
+            metrics['answer_cache'] = self.answer_cache.get_stats()
+        
         yield ('metrics', metrics)
 
 
@@ -21,8 +21,41 @@ DATA_DIR = BASE_DIR / "data"
 PIPER_DIR = MODELS_DIR / "piper"
 PIPER_MODEL = os.getenv("PIPER_MODEL", str(PIPER_DIR / "fr_FR-upmc-medium.onnx"))
 
-# ChromaDB
+# ChromaDB (one shared client per directory and process, see rag/storage.py)
 CHROMA_DB_DIR = str(DATA_DIR / "chroma_db")
+# Serving workers: open existing collections and index bundles only, never ingest or write
+RAG_READ_ONLY = os.getenv("RAG_READ_ONLY", "false").lower() in ("1", "true", "yes")
+
+# Embeddings (one shared instance per model name, see rag/embeddings.py)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+# Also check the SHA-256 of every index bundle file at startup (reads the whole bundle
+# once; file sizes and the manifest are always checked)
+INDEX_BUNDLE_VERIFY = os.getenv("INDEX_BUNDLE_VERIFY", "false").lower() in ("1", "true", "yes")
+# Ingestion pipeline: PDF extraction processes (0 = auto) and chunks handed to the embedder at once
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+# Vector search backend: "chroma" (HNSW), "numpy" (in-process exact matmul) or "auto"
+# (numpy up to DENSE_INDEX_MAX_CHUNKS chunks, see rag_benchmark --vector-crossover)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto").lower()
+DENSE_INDEX_MAX_CHUNKS = int(os.getenv("DENSE_INDEX_MAX_CHUNKS", "20000"))
+# In-process index codes: "none" (float32), "float16" or "int8"; the top
+# VECTOR_RESCORE_FACTOR * k candidates are rescored with the float32 vectors
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+# Persistent chunk embedding store keyed by (model, text hash), see rag/embedding_store.py
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", str(DATA_DIR / "embedding_store.sqlite3"))
+# Texts per forward pass when embedding chunks (batches are formed from length-sorted texts)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Per-page text extracted from PDFs, keyed by file hash and extractor version (see rag/text_cache.py)
+TEXT_CACHE_ENABLED = os.getenv("TEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TEXT_CACHE_PATH = os.getenv("TEXT_CACHE_PATH", str(DATA_DIR / "extracted_text.sqlite3"))
+# Background re-indexing when knowledge base files change (see rag/kb_watcher.py)
+KB_WATCH_ENABLED = os.getenv("KB_WATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+KB_WATCH_INTERVAL_S = float(os.getenv("KB_WATCH_INTERVAL_S", "5"))
+KB_WATCH_DEBOUNCE_S = float(os.getenv("KB_WATCH_DEBOUNCE_S", "10"))
+KB_REINDEX_NICE = int(os.getenv("KB_REINDEX_NICE", "10"))
 
 # Whisper STT
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
@@ -33,6 +66,57 @@ LLM_MODEL_PHYSICS = os.getenv("LLM_MODEL_PHYSICS", "llama3.2:1b")
 LLM_MODEL_ENGLISH = os.getenv("LLM_MODEL_ENGLISH", "gemma:2b")
 LLM_MODEL_GENERAL = os.getenv("LLM_MODEL_GENERAL", "qwen2.5:1.5b")
 
+# Ollama server (a real one, or agents/fake_ollama.py for offline runs)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+LLM_READ_TIMEOUT_S = float(os.getenv("LLM_READ_TIMEOUT_S", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+
+# First-token latency SLO per subject: past the deadline the request is
+# cancelled and re-issued on a fallback model (resident first, then smallest)
+LLM_FIRST_TOKEN_DEADLINE_S = float(os.getenv("LLM_FIRST_TOKEN_DEADLINE_S", "4"))
+LLM_FIRST_TOKEN_DEADLINES_S = {
+    "MATH": float(os.getenv("LLM_FIRST_TOKEN_DEADLINE_MATH_S", LLM_FIRST_TOKEN_DEADLINE_S)),
+    "PHYSICS": float(os.getenv("LLM_FIRST_TOKEN_DEADLINE_PHYSICS_S", LLM_FIRST_TOKEN_DEADLINE_S)),
+    "ENGLISH": float(os.getenv("LLM_FIRST_TOKEN_DEADLINE_ENGLISH_S", LLM_FIRST_TOKEN_DEADLINE_S)),
+    "GENERAL": float(os.getenv("LLM_FIRST_TOKEN_DEADLINE_GENERAL_S", LLM_FIRST_TOKEN_DEADLINE_S)),
+}
+LLM_FALLBACK_MODELS = [m for m in os.getenv("LLM_FALLBACK_MODELS", f"{LLM_MODEL_PHYSICS},{LLM_MODEL_MATH}").split(",") if m]
+
+# Ollama model residency (see agents/model_residency.py)
+OLLAMA_MEMORY_BUDGET_MB = int(os.getenv("OLLAMA_MEMORY_BUDGET_MB", "6000"))
+OLLAMA_KEEP_ALIVE_HOT = os.getenv("OLLAMA_KEEP_ALIVE_HOT", "30m")
+OLLAMA_KEEP_ALIVE_COLD = os.getenv("OLLAMA_KEEP_ALIVE_COLD", "2m")
+OLLAMA_TRAFFIC_HALF_LIFE_S = float(os.getenv("OLLAMA_TRAFFIC_HALF_LIFE_S", "600"))
+OLLAMA_COLD_LOAD_THRESHOLD_MS = float(os.getenv("OLLAMA_COLD_LOAD_THRESHOLD_MS", "300"))
+OLLAMA_PRELOAD_MODELS = [m for m in os.getenv("OLLAMA_PRELOAD_MODELS", f"{LLM_MODEL_MATH},{LLM_MODEL_PHYSICS}").split(",") if m]
+# Approximate resident size (weights + KV cache), refined at runtime from `ollama ps`
+OLLAMA_MODEL_FOOTPRINTS_MB = {
+    "qwen2.5:1.5b": 1900,
+    "llama3.2:1b": 1700,
+    "gemma:2b": 3000,
+}
+
+# Semantic answer cache (see agents/answer_cache.py)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "64"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+
+# Prompt context packing: token budget for retrieved context, per model
+CONTEXT_TOKEN_BUDGET_DEFAULT = int(os.getenv("CONTEXT_TOKEN_BUDGET_DEFAULT", "900"))
+CONTEXT_TOKEN_BUDGETS = {
+    "qwen2.5:1.5b": 1000,
+    "llama3.2:1b": 700,
+    "gemma:2b": 800,
+}
+
+# Routing: retrieve on all subjects while the LLM router is classifying
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+
 # Server
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.getenv("SERVER_PORT", "8001"))
@@ -54,6 +138,7 @@ def print_config():
     print(f"BASE_DIR: {BASE_DIR}")
     print(f"PIPER_MODEL: {PIPER_MODEL}")
     print(f"WHISPER_MODEL: {WHISPER_MODEL}")
+    print(f"EMBEDDING_MODEL: {EMBEDDING_MODEL}")
     print(f"LLM_MODEL_MATH: {LLM_MODEL_MATH}")
     print(f"LLM_MODEL_PHYSICS: {LLM_MODEL_PHYSICS}")
     print(f"LLM_MODEL_ENGLISH: {LLM_MODEL_ENGLISH}")
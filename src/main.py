@@ -15,12 +15,13 @@ import logging
 import time
 import tempfile
 import wave
+from contextlib import closing
 
 # Import from new package structure
 from speech.vad_module import VADManager
 from speech.stt_module import STTModule
 from speech.tts_module import TTSModule
-from speech.audio_streamer import AudioStreamManager, SentenceBuffer
+from speech.answer_stream import stream_answer
 from agents.orchestrator import AgentOrchestrator
 from config import STATIC_DIR, SERVER_HOST, SERVER_PORT
 
@@ -48,17 +49,28 @@ from fastapi.responses import FileResponse
 async def get():
     return FileResponse(str(STATIC_DIR / "index.html"))
 
-# Initialize Modules
-print("Starting Voice Agent Server...")
-stt = STTModule(model_size="base")
-tts = TTSModule()
-orchestrator = AgentOrchestrator()
+# Initialize Modules at server startup, not at import: spawned worker processes
+# (PDF extraction) re-import this module and must not load models or ingest
+stt = None
+tts = None
+orchestrator = None
+
+
+@app.on_event("startup")
+def load_modules():
+    global stt, tts, orchestrator
+    print("Starting Voice Agent Server...")
+    stt = STTModule(model_size="base")
+    tts = TTSModule()
+    orchestrator = AgentOrchestrator()
 
 
 @app.websocket("/ws/audio")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    logger.info("WebSocket connection accepted")
+    # Optional student level(s): /ws/audio?level=6eme or ?level=college,lycée
+    levels = [l.strip() for l in websocket.query_params.get("level", "").split(",") if l.strip()] or None
+    logger.info(f"WebSocket connection accepted (levels: {levels or 'all'})")
     
     vad = VADManager()
     
@@ -94,11 +106,6 @@ async def websocket_endpoint(websocket: WebSocket):
                         # Reset audio sequence for new response
                         await websocket.send_json({"type": "audio_reset"})
                         
-                        # Initialize streaming components
-                        audio_manager = AudioStreamManager(tts)
-                        sentence_buffer = SentenceBuffer(min_chars=5, max_chars=50)
-                        audio_manager.start()
-                        
                         full_response_text = ""
                         first_audio_sent = False
                         ttfa = 0
@@ -106,26 +113,26 @@ async def websocket_endpoint(websocket: WebSocket):
                         model_name = ""
                         metrics = {}  # Initialize metrics
                         
-                        try:
-                            # Process LLM stream
-                            iterator = orchestrator.process_stream(text)
+                        # Orchestrator stream -> sentences -> TTS (shared with the pipeline benchmark);
+                        # closing() stops the TTS worker even if the client goes away mid-answer
+                        with closing(stream_answer(orchestrator, tts, text, levels=levels)) as answer:
+                            for event_type, event_data in answer:
                             
-                            for event_type, event_data in iterator:
-                                
                                 if event_type == 'routing':
                                     # New format: {'agent': ..., 'model': ...}
                                     agent_name = event_data['agent']
                                     model_name = event_data['model']
-                                    logger.info(f"🎯 Routing: {agent_name} -> Model: {model_name}")
-                                    
+                                    logger.info(f"🎯 Routing: {agent_name} -> Model: {model_name}"
+                                                + (" (cached answer)" if event_data.get('cache_hit') else ""))
+                                
                                 elif event_type == 'rag':
                                     context = event_data['context']
                                     source_name = event_data['source']
                                     chunks = event_data.get('chunks', [])
                                     chunks_count = event_data.get('chunks_count', 0)
-                                    
+                                
                                     logger.info(f"📚 RAG: {chunks_count} chunks from {source_name}")
-                                    
+                                
                                     # Send RAG info with chunk details to frontend
                                     await websocket.send_json({
                                         "type": "rag_sources", 
@@ -136,11 +143,11 @@ async def websocket_endpoint(websocket: WebSocket):
                                         "chunks": chunks,
                                         "chunks_count": chunks_count
                                     })
-                                        
-                                elif event_type == 'llm_chunk':
+                                    
+                                elif event_type == 'text':
                                     token = event_data
                                     full_response_text += token
-                                    
+                                
                                     # Send text chunk to UI immediately
                                     await websocket.send_json({
                                         "type": "ai_text_chunk",
@@ -148,75 +155,54 @@ async def websocket_endpoint(websocket: WebSocket):
                                         "agent": agent_name,
                                         "model": model_name
                                     })
+                                
+                                elif event_type == 'sentence':
+                                    sentence = event_data
+                                    logger.info(f"🔊 TTS Queue: '{sentence[:60]}...' " if len(sentence) > 60 else f"🔊 TTS Queue: '{sentence}'")
+                                
+                                elif event_type == 'audio':
+                                    # Send audio with index for ordered playback
+                                    chunk = event_data
+                                    logger.info(f"🎵 Audio sent: chunk #{chunk.index}")
+                                    await websocket.send_json({
+                                        "type": "audio_chunk_meta",
+                                        "index": chunk.index,
+                                        "text": chunk.text[:50] + "..." if len(chunk.text) > 50 else chunk.text
+                                    })
+                                    await websocket.send_bytes(chunk.audio_bytes)
+                                
+                                    if not first_audio_sent:
+                                        ttfa = time.time() - start_total
+                                        first_audio_sent = True
+                                        logger.info(f"⚡ TTFA: {ttfa:.2f}s")
                                     
-                                    # Buffer text until sentence boundary
-                                    sentence = sentence_buffer.add(token)
-                                    if sentence:
-                                        logger.info(f"🔊 TTS Queue: '{sentence[:60]}...' " if len(sentence) > 60 else f"🔊 TTS Queue: '{sentence}'")
-                                        audio_manager.add_text(sentence)
-                                    
-                                    # Check for available audio and send it
-                                    while True:
-                                        chunk = audio_manager.get_audio(timeout=0.01)
-                                        if chunk is None:
-                                            break
-                                        
-                                        # Send audio with index for ordered playback
-                                        logger.info(f"🎵 Audio sent: chunk #{chunk.index}")
-                                        await websocket.send_json({
-                                            "type": "audio_chunk_meta",
-                                            "index": chunk.index,
-                                            "text": chunk.text[:50] + "..." if len(chunk.text) > 50 else chunk.text
-                                        })
-                                        await websocket.send_bytes(chunk.audio_bytes)
-                                        
-                                        if not first_audio_sent:
-                                            ttfa = time.time() - start_total
-                                            first_audio_sent = True
-                                            logger.info(f"⚡ TTFA: {ttfa:.2f}s")
-                                        
+                                elif event_type == 'error':
+                                    # The LLM failed (apology already streamed as text)
+                                    logger.warning(f"LLM error: {event_data['message']}")
+                                    await websocket.send_json({
+                                        "type": "llm_error",
+                                        "content": event_data['message'],
+                                        "agent": agent_name,
+                                        "model": model_name
+                                    })
+                                
                                 elif event_type == 'metrics':
-                                    # Store metrics, will send at end
                                     metrics = event_data
-                            
-                            # Flush remaining text buffer
-                            remaining = sentence_buffer.flush()
-                            if remaining:
-                                audio_manager.add_text(remaining)
-                            
-                            # Signal no more text coming
-                            audio_manager.finish_generation()
-                            
-                            # Wait for and send remaining audio chunks
-                            for chunk in audio_manager.iter_audio():
-                                await websocket.send_json({
-                                    "type": "audio_chunk_meta",
-                                    "index": chunk.index,
-                                    "text": chunk.text[:50] + "..." if len(chunk.text) > 50 else chunk.text
-                                })
-                                await websocket.send_bytes(chunk.audio_bytes)
-                                
-                                if not first_audio_sent:
-                                    ttfa = time.time() - start_total
-                                    first_audio_sent = True
-                            
-                            # Send final text
-                            await websocket.send_json({
-                                "type": "ai_text", 
-                                "content": full_response_text, 
-                                "agent": agent_name
-                            })
-                            
-                            # Send metrics
-                            metrics['stt'] = stt_duration
-                            metrics['ttfa'] = ttfa
-                            metrics['total'] = time.time() - start_total
-                            await websocket.send_json({"type": "latency_metrics", "data": metrics})
-                            
-                            logger.info(f"Stream finished. TTFA: {ttfa:.2f}s, Total: {metrics['total']:.2f}s")
-                            
-                        finally:
-                            audio_manager.stop()
+                        
+                        # Send final text
+                        await websocket.send_json({
+                            "type": "ai_text", 
+                            "content": full_response_text, 
+                            "agent": agent_name
+                        })
+                        
+                        # Send metrics
+                        metrics['stt'] = stt_duration
+                        metrics['ttfa'] = ttfa
+                        metrics['total'] = time.time() - start_total
+                        await websocket.send_json({"type": "latency_metrics", "data": metrics})
+                        
+                        logger.info(f"Stream finished. TTFA: {ttfa:.2f}s, Total: {metrics['total']:.2f}s")
                         
                 finally:
                     if os.path.exists(tmp_audio_path):
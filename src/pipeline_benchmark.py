@@ -0,0 +1,311 @@
+"""
+End-to-end Pipeline Benchmark
+
+Replays recorded questions through the whole voice pipeline, offline, with
+the same answer loop as the /ws/audio handler in main.py (stream_answer):
+STT (STTModule) -> routing, RAG, LLM (AgentOrchestrator.process_stream)
+-> SentenceBuffer -> MathToSpeech + TTS (AudioStreamManager)
+
+- LLM: scripted FakeOllamaServer (agents/fake_ollama.py) in-process, or a
+  real Ollama with --llm-host
+- TTS: Piper, or --stub-tts (silence as long as the text takes to say, after
+  a synthesis delay of --stub-tts-rtf times that length)
+- Per turn: stage timings, time to first token / first sentence / first
+  audio (TTFA), real-time factors (processing time / audio duration) of
+  STT, TTS and the whole turn
+- Results as JSON in data/benchmark_results/pipeline_<timestamp>.json
+
+Questions are WAV files (16 kHz mono, like the segments main.py transcribes).
+
+Usage:
+    python -m src.pipeline_benchmark --questions recordings/ --stub-tts
+    python -m src.pipeline_benchmark --questions q1.wav q2.wav --repeat 3 --tps 40
+    python -m src.pipeline_benchmark --questions recordings/ --llm-host http://localhost:11434
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import logging
+from contextlib import closing
+from pathlib import Path
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Project modules are imported late (main, run_turn): config reads OLLAMA_HOST at import time
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+STAGES = ("stt", "routing", "rag", "llm", "math_to_speech", "tts", "tts_tail")
+SUMMARY_KEYS = ("ttft_s", "first_sentence_s", "ttfa_s", "total_s", "stt_rtf", "tts_rtf", "rtf")
+
+
+class SilentTTS:
+    """
+    TTSModule stand-in: writes silence as long as the text would take to
+    say, after rtf times that duration (a Piper-like synthesis cost).
+    """
+
+    def __init__(self, chars_per_second: float = 15.0, rtf: float = 0.1, sample_rate: int = 22050):
+        self.chars_per_second = chars_per_second
+        self.rtf = rtf
+        self.sample_rate = sample_rate
+
+    def generate_audio(self, text, output_file="output.wav"):
+        duration = max(0.2, len(text) / self.chars_per_second)
+        time.sleep(duration * self.rtf)
+        with wave.open(output_file, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(b"\x00\x00" * int(duration * self.sample_rate))
+        return output_file
+
+
+def wav_duration_s(path: str) -> float:
+    with wave.open(str(path), 'rb') as wav_file:
+        return wav_file.getnframes() / wav_file.getframerate()
+
+
+def find_questions(paths: List[str]) -> List[Path]:
+    """WAV files given directly or inside directories, in name order"""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.wav")) if path.is_dir() else [path])
+    return files
+
+
+def _distribution(values: List[float]) -> dict:
+    values = np.asarray(values, dtype=np.float64)
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)), "max": float(values.max())}
+
+
+def summarize(turns: List[dict]) -> dict:
+    """Distributions over the answered turns, fresh answers and answer-cache replays apart"""
+    summary = {}
+    for name, group in (("fresh", [t for t in turns if "skipped" not in t and not t["cache_hit"]]),
+                        ("cached", [t for t in turns if "skipped" not in t and t["cache_hit"]])):
+        if not group:
+            continue
+        stats = {"turns": len(group)}
+        for key in SUMMARY_KEYS:
+            values = [t[key] for t in group if t.get(key) is not None]
+            if values:
+                stats[key] = _distribution(values)
+        stats["stages_s"] = {stage: _distribution([t["stages_s"][stage] for t in group]) for stage in STAGES}
+        summary[name] = stats
+    return summary
+
+
+class PipelineBenchmark:
+    """Runs recorded questions through STT, the orchestrator and the audio stream"""
+
+    def __init__(self, stt, tts, orchestrator, levels: Optional[List[str]] = None):
+        self.stt = stt
+        self.tts = tts
+        self.orchestrator = orchestrator
+        self.levels = levels
+
+    def run(self, questions: List[Path], repeat: int = 1) -> List[dict]:
+        turns = []
+        for run in range(repeat):
+            for path in questions:
+                turn = self.run_turn(path)
+                turn["run"] = run
+                turns.append(turn)
+                if "skipped" in turn:
+                    logger.info(f"  {path.name}: skipped ({turn['skipped']})")
+                else:
+                    logger.info(f"  {path.name}: TTFA {turn['ttfa_s'] or 0:.2f}s, total {turn['total_s']:.2f}s, "
+                                f"RTF {turn['rtf']:.2f}" + (" (cached answer)" if turn['cache_hit'] else ""))
+        return turns
+
+    def run_turn(self, wav_path: Path) -> dict:
+        """One question, timed like main.py's websocket turn (t=0 before STT)"""
+        from speech.answer_stream import stream_answer
+
+        audio_in_s = wav_duration_s(wav_path)
+        start_total = time.perf_counter()
+        elapsed = lambda: time.perf_counter() - start_total
+        marks = {}
+
+        # 1. STT
+        text = self.stt.transcribe(str(wav_path))
+        stt_s = elapsed()
+        turn = {"file": wav_path.name, "audio_in_s": audio_in_s, "transcript": text,
+                "stt_rtf": stt_s / audio_in_s if audio_in_s else None}
+        if not text.strip():
+            turn["skipped"] = "empty transcript"
+            return turn
+
+        # 2. Orchestrator stream -> sentences -> audio
+        chunks, metrics, routing = [], {}, {}
+        llm_done = None
+        with closing(stream_answer(self.orchestrator, self.tts, text, levels=self.levels)) as answer:
+            for event_type, event_data in answer:
+                if event_type == 'routing':
+                    routing = event_data
+                elif event_type == 'text':
+                    marks.setdefault("first_token", elapsed())
+                elif event_type == 'sentence':
+                    marks.setdefault("first_sentence", elapsed())
+                elif event_type == 'audio':
+                    marks.setdefault("ttfa", elapsed())
+                    chunks.append(event_data)
+                elif event_type == 'llm_done':
+                    llm_done = elapsed()
+                elif event_type == 'metrics':
+                    metrics = event_data
+
+        total_s = elapsed()
+        cache_hit = bool(metrics.get('cache_hit'))
+        audio_out_s = sum(c.duration_ms for c in chunks) / 1000
+        # Replayed chunks carry the timings of their original synthesis
+        tts_s = 0.0 if cache_hit else sum(c.tts_ms for c in chunks) / 1000
+        math_s = 0.0 if cache_hit else sum(c.math_ms for c in chunks) / 1000
+        turn.update({
+            "agent": routing.get('agent'),
+            "model": metrics.get('model', routing.get('model')),
+            "cache_hit": cache_hit,
+            "speculative": metrics.get('speculative', False),
+            "cold_load": metrics.get('cold_load', False),
+            "fallback": metrics.get('fallback'),
+            "llm_error": metrics.get('llm_error'),
+            "tokens": metrics.get('tokens', 0),
+            "audio_chunks": len(chunks),
+            "audio_out_s": audio_out_s,
+            "stages_s": {
+                "stt": stt_s,
+                "routing": metrics.get('routing', 0.0),
+                "rag": metrics.get('rag', 0.0),
+                "llm": metrics.get('llm', 0.0),
+                "math_to_speech": math_s,
+                "tts": tts_s,
+                "tts_tail": total_s - llm_done,  # audio still being synthesized after the last token
+            },
+            "ttft_s": marks.get("first_token"),
+            "first_sentence_s": marks.get("first_sentence"),
+            "ttfa_s": marks.get("ttfa"),
+            "total_s": total_s,
+            "tts_rtf": tts_s / audio_out_s if audio_out_s and not cache_hit else None,
+            "rtf": total_s / (audio_in_s + audio_out_s) if audio_in_s + audio_out_s else None,
+        })
+        return turn
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("--questions", nargs="+", required=True, help="WAV files or directories of WAV files")
+    parser.add_argument("--levels", type=str, help="Student level(s), comma-separated (like /ws/audio?level=)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the questions")
+    parser.add_argument("--stt-model", type=str, help="Whisper model size (default: WHISPER_MODEL)")
+    parser.add_argument("--stub-tts", action="store_true", help="Silent TTS instead of Piper")
+    parser.add_argument("--stub-tts-rtf", type=float, default=0.1, help="Synthesis time / audio length of the stub")
+    parser.add_argument("--llm-host", type=str, help="Real Ollama server (default: in-process fake)")
+    parser.add_argument("--tps", type=float, default=30.0, help="Fake LLM tokens per second")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="Fake LLM seconds before the first token")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="Fake LLM seconds to 'load' a cold model")
+    parser.add_argument("--llm-script", type=str,
+                        help='Fake LLM answers, JSON: {"responses": [[substring, answer], ...], "default": "..."}')
+    parser.add_argument("--no-answer-cache", action="store_true", help="Disable the semantic answer cache")
+    parser.add_argument("--output", type=str, help="JSON file (default: data/benchmark_results/pipeline_<timestamp>.json)")
+
+    args = parser.parse_args()
+    questions = find_questions(args.questions)
+    if not questions:
+        logger.error("No WAV questions found")
+        return 1
+
+    # The fake server only needs aiohttp (agents/__init__ is lazy): start it on a free port
+    # chosen by the OS, then point OLLAMA_HOST at it before config is imported
+    from agents.fake_ollama import FakeOllamaServer, DEFAULT_RESPONSE
+
+    server = None
+    if not args.llm_host:
+        responses, default = [], DEFAULT_RESPONSE
+        if args.llm_script:
+            with open(args.llm_script, "r", encoding="utf-8") as f:
+                script = json.load(f)
+            responses = [tuple(r) for r in script.get("responses", [])]
+            default = script.get("default", default)
+        server = FakeOllamaServer(responses=responses, default_response=default, tokens_per_second=args.tps,
+                                  first_token_delay_s=args.first_token_delay, load_delay_s=args.load_delay,
+                                  port=0)
+        server.start_in_thread()
+        logger.info(f"Fake LLM on {server.url} ({args.tps:g} tok/s)")
+
+    # Before any config import: config reads these once
+    os.environ["OLLAMA_HOST"] = args.llm_host or server.url
+    if args.no_answer_cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+    from agents.orchestrator import AgentOrchestrator
+    from config import DATA_DIR, WHISPER_MODEL
+
+    try:
+        try:
+            from speech.stt_module import STTModule
+        except ImportError as e:
+            logger.error(f"STT unavailable ({e}): install openai-whisper")
+            return 1
+        stt = STTModule(model_size=args.stt_model or WHISPER_MODEL)
+        if args.stub_tts:
+            tts = SilentTTS(rtf=args.stub_tts_rtf)
+        else:
+            from speech.tts_module import TTSModule
+            tts = TTSModule()
+
+        start = time.perf_counter()
+        orchestrator = AgentOrchestrator()
+        startup_s = time.perf_counter() - start
+
+        levels = [l.strip() for l in (args.levels or "").split(",") if l.strip()] or None
+        logger.info(f"Running {len(questions)} question(s) x {args.repeat}...")
+        benchmark = PipelineBenchmark(stt, tts, orchestrator, levels=levels)
+        turns = benchmark.run(questions, repeat=max(1, args.repeat))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "settings": {
+            "llm": args.llm_host or {"fake": True, "tokens_per_second": args.tps,
+                                     "first_token_delay_s": args.first_token_delay, "load_delay_s": args.load_delay},
+            "tts": {"stub": True, "rtf": args.stub_tts_rtf} if args.stub_tts else {"stub": False},
+            "stt_model": args.stt_model or WHISPER_MODEL,
+            "answer_cache": not args.no_answer_cache,
+            "levels": levels,
+            "repeat": args.repeat,
+        },
+        "startup_s": startup_s,
+        "summary": summarize(turns),
+        "turns": turns,
+    }
+    output_path = Path(args.output) if args.output else (
+        Path(DATA_DIR) / "benchmark_results" / f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    fresh = report["summary"].get("fresh")
+    if fresh and "ttfa_s" in fresh:
+        stages = ", ".join(f"{stage} {fresh['stages_s'][stage]['p50']:.2f}s" for stage in STAGES)
+        logger.info(f"\nFresh answers: TTFA p50 {fresh['ttfa_s']['p50']:.2f}s / p95 {fresh['ttfa_s']['p95']:.2f}s, "
+                    f"RTF p50 {fresh['rtf']['p50']:.2f}")
+        logger.info(f"  Stages (p50): {stages}")
+    logger.info(f"Results saved to {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
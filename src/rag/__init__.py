@@ -1,3 +1,10 @@
-from .rag_module import RAGModule
-
 __all__ = ['RAGModule']
+
+
+def __getattr__(name):
+    # Imported on first use: worker processes that only need rag.ingest_pipeline
+    # (spawned PDF extraction) do not load the embedding stack
+    if name == 'RAGModule':
+        from .rag_module import RAGModule
+        return RAGModule
+    raise AttributeError(f"module 'rag' has no attribute {name!r}")
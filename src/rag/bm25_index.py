@@ -0,0 +1,297 @@
+"""
+Sparse BM25 Index
+
+Drop-in replacement for rank_bm25.BM25Okapi built on an inverted index:
+- Term frequencies stored as a SciPy CSR matrix (documents x terms)
+- Scoring reads only the postings of the query terms, instead of walking
+  the whole corpus in Python for every query
+- Batch scoring is one sparse matrix product
+- Incremental add/remove (removed rows become tombstones until compact()),
+  on a copy() when the original must keep serving queries
+- to_arrays()/from_arrays() for the memory-mapped index bundle
+- partition(rows): scoring restricted to a subset of rows (e.g. one level),
+  reading only that subset's postings
+
+Scores are identical to BM25Okapi (same k1, b, epsilon and the same idf
+floor for very common terms), so rankings do not change.
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Add parent to path for sibling imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from rag.index_bundle import index_dtype
+
+
+class SparseBM25:
+    """
+    Okapi BM25 over an inverted index.
+
+    Rows are stable: add() appends rows, remove() only marks them dead, so
+    callers can keep row-aligned side tables (see RetrievalCore).
+    """
+
+    def __init__(self, corpus: List[List[str]] = None, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocabulary: Dict[str, int] = {}
+        self._tf = sparse.csr_matrix((0, 0), dtype=np.float32)  # rows x terms
+        self._pending: List[sparse.csr_matrix] = []
+        self._doc_len = np.zeros(0, dtype=np.float64)
+        self._alive = np.zeros(0, dtype=bool)
+
+        # Derived on demand: terms x rows BM25 weights and idf
+        self._weights = None
+        self._idf = None
+
+        if corpus:
+            self.add(corpus)
+
+    # ---- Persistence ----
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        """
+        Flat arrays for an index bundle (weights included, so a loaded
+        index answers its first query without recomputing them).
+
+        Returns:
+            (arrays, vocabulary in term-id order)
+        """
+        self._refresh()
+        tf, weights = self._tf, self._weights
+        arrays = {
+            "tf_data": tf.data.astype(np.float32),
+            "tf_indices": tf.indices.astype(index_dtype(tf.shape[1])),
+            "tf_indptr": tf.indptr.astype(index_dtype(tf.nnz)),
+            "w_data": weights.data.astype(np.float64),
+            "w_indices": weights.indices.astype(index_dtype(weights.shape[1])),
+            "w_indptr": weights.indptr.astype(index_dtype(weights.nnz)),
+            "doc_len": self._doc_len,
+            "alive": self._alive,
+        }
+        return arrays, list(self.vocabulary)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], vocabulary: Sequence[str],
+                    k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> "SparseBM25":
+        """Rebuild an index around (possibly memory-mapped) arrays from to_arrays()"""
+        index = cls(k1=k1, b=b, epsilon=epsilon)
+        index.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        n_rows, n_terms = len(arrays["alive"]), len(index.vocabulary)
+        index._tf = sparse.csr_matrix((arrays["tf_data"], arrays["tf_indices"], arrays["tf_indptr"]),
+                                      shape=(n_rows, n_terms), copy=False)
+        index._weights = sparse.csr_matrix((arrays["w_data"], arrays["w_indices"], arrays["w_indptr"]),
+                                           shape=(n_terms, n_rows), copy=False)
+        index._doc_len = np.asarray(arrays["doc_len"])
+        index._alive = np.array(arrays["alive"], dtype=bool)  # small, and remove() writes to it
+        return index
+
+    def copy(self) -> "SparseBM25":
+        """
+        Index that can be updated without touching this one (e.g. while this
+        one still serves queries). Matrices are shared: updates replace them
+        rather than write into them, except the alive mask, which is copied.
+        """
+        index = SparseBM25(k1=self.k1, b=self.b, epsilon=self.epsilon)
+        index.vocabulary = dict(self.vocabulary)
+        index._tf = self._tf
+        index._pending = list(self._pending)
+        index._doc_len = self._doc_len
+        index._alive = self._alive.copy()
+        index._weights, index._idf = self._weights, self._idf
+        return index
+
+    # ---- Size ----
+
+    @property
+    def n_rows(self) -> int:
+        """Rows, including removed ones"""
+        return len(self._alive)
+
+    @property
+    def corpus_size(self) -> int:
+        """Live documents"""
+        return int(self._alive.sum())
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Mask of rows that have not been removed"""
+        return self._alive
+
+    @property
+    def dead_fraction(self) -> float:
+        return 1.0 - self.corpus_size / self.n_rows if self.n_rows else 0.0
+
+    # ---- Updates ----
+
+    def _term_ids(self, tokens: List[str], grow: bool) -> List[int]:
+        ids = []
+        for token in tokens:
+            term = self.vocabulary.get(token)
+            if term is None:
+                if not grow:
+                    continue
+                term = self.vocabulary[token] = len(self.vocabulary)
+            ids.append(term)
+        return ids
+
+    def add(self, corpus: List[List[str]]) -> np.ndarray:
+        """Append tokenized documents, returns their rows"""
+        first = self.n_rows
+        indptr, indices, lengths = [0], [], []
+        for tokens in corpus:
+            indices.extend(self._term_ids(tokens, grow=True))
+            indptr.append(len(indices))
+            lengths.append(len(tokens))
+
+        # Duplicate (row, term) entries are summed into term frequencies
+        block = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(corpus), len(self.vocabulary)),
+        )
+        block.sum_duplicates()
+        self._pending.append(block)
+        self._doc_len = np.concatenate([self._doc_len, np.asarray(lengths, dtype=np.float64)])
+        self._alive = np.concatenate([self._alive, np.ones(len(corpus), dtype=bool)])
+        self._weights = None
+        return np.arange(first, self.n_rows)
+
+    def remove(self, rows: Sequence[int]):
+        """Mark rows as removed (they score -inf and leave the statistics)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            self._alive[rows] = False
+            self._weights = None
+
+    def compact(self) -> np.ndarray:
+        """
+        Drop removed rows.
+
+        Returns:
+            old row -> new row (-1 for removed rows)
+        """
+        self._flush()
+        keep = np.flatnonzero(self._alive)
+        mapping = np.full(self.n_rows, -1, dtype=np.int64)
+        mapping[keep] = np.arange(len(keep))
+        self._tf = self._tf[keep]
+        self._doc_len = self._doc_len[keep]
+        self._alive = self._alive[keep]
+        self._weights = None
+        return mapping
+
+    def _flush(self):
+        """Merge pending blocks into the main matrix"""
+        if not self._pending:
+            return
+        n_terms = len(self.vocabulary)
+        blocks = [self._tf] + self._pending
+        blocks = [sparse.csr_matrix((b.data, b.indices, b.indptr), shape=(b.shape[0], n_terms)) for b in blocks]
+        self._tf = sparse.vstack(blocks, format="csr")
+        self._pending = []
+
+    # ---- Scoring ----
+
+    def _refresh(self):
+        """Recompute idf and the terms x rows weight matrix (after any update)"""
+        if self._weights is not None:
+            return
+        self._flush()
+        n_terms = len(self.vocabulary)
+        tf = self._tf
+        entry_rows = np.repeat(np.arange(tf.shape[0]), np.diff(tf.indptr))
+        live_entry = self._alive[entry_rows]
+
+        corpus_size = self.corpus_size
+        df = np.bincount(tf.indices[live_entry], minlength=n_terms).astype(np.float64)
+        present = df > 0
+        idf = np.zeros(n_terms, dtype=np.float64)
+        idf[present] = np.log(corpus_size - df[present] + 0.5) - np.log(df[present] + 0.5)
+        if present.any():
+            # BM25Okapi: negative idf (term in more than half the docs) floored at epsilon * mean idf
+            average_idf = idf[present].mean()
+            idf[present & (idf < 0)] = self.epsilon * average_idf
+        self._idf = idf
+
+        avgdl = self._doc_len[self._alive].sum() / corpus_size if corpus_size else 1.0
+        norm = self.k1 * (1 - self.b + self.b * self._doc_len / avgdl)
+        tf_values = tf.data.astype(np.float64)
+        data = idf[tf.indices] * (tf_values * (self.k1 + 1) / (tf_values + norm[entry_rows]))
+        data[~live_entry] = 0.0
+        weights = sparse.csr_matrix((data, tf.indices, tf.indptr), shape=tf.shape)
+        self._weights = weights.T.tocsr()  # terms x rows: a term's postings are one row slice
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """BM25 score of every row for a tokenized query (removed rows: -inf)"""
+        self._refresh()
+        return _scores(self._weights, self._alive, self._term_ids(query, grow=False))
+
+    def get_batch_scores(self, queries: List[List[str]]) -> np.ndarray:
+        """Scores for several queries at once (queries x rows), one sparse product"""
+        self._refresh()
+        return _batch_scores(self._weights, self._alive, [self._term_ids(q, grow=False) for q in queries])
+
+    def partition(self, rows: Sequence[int]) -> "BM25Partition":
+        """Index restricted to rows (snapshot: rebuild it after any update)"""
+        return BM25Partition(self, rows)
+
+
+class BM25Partition:
+    """
+    Scores of a fixed subset of rows, with the statistics (idf, average
+    length) of the full index, so partition scores equal the full scores.
+
+    Holds its own terms x subset weight matrix: a query only touches the
+    postings that fall inside the partition.
+    """
+
+    def __init__(self, index: SparseBM25, rows: Sequence[int]):
+        index._refresh()
+        self.index = index
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self._weights = index._weights[:, self.rows].tocsr()
+        self._alive = index._alive[self.rows]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """Scores aligned with self.rows"""
+        return _scores(self._weights, self._alive, self.index._term_ids(query, grow=False))
+
+    def get_batch_scores(self, queries: List[List[str]]) -> np.ndarray:
+        """Scores (queries x self.rows)"""
+        return _batch_scores(self._weights, self._alive, [self.index._term_ids(q, grow=False) for q in queries])
+
+
+def _scores(weights: sparse.csr_matrix, alive: np.ndarray, term_ids: List[int]) -> np.ndarray:
+    """Sum the postings of term_ids (terms x rows weights), dead rows -inf"""
+    scores = np.zeros(weights.shape[1], dtype=np.float64)
+    for term in term_ids:
+        start, end = weights.indptr[term], weights.indptr[term + 1]
+        scores[weights.indices[start:end]] += weights.data[start:end]
+    scores[~alive] = -np.inf
+    return scores
+
+
+def _batch_scores(weights: sparse.csr_matrix, alive: np.ndarray, queries: List[List[int]]) -> np.ndarray:
+    """Query term counts @ weights, dead rows -inf"""
+    indptr, indices = [0], []
+    for term_ids in queries:
+        indices.extend(term_ids)
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(queries), weights.shape[0]),
+    )
+    counts.sum_duplicates()
+    scores = (counts @ weights).toarray()
+    scores[:, ~alive] = -np.inf
+    return scores
@@ -0,0 +1,97 @@
+"""
+Streaming Chunker
+
+Splits documents into overlapping chunks without materializing the text:
+- Consumes an iterator of pages and yields chunks lazily, so memory is
+  bounded by one page plus one chunk
+- Chunks never cut a word; they end on a sentence boundary when one falls
+  in the second half of the chunk
+- Overlap is made of whole trailing words (at most chunk_overlap chars)
+- Every chunk records the pages it spans (1-based page_start / page_end)
+
+Sizes are in characters (like CHUNK_SIZE), measured on the space-joined words.
+"""
+
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# Bump when the chunk boundaries change: the ingest manifest then forces a re-ingest
+CHUNKER_VERSION = 2
+
+_WORD = re.compile(r"\S+")
+_SENTENCE_END = (".", "!", "?", ":", ";", "…")
+
+
+def iter_words(pages: Iterable[str]) -> Iterator[Tuple[str, int]]:
+    """(word, page number) for every word, pages read one at a time"""
+    for page_no, page in enumerate(pages, start=1):
+        for match in _WORD.finditer(page or ""):
+            yield match.group(), page_no
+
+
+def _length(words: List[Tuple[str, int]]) -> int:
+    return sum(len(w) for w, _ in words) + max(0, len(words) - 1)
+
+
+def _cut_point(words: List[Tuple[str, int]], chunk_size: int) -> int:
+    """Number of words to emit: up to the last sentence end past half the chunk, else all"""
+    position = 0
+    cut = 0
+    for i, (word, _) in enumerate(words):
+        position += len(word) + (1 if i else 0)
+        if position >= chunk_size // 2 and word.endswith(_SENTENCE_END):
+            cut = i + 1
+    return cut or len(words)
+
+
+def _overlap(words: List[Tuple[str, int]], chunk_overlap: int) -> List[Tuple[str, int]]:
+    """Trailing whole words of words that fit in chunk_overlap chars"""
+    kept, size = 0, -1
+    for word, _ in reversed(words):
+        if size + 1 + len(word) > chunk_overlap:
+            break
+        size += 1 + len(word)
+        kept += 1
+    return words[len(words) - kept:] if kept else []
+
+
+def chunk_pages(pages: Iterable[str], source: str, chunk_size: int = 500,
+                chunk_overlap: int = 50) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield (chunk_text, metadata) for a document given as pages.
+
+    Args:
+        pages: page texts (any iterable, consumed lazily)
+        source: value of the "source" metadata field
+        chunk_size: max chunk length in characters (a single longer word
+            becomes its own chunk)
+        chunk_overlap: max characters repeated from the previous chunk
+    """
+    chunk_idx = 0
+    buffer: List[Tuple[str, int]] = []  # (word, page)
+    size = -1  # _length(buffer), kept incrementally
+    fresh = 0  # words in buffer not yet emitted in a chunk
+
+    def emit(words):
+        metadata = {"source": source, "chunk": chunk_idx, "page_start": words[0][1], "page_end": words[-1][1]}
+        return " ".join(w for w, _ in words), metadata
+
+    for word, page_no in iter_words(pages):
+        while buffer and size + 1 + len(word) > chunk_size:
+            if fresh == 0:
+                # Only overlap left and it does not fit with the next word
+                buffer, size = [], -1
+                break
+            cut = max(_cut_point(buffer, chunk_size), len(buffer) - fresh + 1)
+            yield emit(buffer[:cut])
+            chunk_idx += 1
+            rest = buffer[cut:]
+            buffer = _overlap(buffer[:cut], chunk_overlap) + rest
+            size = _length(buffer)
+            fresh = len(rest)
+        buffer.append((word, page_no))
+        size += 1 + len(word)
+        fresh += 1
+
+    if fresh:
+        yield emit(buffer)
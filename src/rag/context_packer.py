@@ -0,0 +1,185 @@
+"""
+Context Packer
+
+Turns retrieved chunks into a compact prompt context:
+- Merges adjacent chunks of the same source and strips their overlap
+- Drops sentences already present in the context (overlap remnants,
+  repeated headers/footers) and common PDF boilerplate
+- Respects a per-model token budget (small models pay dearly for prefill)
+- Reports how many prompt tokens were saved
+"""
+
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import CONTEXT_TOKEN_BUDGETS, CONTEXT_TOKEN_BUDGET_DEFAULT
+
+# Rough French/English average for the Qwen/Llama/Gemma tokenizers
+CHARS_PER_TOKEN = 3.5
+MIN_OVERLAP_CHARS = 15
+MAX_OVERLAP_CHARS = 400
+MIN_DEDUP_SENTENCE_CHARS = 20
+SEPARATOR = "\n\n---\n\n"
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_BOILERPLATE = [
+    re.compile(r'\.{4,}'),                                   # table-of-contents leaders
+    re.compile(r'https?://\S+|www\.\S+'),                     # URLs in page footers
+    re.compile(r'(?i)\bpage\s+\d+(\s*(/|sur)\s*\d+)?\b'),     # "Page 3 / 12"
+    re.compile(r'©[^.]*'),                                    # copyright lines
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer round-trip)"""
+    return int(len(text) / CHARS_PER_TOKEN + 0.5)
+
+
+def token_budget_for(model_name: str) -> int:
+    """Context token budget for a model"""
+    return CONTEXT_TOKEN_BUDGETS.get(model_name, CONTEXT_TOKEN_BUDGET_DEFAULT)
+
+
+@dataclass
+class PackedContext:
+    """Result of packing: prompt text + what went in + savings"""
+    text: str
+    passages: List[Tuple[str, List[dict]]] = field(default_factory=list)
+    tokens_before: int = 0
+    tokens_after: int = 0
+    chunks_merged: int = 0
+    chunks_dropped: int = 0
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def get_stats(self) -> dict:
+        return {
+            "context_tokens": self.tokens_after,
+            "context_tokens_saved": self.tokens_saved,
+            "chunks_merged": self.chunks_merged,
+            "chunks_dropped": self.chunks_dropped,
+            "context_truncated": self.truncated,
+        }
+
+
+def _strip_boilerplate(text: str) -> str:
+    for pattern in _BOILERPLATE:
+        text = pattern.sub(' ', text)
+    return " ".join(text.split())
+
+
+def _merge_overlap(left: str, right: str) -> str:
+    """Join two consecutive chunks, removing the text they share"""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    # Character-offset overlap may have cut a word: try realigning on the right chunk's first space
+    head = right.split(' ', 1)
+    if len(head) == 2 and len(head[1]) >= MIN_OVERLAP_CHARS:
+        tail = head[1]
+        for size in range(min(len(left), len(tail), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+            if left.endswith(tail[:size]):
+                return left + tail[size:]
+    return left + " " + right
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+class ContextPacker:
+    """
+    Packs retrieved (document, metadata) pairs into a prompt context.
+
+    Relevance order is preserved at the passage level: a merged passage
+    takes the rank of its best chunk.
+    """
+
+    def __init__(self, separator: str = SEPARATOR):
+        self.separator = separator
+
+    def pack(self, documents: List[str], metadatas: List[dict], token_budget: int = CONTEXT_TOKEN_BUDGET_DEFAULT) -> PackedContext:
+        if not documents:
+            return PackedContext(text="")
+
+        result = PackedContext(text="")
+        result.tokens_before = estimate_tokens(self.separator.join(documents))
+
+        # 1. Group by source (in rank order of first appearance), merge consecutive chunks
+        groups = {}
+        for rank, (doc, meta) in enumerate(zip(documents, metadatas)):
+            groups.setdefault(meta.get('source', ''), []).append((meta.get('chunk', rank), rank, doc, meta))
+
+        passages = []  # (best_rank, text, metas)
+        for items in groups.values():
+            items.sort(key=lambda item: item[0])
+            current = None
+            for chunk_idx, rank, doc, meta in items:
+                doc = _strip_boilerplate(doc)
+                if current is not None and chunk_idx == current['last_idx'] + 1:
+                    current['text'] = _merge_overlap(current['text'], doc)
+                    current['rank'] = min(current['rank'], rank)
+                    current['metas'].append(meta)
+                    current['last_idx'] = chunk_idx
+                    result.chunks_merged += 1
+                    continue
+                if current is not None:
+                    passages.append((current['rank'], current['text'], current['metas']))
+                current = {'text': doc, 'rank': rank, 'metas': [meta], 'last_idx': chunk_idx}
+            passages.append((current['rank'], current['text'], current['metas']))
+        passages.sort(key=lambda p: p[0])
+
+        # 2. Drop sentences already in the context, 3. fill the token budget
+        packed_norm = ""
+        budget_chars = int(token_budget * CHARS_PER_TOKEN)
+        used_chars = 0
+        packed = []
+        for position, (_, text, metas) in enumerate(passages):
+            sentences, passage_norm = [], ""
+            for sentence in _SENTENCE_SPLIT.split(text):
+                key = _sentence_key(sentence)
+                if len(key) >= MIN_DEDUP_SENTENCE_CHARS and (key in packed_norm or key in passage_norm):
+                    continue
+                sentences.append(sentence)
+                passage_norm += " " + key
+            if not sentences:
+                result.chunks_dropped += len(metas)
+                continue
+
+            remaining = budget_chars - used_chars - (len(self.separator) if packed else 0)
+            kept = []
+            for sentence in sentences:
+                if len(sentence) + 1 > remaining:
+                    result.truncated = True
+                    break
+                kept.append(sentence)
+                remaining -= len(sentence) + 1
+            if not kept and not packed and remaining > 0:
+                # A single oversized sentence: cut it at a word boundary rather than send nothing
+                kept = [sentences[0][:remaining].rsplit(' ', 1)[0]]
+            if not kept:
+                result.truncated = True
+                result.chunks_dropped += len(metas)
+                continue
+
+            passage = " ".join(kept)
+            packed.append((passage, metas))
+            packed_norm += " " + _sentence_key(passage)
+            used_chars += len(passage) + (len(self.separator) if len(packed) > 1 else 0)
+            if result.truncated:
+                result.chunks_dropped += sum(len(m) for _, _, m in passages[position + 1:])
+                break
+
+        result.passages = packed
+        result.text = self.separator.join(p for p, _ in packed)
+        result.tokens_after = estimate_tokens(result.text)
+        return result
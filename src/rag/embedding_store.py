@@ -0,0 +1,200 @@
+"""
+Persistent Chunk Embedding Store
+
+On-disk cache of chunk embeddings, so re-ingesting the same course material
+(or benchmark configs that share a chunking setting) only embeds text that
+was never seen before:
+- SQLite table keyed by (model name, SHA-256 of the chunk text)
+- Vectors stored as float16 (half the size of float32, ample for cosine)
+- ChunkEncoder: store lookup, then length-sorted batches for the misses
+  (similar lengths per batch means less padding in the transformer)
+"""
+
+import sys
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import EMBEDDING_MODEL, EMBEDDING_STORE_ENABLED, EMBEDDING_STORE_PATH, EMBEDDING_BATCH_SIZE
+from rag.embeddings import get_embedder
+
+logger = logging.getLogger(__name__)
+
+SQLITE_MAX_PARAMS = 500
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    SQLite-backed (model, text hash) -> float16 vector store.
+
+    Safe to share between threads; WAL mode lets several processes
+    (e.g. parallel benchmark runs) read and write the same file.
+    """
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash BLOB NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """Stored vectors (float16) for the hashes that are present"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), SQLITE_MAX_PARAMS):
+                batch = unique[start:start + SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dim, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for digest, dim, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float16)
+                    if len(vector) == dim:
+                        found[bytes(digest)] = vector
+        return found
+
+    def put_many(self, model: str, hashes: Sequence[bytes], vectors: np.ndarray):
+        """Store vectors (converted to float16)"""
+        vectors = np.asarray(vectors, dtype=np.float16)
+        rows = [(model, digest, vectors.shape[1], vector.tobytes()) for digest, vector in zip(hashes, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def count(self, model: str = None) -> int:
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ChunkEncoder:
+    """
+    Chunk embedding with the persistent store in front of the model.
+
+    Returned vectors always go through float16, so a chunk gets the same
+    vector whether it was just computed or read back from the store.
+    """
+
+    def __init__(self, model_name: str = None, store: EmbeddingStore = None, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name or EMBEDDING_MODEL
+        self.model = get_embedder(self.model_name)
+        self.store = store
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.padded_chars = 0
+        self.text_chars = 0
+
+    def _encode_sorted(self, texts: List[str], before_batch: Callable[[], None] = None) -> np.ndarray:
+        """Encode in batches of similar length (longest first), returns vectors in input order"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            if before_batch is not None:
+                before_batch()
+            lengths = [len(texts[i]) for i in batch]
+            self.padded_chars += max(lengths) * len(batch)
+            self.text_chars += sum(lengths)
+            encoded = self.model.encode([texts[i] for i in batch], batch_size=len(batch))
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector
+        return np.asarray(vectors, dtype=np.float32)
+
+    def encode(self, texts: List[str], before_batch: Callable[[], None] = None) -> np.ndarray:
+        """
+        Embed chunk texts.
+
+        Args:
+            texts: chunk texts
+            before_batch: called before each forward pass (e.g. to yield the
+                CPU to queries during a background re-index)
+
+        Returns:
+            float32 array of shape (len(texts), dim), in input order
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.store is None:
+            self.misses += len(texts)
+            return self._encode_sorted(texts, before_batch).astype(np.float16).astype(np.float32)
+
+        hashes = [text_hash(t) for t in texts]
+        found = self.store.get_many(self.model_name, hashes)
+
+        missing = {}  # hash -> text, duplicates embedded once
+        for digest, text in zip(hashes, texts):
+            if digest not in found:
+                missing.setdefault(digest, text)
+        # hits + misses == len(texts): repeats within the batch count as hits
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self._encode_sorted(list(missing.values()), before_batch).astype(np.float16)
+            self.store.put_many(self.model_name, list(missing.keys()), computed)
+            found.update(zip(missing.keys(), computed))
+
+        return np.stack([found[d] for d in hashes]).astype(np.float32)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "stored": self.store.count(self.model_name) if self.store is not None else 0,
+            # Share of padded positions (chars as a proxy for tokens) in the encoded batches
+            "padding_waste": 1 - self.text_chars / self.padded_chars if self.padded_chars else 0.0,
+        }
+
+
+_store: EmbeddingStore = None
+_encoders: Dict[str, ChunkEncoder] = {}
+_lock = threading.Lock()
+
+
+def get_chunk_encoder(model_name: str = None) -> ChunkEncoder:
+    """Shared ChunkEncoder for model_name (backed by the shared store unless disabled)"""
+    global _store
+    model_name = model_name or EMBEDDING_MODEL
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        # get_embedder() takes its own locks, so load outside _lock
+        model_store = None
+        if EMBEDDING_STORE_ENABLED:
+            with _lock:
+                if _store is None:
+                    _store = EmbeddingStore()
+                model_store = _store
+        candidate = ChunkEncoder(model_name, model_store)
+        with _lock:
+            encoder = _encoders.setdefault(model_name, candidate)
+    return encoder
@@ -0,0 +1,188 @@
+"""
+Shared Embedding Models
+
+Process-wide registry of SentenceTransformer models:
+- One loaded model per model name, shared by every RAGModule,
+  the benchmark and the router
+- Thread-safe lazy loading (concurrent callers wait for the first load)
+- QueryEncoder: LRU cache of query embeddings + batched encode_many()
+"""
+
+import sys
+import threading
+import logging
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import EMBEDDING_MODEL, QUERY_EMBEDDING_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_models: Dict[str, SentenceTransformer] = {}
+_registry_lock = threading.Lock()
+_load_locks: Dict[str, threading.Lock] = {}
+
+
+def get_embedder(model_name: str = None) -> SentenceTransformer:
+    """
+    Return the shared SentenceTransformer for model_name, loading it once.
+
+    Args:
+        model_name: HuggingFace model name (default: config.EMBEDDING_MODEL)
+    """
+    model_name = model_name or EMBEDDING_MODEL
+
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    # One lock per model name so that loading model A doesn't block users of model B
+    with _registry_lock:
+        load_lock = _load_locks.setdefault(model_name, threading.Lock())
+
+    with load_lock:
+        model = _models.get(model_name)
+        if model is None:
+            logger.info(f"Loading embedding model: {model_name}")
+            model = SentenceTransformer(model_name)
+            _models[model_name] = model
+    return model
+
+
+def loaded_models() -> list:
+    """Names of the embedding models currently resident in this process"""
+    return list(_models.keys())
+
+
+def release_embedder(model_name: str):
+    """Drop a model from the registry (e.g. after a benchmark sweep)"""
+    with _registry_lock:
+        _models.pop(model_name, None)
+        _load_locks.pop(model_name, None)
+        _encoders.pop(model_name, None)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as cache key (Unicode NFC, collapsed whitespace)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class QueryEncoder:
+    """
+    Query embedding layer with an LRU cache keyed by normalized text.
+
+    Repeated questions skip the forward pass entirely, and encode_many()
+    vectorizes all cache misses of a batch in a single encode() call.
+    Concurrent callers asking for the same text (e.g. speculative retrieval
+    on several subjects) share one computation.
+    """
+
+    def __init__(self, model_name: str = None, cache_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.model_name = model_name or EMBEDDING_MODEL
+        self.model = get_embedder(self.model_name)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embed a single query, returns a 1-D float32 vector"""
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of queries in one forward pass.
+
+        Returns:
+            float32 array of shape (len(texts), dim), in input order
+        """
+        keys = [normalize_query(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        to_compute: List[str] = []
+        to_wait: Dict[str, threading.Event] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+                elif key in self._pending:
+                    to_wait[key] = self._pending[key]
+                    self.hits += 1
+                else:
+                    self._pending[key] = threading.Event()
+                    to_compute.append(key)
+                    self.misses += 1
+
+        if to_compute:
+            try:
+                vectors = np.asarray(self.model.encode(to_compute), dtype=np.float32)
+                with self._lock:
+                    for key, vector in zip(to_compute, vectors):
+                        vector.setflags(write=False)
+                        self._cache[key] = vector
+                        found[key] = vector
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            finally:
+                # Always release waiters, even if encode() raised
+                with self._lock:
+                    events = [self._pending.pop(key) for key in to_compute]
+                for event in events:
+                    event.set()
+
+        for key, event in to_wait.items():
+            event.wait()
+            with self._lock:
+                vector = self._cache.get(key)
+            if vector is None:
+                # The other caller failed or the entry was evicted already
+                vector = np.asarray(self.model.encode([key]), dtype=np.float32)[0]
+            found[key] = vector
+
+        return np.stack([found[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def clear(self):
+        """Drop all cached query embeddings"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> dict:
+        """Cache statistics"""
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_encoders: Dict[str, QueryEncoder] = {}
+
+
+def get_query_encoder(model_name: str = None) -> QueryEncoder:
+    """Return the shared QueryEncoder (and its cache) for model_name"""
+    model_name = model_name or EMBEDDING_MODEL
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        with _registry_lock:
+            encoder = _encoders.get(model_name)
+        if encoder is None:
+            # get_embedder() takes its own locks, so build outside _registry_lock
+            candidate = QueryEncoder(model_name)
+            with _registry_lock:
+                encoder = _encoders.setdefault(model_name, candidate)
+    return encoder
@@ -0,0 +1,317 @@
+"""
+Index Bundle
+
+Versioned on-disk format for the hybrid-search index (replaces the BM25
+pickle): a directory of .npy arrays plus a manifest.json.
+- Arrays are opened with mmap, so startup costs a few page faults and the
+  pages are shared read-only between worker processes
+- Strings (ids, documents, JSON metadata) are stored as one UTF-8 blob plus
+  an offsets table, decoded on access
+- StringSpill / ConcatTable: the same tables for chunks added by an
+  incremental ingest, spilled to a temporary file instead of held in lists
+- Every file can be checked against the SHA-256 recorded in the manifest
+  (sizes are always checked)
+- Each save writes a new version directory, then switches the CURRENT
+  pointer file with os.replace: readers see the old or the new bundle,
+  never a partial one or none
+- No pickle: loading never executes code from the data directory
+
+Layout:
+    {collection}_index/
+        CURRENT             name of the live version
+        v<time_ns>-<pid>/
+            manifest.json
+            <name>.npy ...
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Sequence, Tuple
+
+import numpy as np
+
+BUNDLE_FORMAT = "rag-index-bundle"
+BUNDLE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+POINTER_NAME = "CURRENT"
+
+
+class BundleError(Exception):
+    """Missing, incompatible or corrupted bundle"""
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_dtype(max_value: int):
+    """Smallest index dtype SciPy keeps as-is (int32 arrays stay memory-mapped)"""
+    return np.int32 if max_value < np.iinfo(np.int32).max else np.int64
+
+
+# ---- Strings ----
+
+def encode_strings(strings: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack strings into (UTF-8 blob, offsets), offsets[i]:offsets[i+1] is string i"""
+    blob, offsets = bytearray(), array("q", [0])
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return np.frombuffer(bytes(blob), dtype=np.uint8), np.frombuffer(offsets, dtype=np.int64).copy()
+
+
+class StringTable:
+    """Read-only list of strings backed by a (blob, offsets) pair"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = np.asarray(offsets)  # plain view: memmap indexing is slow per item
+        self._buffer = memoryview(np.asarray(blob))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _text(self, start: int, end: int) -> str:
+        return str(self._buffer[start:end], "utf-8")
+
+    def _decode(self, i: int) -> str:
+        return self._text(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._decode(i)
+
+    def __iter__(self) -> Iterator[str]:
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            yield self._text(start, end)
+
+
+class JsonTable(StringTable):
+    """StringTable of JSON documents (e.g. chunk metadata), parsed on access"""
+
+    def _text(self, start: int, end: int):
+        return json.loads(super()._text(start, end))
+
+
+class StringSpill:
+    """
+    Append-only string column in an unlinked temporary file, read back as a
+    (memory-mapped) StringTable: memory stays flat however much is appended.
+    """
+
+    def __init__(self, spill_dir: str = None):
+        try:
+            self._file = tempfile.TemporaryFile(prefix="strings-", dir=spill_dir)
+        except OSError:
+            self._file = tempfile.TemporaryFile(prefix="strings-")  # e.g. read-only data directory
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, strings: Iterable[str]):
+        for s in strings:
+            data = s.encode("utf-8")
+            self._file.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+
+    def append_json(self, values: Iterable):
+        self.append(json.dumps(v, ensure_ascii=False, sort_keys=True) for v in values)
+
+    def table(self, cls=StringTable) -> StringTable:
+        """The strings appended so far (the mapping stays valid after this object is gone)"""
+        self._file.flush()
+        if self._offsets[-1]:
+            blob = np.memmap(self._file, dtype=np.uint8, mode="r", shape=(self._offsets[-1],))
+        else:
+            blob = np.zeros(0, dtype=np.uint8)  # an empty file cannot be mapped
+        return cls(blob, np.frombuffer(self._offsets, dtype=np.int64).copy())
+
+
+class ConcatTable:
+    """
+    Read-only concatenation of row tables (lists, StringTables), with
+    optional replaced rows. Nested ConcatTables are flattened.
+    """
+
+    def __init__(self, parts: Sequence[Sequence], overrides: Dict[int, object] = None):
+        self.parts = []
+        self.overrides = {}
+        length = 0
+        for part in parts:
+            if isinstance(part, ConcatTable):
+                self.parts.extend(part.parts)
+                self.overrides.update((length + row, value) for row, value in part.overrides.items())
+            elif len(part):
+                self.parts.append(part)
+            length += len(part)
+        self.overrides.update(overrides or {})
+        self._starts = [0]
+        for part in self.parts:
+            self._starts.append(self._starts[-1] + len(part))
+
+    def __len__(self) -> int:
+        return self._starts[-1]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i in self.overrides:
+            return self.overrides[i]
+        part = bisect_right(self._starts, i) - 1
+        return self.parts[part][i - self._starts[part]]
+
+    def __iter__(self) -> Iterator:
+        row = 0
+        for part in self.parts:
+            for value in part:
+                yield self.overrides.get(row, value)
+                row += 1
+
+
+# ---- Save / load ----
+
+def _live_version(path: Path):
+    """Directory of the version CURRENT points to, None if there is no pointer"""
+    try:
+        name = (path / POINTER_NAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return path / name
+
+
+def save_bundle(path, arrays: Dict[str, np.ndarray], meta: dict = None):
+    """
+    Write a bundle as a new version directory, then point CURRENT to it
+    with os.replace (atomic on POSIX and Windows).
+
+    The previous version is kept, so a process that read the old pointer
+    can still open its files; older versions are removed. Processes that
+    already map old files keep reading them.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    previous = _live_version(path)
+    version = path / f"v{time.time_ns()}-{os.getpid()}"
+    version.mkdir()
+
+    entries = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        file_name = f"{name}.npy"
+        np.save(version / file_name, array, allow_pickle=False)
+        entries[name] = {
+            "file": file_name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "bytes": (version / file_name).stat().st_size,
+            "sha256": _file_sha256(version / file_name),
+        }
+
+    manifest = {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION, "arrays": entries, "meta": meta or {}}
+    with open(version / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+    pointer_tmp = path / f"{POINTER_NAME}.tmp-{os.getpid()}"
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version.name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, path / POINTER_NAME)
+
+    keep = {version.name, previous.name if previous is not None else None, POINTER_NAME}
+    for entry in path.iterdir():
+        if entry.name in keep:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+        else:  # files of the unversioned layout, stale pointer temp files
+            entry.unlink(missing_ok=True)
+
+
+def load_bundle(path, verify: bool = True) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Open the live version of a bundle (or an unversioned bundle directory).
+
+    File sizes are always checked against the manifest; verify also
+    compares SHA-256 checksums, which reads every file once.
+
+    Returns:
+        ({name: read-only memory-mapped array}, meta)
+
+    Raises:
+        BundleError if the bundle is missing, from another format version,
+        or a file does not match its size or checksum
+    """
+    path = Path(path)
+    path = _live_version(path) or path
+    manifest_path = path / MANIFEST_NAME
+    if not manifest_path.exists():
+        raise BundleError(f"No bundle at {path}")
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except ValueError as e:
+        raise BundleError(f"Unreadable manifest: {e}") from e
+    if manifest.get("format") != BUNDLE_FORMAT or manifest.get("version") != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle {manifest.get('format')} v{manifest.get('version')}")
+
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        file_path = path / entry["file"]
+        if not file_path.exists():
+            raise BundleError(f"Missing array file {entry['file']}")
+        if "bytes" in entry and file_path.stat().st_size != entry["bytes"]:
+            raise BundleError(f"Size mismatch for {entry['file']}")
+        if verify and _file_sha256(file_path) != entry["sha256"]:
+            raise BundleError(f"Checksum mismatch for {entry['file']}")
+        # Empty arrays cannot be memory-mapped
+        if entry["shape"] and 0 in entry["shape"]:
+            array = np.load(file_path, allow_pickle=False)
+        else:
+            array = np.load(file_path, mmap_mode="r", allow_pickle=False)
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise BundleError(f"Unexpected dtype/shape for {entry['file']}")
+        arrays[name] = array
+    return arrays, manifest.get("meta", {})
+
+
+def put_strings(arrays: Dict[str, np.ndarray], name: str, strings: Iterable[str]):
+    """Add a string column as {name}_blob / {name}_offsets"""
+    arrays[f"{name}_blob"], arrays[f"{name}_offsets"] = encode_strings(strings)
+
+
+def put_json(arrays: Dict[str, np.ndarray], name: str, values: Iterable):
+    """Add a JSON column (one document per row)"""
+    put_strings(arrays, name, (json.dumps(v, ensure_ascii=False, sort_keys=True) for v in values))
+
+
+def get_strings(arrays: Dict[str, np.ndarray], name: str) -> StringTable:
+    return StringTable(arrays[f"{name}_blob"], arrays[f"{name}_offsets"])
+
+
+def get_json(arrays: Dict[str, np.ndarray], name: str) -> JsonTable:
+    return JsonTable(arrays[f"{name}_blob"], arrays[f"{name}_offsets"])
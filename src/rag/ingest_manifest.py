@@ -0,0 +1,131 @@
+"""
+Ingestion Manifest
+
+Tracks which knowledge-base files are already in a collection so that
+ingest() only processes new or changed files:
+- One JSON manifest per collection, next to the Chroma data
+- Files are fingerprinted by size/mtime first, SHA-256 only when those changed
+- Chunk IDs are content-addressed (file path + chunk text), so unchanged
+  chunks keep their ID and stale ones can be deleted precisely
+"""
+
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(relative_path: str, chunk_text: str, occurrence: int = 0) -> str:
+    """
+    Content-addressed chunk ID.
+
+    occurrence disambiguates identical chunks inside the same file.
+    """
+    key = f"{relative_path}\0{occurrence}\0{chunk_text}".encode("utf-8")
+    return hashlib.sha1(key).hexdigest()
+
+
+class IngestManifest:
+    """
+    Per-collection record of ingested files and their chunk IDs.
+
+    Layout:
+        {"version": 1,
+         "settings": {...chunking / embedding settings...},
+         "files": {relative_path: {"sha256", "size", "mtime", "chunk_ids"}}}
+    """
+
+    def __init__(self, path: Path, settings: dict):
+        self.path = Path(path)
+        self.settings = settings
+        self.files: Dict[str, dict] = {}
+        self.compatible = False
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+            return
+        # Different chunking or embedding settings invalidate every chunk
+        if data.get("version") != MANIFEST_VERSION or data.get("settings") != self.settings:
+            logger.info(f"Manifest settings changed, full re-ingest required ({self.path.name})")
+            self.files = data.get("files", {})
+            return
+        self.files = data.get("files", {})
+        self.compatible = True
+
+    def save(self):
+        """Atomically write the manifest"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "settings": self.settings, "files": self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, relative_path: str, file_path: str) -> Optional[str]:
+        """
+        Check a file against the manifest.
+
+        Returns:
+            None if the file is unchanged, else its SHA-256 (to pass to record())
+        """
+        stat = os.stat(file_path)
+        entry = self.files.get(relative_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return None
+
+        sha = file_sha256(file_path)
+        if entry and entry["sha256"] == sha:
+            # Touched but identical: refresh the cheap fingerprint only
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+            return None
+        return sha
+
+    def chunk_ids(self, relative_path: str) -> List[str]:
+        """Chunk IDs currently stored for a file"""
+        entry = self.files.get(relative_path)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def all_chunk_ids(self) -> List[str]:
+        """Chunk IDs of every recorded file"""
+        return [cid for entry in self.files.values() for cid in entry["chunk_ids"]]
+
+    def record(self, relative_path: str, file_path: str, sha: str, ids: List[str]):
+        """Record a (re-)ingested file"""
+        stat = os.stat(file_path)
+        self.files[relative_path] = {
+            "sha256": sha,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunk_ids": ids,
+        }
+
+    def forget(self, relative_path: str) -> List[str]:
+        """Remove a file from the manifest, returns its chunk IDs"""
+        entry = self.files.pop(relative_path, None)
+        return entry["chunk_ids"] if entry else []
+
+    def reset(self):
+        """Drop every entry (after a settings change)"""
+        self.files = {}
+        self.compatible = True
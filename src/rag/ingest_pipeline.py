@@ -0,0 +1,377 @@
+"""
+Streaming Ingestion Pipeline
+
+Staged ingestion with bounded memory, used by RAGModule.ingest():
+1. Extraction: PDFs are parsed in a process pool (PyPDF2 is pure Python
+   and CPU-bound; spawned workers, never forked from this threaded
+   process); at most a small window of files is in flight
+   Without a pool, pages are parsed lazily as the chunker consumes them
+   PDFs already in the extracted text cache (rag/text_cache.py) are not
+   parsed at all
+2. Chunking: done by the caller on each extracted file, chunks are streamed
+3. Embedding: fixed-size batches in a worker thread
+4. Upsert: batches capped to Chroma's max batch size in another thread
+
+Stages are connected by bounded queues, so the amount of text and vectors
+held at once does not grow with the corpus. Progress and throughput are
+logged (and optionally passed to a callback).
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# PDF support
+try:
+    from PyPDF2 import PdfReader
+    PDF_SUPPORT = True
+except ImportError:
+    PDF_SUPPORT = False
+    logger.warning("PyPDF2 not installed. PDF support disabled.")
+
+DEFAULT_CHROMA_MAX_BATCH = 5000
+PROGRESS_INTERVAL_S = 2.0
+
+
+# ---- Extraction (runs in worker processes: module-level functions only) ----
+
+def read_pdf_pages(file_path: str) -> List[str]:
+    """Extract the text of every page of a PDF"""
+    if not PDF_SUPPORT:
+        return []
+    try:
+        reader = PdfReader(file_path)
+        pages = [page.extract_text() or "" for page in reader.pages]
+        logger.debug(f"Extracted {sum(len(p) for p in pages)} chars from {file_path}")
+        return pages
+    except Exception as e:
+        logger.error(f"Error reading PDF {file_path}: {e}")
+        return []
+
+
+def read_txt(file_path: str) -> str:
+    """Read a text file"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except Exception as e:
+        logger.error(f"Error reading {file_path}: {e}")
+        return ""
+
+
+def extract_pages(file_path: str) -> List[str]:
+    """Pages of a document (a text file is a single page)"""
+    if file_path.endswith(".pdf"):
+        return read_pdf_pages(file_path)
+    return [read_txt(file_path)]
+
+
+def _iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Page texts of a PDF, parsed as the caller reads (raises on a broken PDF)"""
+    for page in PdfReader(file_path).pages:
+        yield page.extract_text() or ""
+
+
+def iter_pages(file_path: str) -> Iterator[str]:
+    """Like extract_pages, but a PDF is parsed one page at a time as the caller reads"""
+    if not file_path.endswith(".pdf"):
+        yield read_txt(file_path)
+        return
+    if not PDF_SUPPORT:
+        return
+    try:
+        yield from _iter_pdf_pages(file_path)
+    except Exception as e:
+        logger.error(f"Error reading PDF {file_path}: {e}")
+
+
+def chroma_max_batch_size(client) -> int:
+    """Largest batch the Chroma client accepts in one add/upsert/update"""
+    getter = getattr(client, "get_max_batch_size", None)
+    if callable(getter):
+        try:
+            return int(getter())
+        except Exception:
+            pass
+    return int(getattr(client, "max_batch_size", DEFAULT_CHROMA_MAX_BATCH) or DEFAULT_CHROMA_MAX_BATCH)
+
+
+def batched(items: Sequence, size: int) -> Iterator[Sequence]:
+    """Consecutive slices of at most size items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ---- Pipeline ----
+
+@dataclass
+class IngestStats:
+    """Progress / throughput of one ingestion run"""
+    files_total: int = 0
+    files_done: int = 0
+    chunks_queued: int = 0
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    pdfs_cached: int = 0  # PDFs whose text came from the extracted text cache
+    pdfs_extracted: int = 0
+    embed_s: float = 0.0
+    upsert_s: float = 0.0
+    started: float = field(default_factory=time.time)
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.time() - self.started
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks_upserted / self.elapsed_s if self.elapsed_s else 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("started")
+        data["elapsed_s"] = self.elapsed_s
+        data["chunks_per_s"] = self.chunks_per_s
+        return data
+
+
+class _Stop:
+    """Queue sentinel"""
+
+
+class IngestPipeline:
+    """
+    Extract -> chunk -> embed -> upsert with bounded queues.
+
+    Usage (see RAGModule.ingest):
+        pipeline = IngestPipeline(embed_fn, collection, max_batch_size)
+        for item, pages in pipeline.extract(files):   # ordered like files
+            ... chunk, pipeline.add(chunk_id, text, metadata) ...
+        stats = pipeline.finish()
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], collection, max_batch_size: int = DEFAULT_CHROMA_MAX_BATCH,
+                 workers: int = None, embed_batch_size: int = 64, queue_batches: int = 4,
+                 progress: Optional[Callable[[IngestStats], None]] = None,
+                 on_upserted: Optional[Callable[[List[str], List[str], List[dict]], None]] = None,
+                 before_write: Optional[Callable[[], None]] = None, text_cache=None):
+        self.embed_fn = embed_fn
+        self.collection = collection
+        self.upsert_batch_size = max(1, max_batch_size)
+        self.embed_batch_size = embed_batch_size
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.progress = progress
+        self.on_upserted = on_upserted
+        self.before_write = before_write  # called before each Chroma upsert (background re-index: yield to queries)
+        self.text_cache = text_cache  # ExtractedTextCache or None
+        self.stats = IngestStats()
+
+        self._batch: Tuple[List[str], List[str], List[dict]] = ([], [], [])
+        self._embed_queue: "queue.Queue" = queue.Queue(maxsize=queue_batches)
+        self._upsert_queue: "queue.Queue" = queue.Queue(maxsize=queue_batches)
+        self._error: Optional[BaseException] = None
+        self._last_report = 0.0
+        self._threads = [
+            threading.Thread(target=self._embed_worker, daemon=True, name="ingest-embed"),
+            threading.Thread(target=self._upsert_worker, daemon=True, name="ingest-upsert"),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # ---- Stage 1: extraction ----
+
+    def extract(self, files: Sequence[Tuple[str, object]]) -> Iterator[Tuple[object, Iterable[str]]]:
+        """
+        Extract documents, yielding (item, pages) in input order.
+
+        pages is a list when the file came from the text cache or went through
+        the process pool, otherwise a lazy iterator that must be consumed
+        before the next file is requested (a PDF enters the text cache once
+        its iterator is exhausted).
+
+        Args:
+            files: [(file_path, item)], item is passed back untouched
+        """
+        self.stats.files_total = len(files)
+        cache = self.text_cache
+        to_parse = [path for path, _ in files if path.endswith(".pdf") and (cache is None or not cache.contains(path))]
+        pool = None
+        if self.workers > 1 and len(to_parse) > 1:
+            # spawn, not fork: this process runs the embed/upsert threads (and torch, Chroma, the
+            # server loop), and a forked child can deadlock on a lock one of them held
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        window = max(2, self.workers * 2)
+        pending = []  # [(item, path, cached pages, future or None)], at most window files in flight
+        files = iter(files)
+        try:
+            while True:
+                while len(pending) < window:
+                    entry = next(files, None)
+                    if entry is None:
+                        break
+                    path, item = entry
+                    is_pdf = path.endswith(".pdf")
+                    cached = cache.get(path) if cache is not None and is_pdf else None
+                    if cached is not None:
+                        self.stats.pdfs_cached += 1
+                        pending.append((item, path, cached))
+                        continue
+                    future = pool.submit(extract_pages, path) if pool is not None and is_pdf else None
+                    pending.append((item, path, future))
+                if not pending:
+                    break
+                item, path, source = pending.pop(0)
+                if isinstance(source, list):
+                    pages = source
+                elif source is not None:
+                    pages = source.result()
+                    self.stats.pdfs_extracted += 1
+                    if cache is not None and pages:  # [] means the PDF could not be read
+                        cache.put(path, pages)
+                elif cache is not None and path.endswith(".pdf"):
+                    pages = self._iter_and_cache(path)
+                else:
+                    # Text files are cheap: read in order, in this thread
+                    pages = iter_pages(path)
+                yield item, pages
+                self.stats.files_done += 1
+                self._report()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_and_cache(self, path: str) -> Iterator[str]:
+        """Parse a PDF lazily; once every page has been read, store the pages in the text cache"""
+        self.stats.pdfs_extracted += 1
+        if not PDF_SUPPORT:
+            return
+        pages = []
+        try:
+            for page in _iter_pdf_pages(path):
+                pages.append(page)
+                yield page
+        except Exception as e:
+            logger.error(f"Error reading PDF {path}: {e}")
+            return
+        self.text_cache.put(path, pages)
+
+    # ---- Stage 2 -> 3: chunks in ----
+
+    def add(self, chunk_id: str, text: str, metadata: dict):
+        """Queue one new chunk for embedding + upsert (blocks when the stages are busy)"""
+        ids, texts, metadatas = self._batch
+        ids.append(chunk_id)
+        texts.append(text)
+        metadatas.append(metadata)
+        self.stats.chunks_queued += 1
+        if len(ids) >= self.embed_batch_size:
+            self._put(self._embed_queue, self._batch)
+            self._batch = ([], [], [])
+
+    def finish(self) -> IngestStats:
+        """Flush, wait for every batch to be stored and return the stats"""
+        try:
+            if self._batch[0]:
+                self._put(self._embed_queue, self._batch)
+                self._batch = ([], [], [])
+            self._put(self._embed_queue, _Stop)
+        finally:
+            for thread in self._threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+        self._report(final=True)
+        return self.stats
+
+    def close(self):
+        """Abort: stop the worker threads without flushing"""
+        if self._error is None:
+            self._error = RuntimeError("Ingestion aborted")
+        for thread in self._threads:
+            thread.join()
+
+    def _put(self, q: "queue.Queue", item):
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: "queue.Queue"):
+        while True:
+            if self._error is not None:
+                return _Stop
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    # ---- Stage 3: embedding ----
+
+    def _embed_worker(self):
+        try:
+            while True:
+                batch = self._get(self._embed_queue)
+                if batch is _Stop:
+                    break
+                ids, texts, metadatas = batch
+                start = time.time()
+                embeddings = np.asarray(self.embed_fn(texts), dtype=np.float32)
+                self.stats.embed_s += time.time() - start
+                self.stats.chunks_embedded += len(ids)
+                self._put(self._upsert_queue, (ids, texts, metadatas, embeddings))
+        except BaseException as e:
+            self._error = self._error or e
+        finally:
+            if self._error is None:
+                self._put(self._upsert_queue, _Stop)
+
+    # ---- Stage 4: upsert ----
+
+    def _upsert_worker(self):
+        try:
+            while True:
+                batch = self._get(self._upsert_queue)
+                if batch is _Stop:
+                    break
+                ids, texts, metadatas, embeddings = batch
+                start = time.time()
+                for i in range(0, len(ids), self.upsert_batch_size):
+                    j = i + self.upsert_batch_size
+                    if self.before_write is not None:
+                        self.before_write()
+                    self.collection.upsert(
+                        ids=ids[i:j], documents=texts[i:j], metadatas=metadatas[i:j], embeddings=embeddings[i:j].tolist()
+                    )
+                self.stats.upsert_s += time.time() - start
+                self.stats.chunks_upserted += len(ids)
+                if self.on_upserted is not None:
+                    self.on_upserted(ids, texts, metadatas)
+        except BaseException as e:
+            self._error = self._error or e
+
+    # ---- Progress ----
+
+    def _report(self, final: bool = False):
+        now = time.time()
+        if not final and now - self._last_report < PROGRESS_INTERVAL_S:
+            return
+        self._last_report = now
+        s = self.stats
+        logger.info(f"{'Ingested' if final else 'Ingesting'}: {s.files_done}/{s.files_total} files, "
+                    f"{s.chunks_upserted}/{s.chunks_queued} chunks stored, {s.chunks_per_s:.0f} chunks/s "
+                    f"(embed {s.embed_s:.1f}s, upsert {s.upsert_s:.1f}s)")
+        if self.progress is not None:
+            self.progress(s)
@@ -0,0 +1,209 @@
+"""
+Knowledge Base Watcher
+
+Re-indexes a subject when files in its knowledge base folder change, so
+course material can be updated without restarting the server:
+- Polls the size and mtime of every .txt / .pdf under the watched folders
+  (no extra dependency, a few hundred stat() calls per pass)
+- Waits until a folder has been quiet for KB_WATCH_DEBOUNCE_S, so a copy
+  in progress is not ingested half-written
+- A failed re-index keeps the change pending and is retried with backoff
+- Re-indexes one subject at a time in a single background thread with a
+  lower CPU priority (Linux: per-thread nice, inherited by the PDF
+  extraction processes)
+- RAGModule.ingest() builds the new index snapshot next to the live one and
+  swaps it in with one assignment: queries keep running during the rebuild
+
+While the rebuild runs, chunk embedding batches and Chroma writes wait for
+in-flight retrievals to finish (see foreground()), and writes are kept
+small, so students do not queue behind it.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import KB_WATCH_INTERVAL_S, KB_WATCH_DEBOUNCE_S, KB_REINDEX_NICE
+
+logger = logging.getLogger(__name__)
+
+WATCHED_SUFFIXES = (".txt", ".pdf")
+# Longest a background batch waits for queries to finish (the re-index never starves)
+MAX_YIELD_S = 2.0
+# Chunks per Chroma write during a background re-index: the Chroma client
+# holds the GIL for a whole call (about 0.6 ms per chunk with chromadb 1.x)
+BACKGROUND_WRITE_BATCH = 32
+# Longest wait before retrying a failed re-index (doubles from interval_s)
+MAX_RETRY_DELAY_S = 300.0
+
+
+class _ForegroundActivity:
+    """Count of retrievals in flight, process-wide"""
+
+    def __init__(self):
+        self._active = 0
+        self._idle = threading.Condition()
+
+    @contextmanager
+    def busy(self):
+        with self._idle:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._active -= 1
+                if not self._active:
+                    self._idle.notify_all()
+
+    def wait_idle(self, timeout: float = MAX_YIELD_S) -> bool:
+        """Block until no retrieval is in flight (or timeout), True if idle"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._active, timeout)
+
+
+_foreground = _ForegroundActivity()
+
+
+def foreground():
+    """Context manager marking a latency-sensitive retrieval in flight"""
+    return _foreground.busy()
+
+
+def yield_to_foreground():
+    """Called by background work between batches: let in-flight retrievals finish first"""
+    _foreground.wait_idle()
+
+
+def _lower_priority(nice: int):
+    """Lower the calling thread's CPU priority (Linux only: elsewhere nice applies to the whole process)"""
+    if nice <= 0 or not sys.platform.startswith("linux"):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError) as e:
+        logger.warning(f"Could not lower re-index thread priority: {e}")
+
+
+def _signature(directory: str) -> Dict[str, Tuple[int, int]]:
+    """relative path -> (size, mtime_ns) of the watched files"""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.lower().endswith(WATCHED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # removed while walking
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class KnowledgeBaseWatcher:
+    """
+    Background re-indexing of subject folders.
+
+    Usage:
+        watcher = KnowledgeBaseWatcher({"MATH": (rag_math, "knowledge_base/math")})
+        watcher.start()
+    """
+
+    def __init__(self, targets: Dict[str, tuple], interval_s: float = KB_WATCH_INTERVAL_S,
+                 debounce_s: float = KB_WATCH_DEBOUNCE_S, nice: int = KB_REINDEX_NICE):
+        """
+        Args:
+            targets: subject -> (RAGModule, knowledge base folder)
+            interval_s: seconds between two scans
+            debounce_s: quiet time after the last change before re-indexing
+            nice: priority decrease of the re-index thread (0 = unchanged)
+        """
+        self.targets = targets
+        self.interval_s = interval_s
+        self.debounce_s = debounce_s
+        self.nice = nice
+        self.reindex_count = 0
+        self.last_reindex = {}  # subject -> {"seconds", "changed", "index_version", ...}
+        self._signatures = {}
+        self._changed_at = {}  # subject -> monotonic time of the last change seen
+        self._failures = {}  # subject -> consecutive failed re-indexes
+        self._retry_at = {}  # subject -> monotonic time of the next attempt after a failure
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Take the current state as indexed and start watching"""
+        if self._thread is not None:
+            return
+        self._signatures = {subject: _signature(folder) for subject, (_, folder) in self.targets.items()}
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching knowledge base folders of {', '.join(self.targets)} every {self.interval_s:g}s")
+
+    def stop(self, timeout: float = None):
+        """Stop watching (a re-index in progress finishes first)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        _lower_priority(self.nice)
+        while not self._stop.wait(self.interval_s):
+            for subject in self.targets:
+                try:
+                    self.poll(subject)
+                except Exception:
+                    logger.exception(f"Re-indexing {subject} failed, keeping the current index")
+
+    def poll(self, subject: str) -> bool:
+        """
+        Scan one subject folder and re-index it once it has settled.
+
+        Returns:
+            True if a re-index ran
+        """
+        rag, folder = self.targets[subject]
+        signature = _signature(folder)
+        now = time.monotonic()
+        if signature != self._signatures.get(subject):
+            self._signatures[subject] = signature
+            self._changed_at[subject] = now
+            logger.info(f"Knowledge base change detected for {subject}")
+            return False
+        changed_at = self._changed_at.get(subject)
+        if changed_at is None or now - changed_at < self.debounce_s:
+            return False
+        retry_at = self._retry_at.get(subject)
+        if retry_at is not None and now < retry_at:
+            return False
+
+        start = time.perf_counter()
+        try:
+            changed = rag.ingest(folder, background=True)
+        except Exception:
+            # Keep the change pending and retry later, backing off up to MAX_RETRY_DELAY_S
+            failures = self._failures[subject] = self._failures.get(subject, 0) + 1
+            self._retry_at[subject] = time.monotonic() + min(MAX_RETRY_DELAY_S, self.interval_s * 2 ** failures)
+            raise
+        del self._changed_at[subject]
+        self._failures.pop(subject, None)
+        self._retry_at.pop(subject, None)
+        self.reindex_count += 1
+        self.last_reindex[subject] = {
+            "seconds": time.perf_counter() - start,
+            "changed": changed,
+            "index_version": rag.index_version,
+            **rag.last_ingest_stats,
+        }
+        logger.info(f"Re-indexed {subject} in {self.last_reindex[subject]['seconds']:.1f}s "
+                    f"(changed: {changed}, index version {rag.index_version})")
+        return True
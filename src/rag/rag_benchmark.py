@@ -4,26 +4,50 @@ RAG Benchmark Script (Simplified)
 This script evaluates RAG configurations using the actual RAG module.
 No code duplication - uses rag_module.py directly.
 
+Each config is measured with a cold pass (first queries after ingest), a
+warm-up, then repeated warm passes timed per query (p50/p95/p99), along
+with peak RSS and ingest throughput. A run is compared with the previous
+latest_results.json and exits non-zero when hit rate or p95 latency
+regresses beyond the thresholds, or when a config failed or is missing
+from the run (the baseline is then left unchanged).
+
 Usage:
-    python -m src.rag.rag_benchmark --run
+    python -m src.rag.rag_benchmark --run [--workers N] [--passes N] [--warmup N]
+    python -m src.rag.rag_benchmark --run --max-latency-regression 0.2 --max-hit-rate-drop 0.02
     python -m src.rag.rag_benchmark --run --config multilingual
     python -m src.rag.rag_benchmark --report
+    python -m src.rag.rag_benchmark --bm25-parity [--config NAME]
+    python -m src.rag.rag_benchmark --vector-crossover
+    python -m src.rag.rag_benchmark --quantization [--config NAME]
 """
 
+import os
 import json
 import time
 import logging
 import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from dataclasses import dataclass, asdict
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import sys
 
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import numpy as np
+
 from rag.rag_module import RAGModule
+from rag.storage import get_store, release_store
+from rag.retrieval_core import top_k
+from rag.vector_index import DenseVectorIndex
 from rag.rag_configs import BENCHMARK_CONFIGS, RAGConfig, get_config_by_name
 from config import KNOWLEDGE_BASE_DIR, DATA_DIR
 
@@ -31,6 +55,13 @@ from config import KNOWLEDGE_BASE_DIR, DATA_DIR
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
 
+WARMUP_PASSES = 1
+TIMED_PASSES = 5
+# Regression gate: relative p95 increase and absolute hit-rate drop
+MAX_LATENCY_REGRESSION = 0.20
+MAX_HIT_RATE_DROP = 0.02
+LATENCY_NOISE_MS = 1.0  # p95 increases below this are timer noise, never a regression
+
 
 @dataclass
 class BenchmarkResult:
@@ -38,10 +69,106 @@ class BenchmarkResult:
     config_name: str
     hit_rate: float
     mrr: float
-    avg_retrieval_time_ms: float
+    avg_retrieval_time_ms: float  # single retrieve(), mean of the warm passes
     total_ingestion_time_s: float
     num_chunks: int
     details: List[dict]
+    # Single-query retrieve() latency, query embedding included
+    cold_ms: float = 0.0  # mean of the first pass after ingest
+    p50_ms: float = 0.0  # warm passes
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    ingest_chunks_per_s: float = 0.0
+    peak_rss_mb: float = 0.0  # of the process that ran the config (cumulative when sequential)
+    batch_ms_per_query: float = 0.0  # one batched retrieve_many() over all queries, amortized per query
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (0 if unknown)"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def compare_results(results: List[BenchmarkResult], baseline: Optional[dict],
+                    max_latency_regression: float = MAX_LATENCY_REGRESSION,
+                    max_hit_rate_drop: float = MAX_HIT_RATE_DROP, compare_latency: bool = True,
+                    expected: List[str] = None) -> List[dict]:
+    """
+    Diff results against a saved run (latest_results.json format).
+
+    Latency is compared on p95, unless compare_latency is off (runs measured
+    under different conditions) or the baseline predates p95: its
+    avg_retrieval_time_ms was batch-amortized in some versions, so hit
+    rates only are compared. Configs missing from the baseline are reported,
+    never flagged; baseline configs in expected (the configs the run was
+    meant to cover) without a result are regressions.
+
+    Returns:
+        One row per result, then per missing config: config, baseline /
+        current values (None when missing), regressions
+    """
+    previous = {r["config_name"]: r for r in (baseline or {}).get("results", [])}
+    rows = []
+    for result in results:
+        row = {"config_name": result.config_name, "hit_rate": result.hit_rate, "latency_ms": result.p95_ms,
+               "baseline_hit_rate": None, "baseline_latency_ms": None, "regressions": []}
+        old = previous.get(result.config_name)
+        if old is not None:
+            old_ms, new_ms = old.get("p95_ms") or None, row["latency_ms"]
+            row["baseline_hit_rate"], row["baseline_latency_ms"] = old["hit_rate"], old_ms
+            if old["hit_rate"] - result.hit_rate > max_hit_rate_drop + 1e-9:
+                row["regressions"].append(f"hit rate {old['hit_rate']*100:.1f}% -> {result.hit_rate*100:.1f}%")
+            if (compare_latency and old_ms is not None and new_ms > old_ms * (1 + max_latency_regression)
+                    and new_ms - old_ms > LATENCY_NOISE_MS):
+                row["regressions"].append(f"latency {old_ms:.1f}ms -> {new_ms:.1f}ms")
+        rows.append(row)
+    
+    measured = {result.config_name for result in results}
+    for name in expected or []:
+        old = previous.get(name)
+        if old is None or name in measured:
+            continue
+        rows.append({"config_name": name, "hit_rate": None, "latency_ms": None,
+                     "baseline_hit_rate": old["hit_rate"],
+                     "baseline_latency_ms": old.get("p95_ms") or None,
+                     "regressions": ["missing from this run"]})
+    return rows
+
+
+def ingest_key(config: RAGConfig) -> tuple:
+    """Settings that determine the ingested collection (configs differing only in top_k share it)"""
+    return (config.embedding_model, config.chunk_size, config.chunk_overlap)
+
+
+def group_configs(configs: List[RAGConfig]) -> List[List[RAGConfig]]:
+    """Configs grouped by ingest_key, in order of first appearance"""
+    groups = {}
+    for config in configs:
+        groups.setdefault(ingest_key(config), []).append(config)
+    return list(groups.values())
+
+
+def _init_worker(threads: int):
+    """Process pool initializer: share the CPUs between the workers"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _run_group_in_worker(knowledge_base_dir: str, configs: List[RAGConfig],
+                        passes: int, warmup: int) -> List[BenchmarkResult]:
+    """Run one ingest group in a worker process"""
+    return RAGBenchmark(knowledge_base_dir, passes=passes, warmup=warmup)._run_group_safely(configs)
+
+
+def _remove_store(path: Path):
+    """Drop the shared Chroma handle of a temporary directory, then the directory"""
+    release_store(str(path))
+    shutil.rmtree(path, ignore_errors=True)
 
 
 class RAGBenchmark:
@@ -50,8 +177,13 @@ class RAGBenchmark:
     No code duplication - single source of truth for RAG logic.
     """
     
-    def __init__(self, knowledge_base_dir: str = None):
+    def __init__(self, knowledge_base_dir: str = None, passes: int = TIMED_PASSES, warmup: int = WARMUP_PASSES):
         self.knowledge_base_dir = knowledge_base_dir or str(KNOWLEDGE_BASE_DIR)
+        self.passes = max(1, passes)
+        self.warmup = max(0, warmup)
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.workers = 1  # of the last run_all(): latencies are only comparable at the same count
+        self.failed: List[str] = []  # configs of the last run_all() whose ingest group failed
         self.results_dir = Path(DATA_DIR) / "benchmark_results"
         self.results_dir.mkdir(parents=True, exist_ok=True)
         
@@ -65,58 +197,68 @@ class RAGBenchmark:
     
     def run_config(self, config: RAGConfig) -> BenchmarkResult:
         """Run benchmark for a single configuration using the real RAG module"""
+        return self.run_group([config])[0]
+    
+    def run_group(self, configs: List[RAGConfig]) -> List[BenchmarkResult]:
+        """
+        Ingest once for configs sharing an ingest_key (same model and
+        chunking), then run the test queries for each of them.
+        """
+        first = configs[0]
         logger.info(f"\n{'='*60}")
-        logger.info(f"Testing config: {config.name}")
-        logger.info(f"  Embedding: {config.embedding_model}")
-        logger.info(f"  Chunk size: {config.chunk_size}, Top-k: {config.top_k}")
+        logger.info(f"Testing configs: {', '.join(c.name for c in configs)}")
+        logger.info(f"  Embedding: {first.embedding_model}")
+        logger.info(f"  Chunk size: {first.chunk_size}, Top-k: {', '.join(str(c.top_k) for c in configs)}")
         logger.info(f"{'='*60}")
         
-        # Create temporary directory for this benchmark
-        temp_db_path = Path(DATA_DIR) / f"benchmark_temp_{config.name}"
-        shutil.rmtree(temp_db_path, ignore_errors=True)
-        
-        # Initialize RAG module with this config's settings
         start_ingest = time.time()
-        rag = RAGModule(
-            collection_name=f"benchmark_{config.name}",
-            persistence_path=str(temp_db_path),
-            chunk_size=config.chunk_size,
-            chunk_overlap=config.chunk_overlap
-        )
-        
-        # Temporarily override embedding model if different
-        if config.embedding_model != rag.embedder.get_sentence_embedding_dimension():
-            from sentence_transformers import SentenceTransformer
-            rag.embedder = SentenceTransformer(config.embedding_model)
-        
-        # Ingest using the real RAG module
-        rag.ingest(self.knowledge_base_dir)
+        rag, temp_db_path = self._build_rag(first)
         ingestion_time = time.time() - start_ingest
         
         num_chunks = rag.collection.count()
-        logger.info(f"Ingested {num_chunks} chunks in {ingestion_time:.1f}s")
-        
-        # Run test queries
-        logger.info("Running test queries...")
+        logger.info(f"Ingested {num_chunks} chunks in {ingestion_time:.1f}s "
+                    f"(embedding store: {rag.last_ingest_stats.get('embedding_store_hits', 0)} reused, "
+                    f"{rag.last_ingest_stats.get('embedding_store_misses', 0)} embedded; "
+                    f"text cache: {rag.last_ingest_stats.get('pdfs_cached', 0)} PDFs reused, "
+                    f"{rag.last_ingest_stats.get('pdfs_extracted', 0)} parsed)")
+        try:
+            return [self._evaluate(rag, config, ingestion_time, num_chunks) for config in configs]
+        finally:
+            _remove_store(temp_db_path)
+    
+    def _evaluate(self, rag: RAGModule, config: RAGConfig, ingestion_time: float, num_chunks: int) -> BenchmarkResult:
+        """Run the test queries with config's top_k on an ingested module"""
+        logger.info(f"Running test queries ({config.name})...")
         results = []
+        questions = [q['question'] for q in self.test_queries]
         
-        for q in self.test_queries:
-            start = time.time()
-            docs, metas = rag.retrieve(q['question'], n_results=config.top_k)
-            elapsed = (time.time() - start) * 1000
-            
+        # Single queries as the server sees them: cold pass, warm-up, then timed warm passes
+        cold = self._timed_pass(rag, questions, config.top_k)
+        for _ in range(self.warmup):
+            self._timed_pass(rag, questions, config.top_k)
+        warm = np.stack([self._timed_pass(rag, questions, config.top_k) for _ in range(self.passes)])
+        p50, p95, p99 = np.percentile(warm, [50, 95, 99])
+        query_ms = warm.mean(axis=0)
+        
+        # One batched call: embeddings, vector search and BM25 scoring for all queries at once
+        rag.query_encoder.clear()  # every config pays for its query embeddings, whatever ran before
+        start = time.perf_counter()
+        retrieved = rag.retrieve_many(questions, n_results=config.top_k)
+        batch_ms = (time.perf_counter() - start) * 1000 / max(1, len(questions))
+        
+        for q, (docs, metas), elapsed in zip(self.test_queries, retrieved, query_ms):
             # Check hit based on keywords
             expected_keywords = [kw.lower() for kw in q.get('expected_keywords', [])]
             hit, rank = self._check_hit(docs, expected_keywords)
             
             status = "✅" if hit else "❌"
-            logger.info(f"  {status} {q['id']}: rank={rank}, time={elapsed:.0f}ms")
+            logger.info(f"  {status} {q['id']}: rank={rank}")
             
             results.append({
                 'query_id': q['id'],
                 'hit': hit,
                 'rank': rank,
-                'time_ms': elapsed
+                'time_ms': float(elapsed)
             })
         
         # Calculate metrics
@@ -124,22 +266,215 @@ class RAGBenchmark:
         hit_rate = hits / len(results)
         mrr = sum(1/r['rank'] if r['rank'] > 0 else 0 for r in results) / len(results)
         avg_time = sum(r['time_ms'] for r in results) / len(results)
+        rss = peak_rss_mb()
         
-        # Cleanup
-        shutil.rmtree(temp_db_path, ignore_errors=True)
-        
-        logger.info(f"\nResults: Hit Rate={hit_rate*100:.1f}%, MRR={mrr:.3f}, Avg={avg_time:.1f}ms")
+        logger.info(f"\nResults ({config.name}): Hit Rate={hit_rate*100:.1f}%, MRR={mrr:.3f}, Avg={avg_time:.1f}ms "
+                    f"(batched: {batch_ms:.1f}ms/query)")
+        logger.info(f"  Latency: cold {cold.mean():.1f}ms, warm p50 {p50:.1f} / p95 {p95:.1f} / p99 {p99:.1f}ms "
+                    f"({self.passes} x {len(questions)} queries), peak RSS {rss:.0f} MB")
         
         return BenchmarkResult(
             config_name=config.name,
             hit_rate=hit_rate,
             mrr=mrr,
             avg_retrieval_time_ms=avg_time,
-            total_ingestion_time_s=ingestion_time,
+            total_ingestion_time_s=ingestion_time,  # shared by the configs of one ingest group
             num_chunks=num_chunks,
-            details=results
+            details=results,
+            cold_ms=float(cold.mean()),
+            p50_ms=float(p50),
+            p95_ms=float(p95),
+            p99_ms=float(p99),
+            ingest_chunks_per_s=num_chunks / ingestion_time if ingestion_time > 0 else 0.0,
+            peak_rss_mb=rss,
+            batch_ms_per_query=batch_ms
         )
     
+    @staticmethod
+    def _timed_pass(rag: RAGModule, questions: List[str], top_k: int) -> np.ndarray:
+        """Milliseconds of one retrieve() per question, query embeddings not cached"""
+        rag.query_encoder.clear()
+        times = np.empty(len(questions))
+        for i, question in enumerate(questions):
+            start = time.perf_counter()
+            rag.retrieve(question, n_results=top_k)
+            times[i] = (time.perf_counter() - start) * 1000
+        return times
+    
+    def _build_rag(self, config: RAGConfig, **options):
+        """Fresh RAG module with this config's settings, ingested into a temporary directory"""
+        temp_db_path = Path(DATA_DIR) / f"benchmark_temp_{config.name}"
+        _remove_store(temp_db_path)
+        
+        rag = RAGModule(
+            collection_name=f"benchmark_{config.name}",
+            persistence_path=str(temp_db_path),
+            chunk_size=config.chunk_size,
+            chunk_overlap=config.chunk_overlap,
+            embedding_model=config.embedding_model,
+            read_only=False,  # benchmarks always ingest into their own temporary store
+            **options
+        )
+        
+        # Ingest using the real RAG module
+        rag.ingest(self.knowledge_base_dir)
+        return rag, temp_db_path
+    
+    def check_bm25_parity(self, config: RAGConfig, top_n: int = 10) -> dict:
+        """
+        Compare the sparse BM25 index with rank_bm25.BM25Okapi on the test queries:
+        same top-n rankings, max score difference and per-query scoring time.
+        """
+        try:
+            from rank_bm25 import BM25Okapi
+        except ImportError:
+            logger.error("rank_bm25 not installed: pip install rank-bm25")
+            return {}
+        
+        rag, temp_db_path = self._build_rag(config)
+        if rag.bm25_index is None:
+            logger.error("BM25 index not available")
+            _remove_store(temp_db_path)
+            return {}
+        corpus = [rag._bm25_tokens(doc) for doc in rag.core.documents]
+        reference = BM25Okapi(corpus)
+        
+        same_rankings, max_diff = 0, 0.0
+        reference_ms, sparse_ms = [], []
+        for q in self.test_queries:
+            tokens = rag._bm25_query_tokens(q['question'])
+            
+            start = time.perf_counter()
+            expected = reference.get_scores(tokens)
+            reference_ms.append((time.perf_counter() - start) * 1000)
+            
+            start = time.perf_counter()
+            actual = rag.bm25_index.get_scores(tokens)
+            sparse_ms.append((time.perf_counter() - start) * 1000)
+            
+            expected_top = sorted(range(len(expected)), key=lambda i: expected[i], reverse=True)[:top_n]
+            actual_top = top_k(actual, top_n).tolist()
+            same = expected_top == actual_top
+            same_rankings += same
+            max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+            if not same:
+                logger.info(f"  ❌ {q['id']}: rank_bm25={expected_top} sparse={actual_top}")
+        
+        _remove_store(temp_db_path)
+        
+        summary = {
+            'config_name': config.name,
+            'num_chunks': len(corpus),
+            'queries': len(self.test_queries),
+            'same_top_n': same_rankings,
+            'max_score_diff': max_diff,
+            'rank_bm25_ms': sum(reference_ms) / len(reference_ms),
+            'sparse_ms': sum(sparse_ms) / len(sparse_ms),
+        }
+        logger.info(f"\nBM25 parity ({config.name}): {same_rankings}/{len(self.test_queries)} identical top-{top_n}, "
+                    f"max score diff {max_diff:.2e}, {summary['rank_bm25_ms']:.2f}ms -> {summary['sparse_ms']:.2f}ms per query")
+        return summary
+    
+    def vector_crossover(self, sizes: List[int] = None, dim: int = 384, n_queries: int = 50, k: int = 10) -> dict:
+        """
+        Per-query latency of Chroma (HNSW) vs the in-process matrix index on
+        random vectors of growing collection size, to place DENSE_INDEX_MAX_CHUNKS.
+        """
+        sizes = sorted(sizes or [100, 1000, 2000, 5000, 10000, 20000, 50000])
+        rng = np.random.default_rng(0)
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+        temp_db_path = Path(DATA_DIR) / "benchmark_temp_vector_crossover"
+        _remove_store(temp_db_path)
+        collection = get_store(str(temp_db_path), read_only=False).collection("vector_crossover")
+        
+        rows, vectors = [], np.zeros((0, dim), dtype=np.float32)
+        crossover = None
+        try:
+            for size in sizes:
+                added = rng.standard_normal((size - len(vectors), dim), dtype=np.float32)
+                for start in range(0, len(added), 5000):
+                    batch = added[start:start + 5000]
+                    first = len(vectors) + start
+                    collection.add(ids=[str(i) for i in range(first, first + len(batch))], embeddings=batch.tolist())
+                vectors = np.concatenate([vectors, added])
+                index = DenseVectorIndex(vectors)
+                
+                start = time.perf_counter()
+                for q in queries:
+                    collection.query(query_embeddings=[q.tolist()], n_results=k)
+                chroma_ms = (time.perf_counter() - start) * 1000 / n_queries
+                
+                start = time.perf_counter()
+                for q in queries:
+                    index.search(q, k)
+                numpy_ms = (time.perf_counter() - start) * 1000 / n_queries
+                
+                start = time.perf_counter()
+                index.search(queries, k)
+                numpy_batch_ms = (time.perf_counter() - start) * 1000 / n_queries
+                
+                rows.append({'size': size, 'chroma_ms': chroma_ms, 'numpy_ms': numpy_ms,
+                             'numpy_batch_ms': numpy_batch_ms, 'matrix_mb': index.nbytes / 1e6})
+                logger.info(f"  {size:>6} vectors: chroma {chroma_ms:.2f}ms, numpy {numpy_ms:.2f}ms "
+                            f"(batched {numpy_batch_ms:.3f}ms/query), matrix {index.nbytes / 1e6:.1f} MB")
+                if crossover is None and numpy_ms >= chroma_ms:
+                    crossover = size
+        finally:
+            del collection
+            _remove_store(temp_db_path)
+        
+        logger.info(f"\nVector crossover: numpy is faster " +
+                    (f"below ~{crossover} vectors" if crossover else f"up to at least {sizes[-1]} vectors"))
+        return {'dim': dim, 'k': k, 'queries': n_queries, 'crossover': crossover, 'sizes': rows}
+    
+    def compare_quantization(self, config: RAGConfig, kinds=("none", "float16", "int8")) -> dict:
+        """
+        Hit rate, agreement with float32, resident index size and latency of
+        the in-process vector index for each quantization.
+        """
+        rag, temp_db_path = self._build_rag(config, vector_backend="numpy")
+        questions = [q['question'] for q in self.test_queries]
+        rag.retrieve_many(questions, n_results=config.top_k)  # warm the query embedding cache
+        
+        rows, reference = [], {}
+        try:
+            for kind in kinds:
+                rag.vector_quantization = kind
+                core, vectors = rag._build_vector_index(rag.core, rag.bm25_index)
+                rag._publish(core, rag.bm25_index, vectors)
+                if rag.vector_index is None:
+                    logger.error("In-process vector index not available")
+                    return {}
+                
+                row = {'quantization': kind, 'index_mb': rag.vector_index.nbytes / 1e6}
+                for mode, hybrid in (('vector', False), ('hybrid', True)):
+                    start = time.perf_counter()
+                    for question in questions:
+                        rag.retrieve(question, n_results=config.top_k, use_hybrid=hybrid)
+                    row[f'{mode}_ms'] = (time.perf_counter() - start) * 1000 / len(questions)
+                    
+                    retrieved = rag.retrieve_many(questions, n_results=config.top_k, use_hybrid=hybrid)
+                    ranks = [self._check_hit(docs, [kw.lower() for kw in q.get('expected_keywords', [])])[1]
+                             for q, (docs, _) in zip(self.test_queries, retrieved)]
+                    row[f'{mode}_hit_rate'] = sum(1 for r in ranks if r) / len(ranks)
+                    row[f'{mode}_mrr'] = sum(1 / r for r in ranks if r) / len(ranks)
+                    reference.setdefault(mode, retrieved)
+                    row[f'{mode}_same_as_float32'] = sum(a == b for a, b in zip(retrieved, reference[mode])) / len(ranks)
+                rows.append(row)
+        finally:
+            _remove_store(temp_db_path)
+        
+        base_mb = rows[0]['index_mb'] or 1.0
+        lines = [f"\nQuantization ({config.name}, {rag.collection.count()} chunks):",
+                 "| Codes | Index MB | Saved | Hit (vector) | Hit (hybrid) | Same top-k | ms/query (vector) | ms/query (hybrid) |",
+                 "|-------|----------|-------|--------------|--------------|------------|-------------------|-------------------|"]
+        for r in rows:
+            lines.append(f"| {r['quantization']} | {r['index_mb']:.2f} | {(1 - r['index_mb'] / base_mb) * 100:.0f}% "
+                         f"| {r['vector_hit_rate']*100:.1f}% | {r['hybrid_hit_rate']*100:.1f}% "
+                         f"| {r['vector_same_as_float32']*100:.0f}% | {r['vector_ms']:.2f} | {r['hybrid_ms']:.2f} |")
+        logger.info("\n".join(lines))
+        return {'config_name': config.name, 'rows': rows}
+    
     def _check_hit(self, docs: List[str], keywords: List[str]) -> tuple:
         """Check if keywords are found in retrieved docs"""
         for i, doc in enumerate(docs):
@@ -149,37 +484,87 @@ class RAGBenchmark:
                 return True, i + 1
         return False, 0
     
-    def run_all(self, configs: List[RAGConfig] = None) -> List[BenchmarkResult]:
-        """Run benchmark for all configurations"""
+    def run_all(self, configs: List[RAGConfig] = None, workers: int = 0) -> List[BenchmarkResult]:
+        """
+        Run benchmark for all configurations.
+        
+        Configs with the same ingest_key share one ingest; the groups are
+        independent and run in a process pool (workers: 0 = auto, 1 = in
+        this process). Results keep the order of configs; the names of
+        configs whose group failed are left in self.failed.
+        """
         configs = configs or BENCHMARK_CONFIGS
-        results = []
+        groups = group_configs(configs)
+        if workers <= 0:
+            workers = max(1, min(len(groups), (os.cpu_count() or 2) // 2))
+        workers = self.workers = min(workers, len(groups))
+        logger.info(f"{len(configs)} configs in {len(groups)} ingest groups, {workers} worker(s)")
         
-        for config in configs:
-            try:
-                result = self.run_config(config)
-                results.append(result)
-                self._save_results(results)
-            except Exception as e:
-                logger.error(f"Error testing {config.name}: {e}")
+        by_name = {}
+        self.failed = []
+        start = time.time()
+        if workers == 1:
+            for group in groups:
+                by_name.update((r.config_name, r) for r in self._run_group_safely(group))
+                self.failed.extend(c.name for c in group if c.name not in by_name)
+                self._save_results([by_name[c.name] for c in configs if c.name in by_name], update_latest=False)
+        else:
+            # spawn: workers must not inherit Chroma / model state, and torch threads are split between them
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(threads,)) as pool:
+                futures = {pool.submit(_run_group_in_worker, self.knowledge_base_dir, group, self.passes,
+                                       self.warmup): group for group in groups}
+                for future in as_completed(futures):
+                    group = futures[future]
+                    try:
+                        by_name.update((r.config_name, r) for r in future.result())
+                    except Exception as e:  # the worker process died (BrokenProcessPool, ...)
+                        logger.error(f"Error testing {', '.join(c.name for c in group)}: {e}")
+                    self.failed.extend(c.name for c in group if c.name not in by_name)
+                    self._save_results([by_name[c.name] for c in configs if c.name in by_name], update_latest=False)
         
-        return results
+        logger.info(f"Benchmark finished in {time.time() - start:.1f}s")
+        if self.failed:
+            logger.error(f"{len(self.failed)} config(s) failed: {', '.join(self.failed)}")
+        return [by_name[c.name] for c in configs if c.name in by_name]
+    
+    def _run_group_safely(self, configs: List[RAGConfig]) -> List[BenchmarkResult]:
+        try:
+            return self.run_group(configs)
+        except Exception as e:
+            logger.error(f"Error testing {', '.join(c.name for c in configs)}: {e}")
+            return []
+    
+    def load_results(self, path: str = None) -> Optional[dict]:
+        """A saved run (default: latest_results.json), None if there is none"""
+        path = Path(path) if path else self.results_dir / "latest_results.json"
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
     
-    def _save_results(self, results: List[BenchmarkResult]):
-        """Save results to JSON"""
-        output_path = self.results_dir / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    def _save_results(self, results: List[BenchmarkResult], comparison: List[dict] = None,
+                      update_latest: bool = True):
+        """Save results to JSON (one file per run, rewritten as groups finish)"""
+        output_path = self.results_dir / f"benchmark_{self.run_id}.json"
         
         data = {
             "timestamp": datetime.now().isoformat(),
+            "workers": self.workers,
             "results": [asdict(r) for r in results]
         }
+        if comparison is not None:
+            data["comparison"] = comparison
         
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
         
-        # Also save as latest
-        latest_path = self.results_dir / "latest_results.json"
-        with open(latest_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Also save as latest (the baseline of the next run)
+        if update_latest:
+            latest_path = self.results_dir / "latest_results.json"
+            with open(latest_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
         
         logger.info(f"Results saved to {output_path}")
     
@@ -196,13 +581,32 @@ class RAGBenchmark:
         
         lines = ["# RAG Benchmark Results\n"]
         lines.append(f"**Date**: {data['timestamp']}\n")
-        lines.append("\n| Config | Hit Rate | MRR | Time (ms) |")
-        lines.append("|--------|----------|-----|-----------|")
+        lines.append("\n| Config | Hit Rate | MRR | Time (ms) | Batch (ms/query) | Cold (ms) | p50 / p95 / p99 (ms) | Ingest (chunks/s) | Peak RSS (MB) |")
+        lines.append("|--------|----------|-----|-----------|------------------|-----------|----------------------|-------------------|---------------|")
         
         for r in results:
-            lines.append(f"| {r['config_name']} | {r['hit_rate']*100:.1f}% | {r['mrr']:.3f} | {r['avg_retrieval_time_ms']:.1f} |")
+            lines.append(f"| {r['config_name']} | {r['hit_rate']*100:.1f}% | {r['mrr']:.3f} | {r['avg_retrieval_time_ms']:.1f} "
+                         f"| {r.get('batch_ms_per_query', 0):.1f} | {r.get('cold_ms', 0):.1f} | {r.get('p50_ms', 0):.1f} / {r.get('p95_ms', 0):.1f} / {r.get('p99_ms', 0):.1f} "
+                         f"| {r.get('ingest_chunks_per_s', 0):.0f} | {r.get('peak_rss_mb', 0):.0f} |")
         
         return "\n".join(lines)
+    
+    @staticmethod
+    def format_comparison(rows: List[dict]) -> str:
+        """Markdown table of compare_results() rows"""
+        lines = ["| Config | Hit Rate (base -> now) | Latency ms (base -> now) | Status |",
+                 "|--------|------------------------|--------------------------|--------|"]
+        for row in rows:
+            if row["baseline_hit_rate"] is None:
+                base_hit, base_ms, status = "-", "-", "new"
+            else:
+                base_hit = f"{row['baseline_hit_rate']*100:.1f}%"
+                base_ms = "-" if row["baseline_latency_ms"] is None else f"{row['baseline_latency_ms']:.1f}"
+                status = "REGRESSION: " + "; ".join(row["regressions"]) if row["regressions"] else "ok"
+            hit = "-" if row["hit_rate"] is None else f"{row['hit_rate']*100:.1f}%"
+            ms = "-" if row["latency_ms"] is None else f"{row['latency_ms']:.1f}"
+            lines.append(f"| {row['config_name']} | {base_hit} -> {hit} | {base_ms} -> {ms} | {status} |")
+        return "\n".join(lines)
 
 
 def main():
@@ -212,22 +616,72 @@ def main():
     parser.add_argument("--run", action="store_true", help="Run benchmark")
     parser.add_argument("--report", action="store_true", help="Generate report")
     parser.add_argument("--config", type=str, help="Specific config name")
+    parser.add_argument("--workers", type=int, default=0, help="Processes for --run (0 = auto, 1 = sequential)")
+    parser.add_argument("--passes", type=int, default=TIMED_PASSES, help="Timed warm passes over the test queries")
+    parser.add_argument("--warmup", type=int, default=WARMUP_PASSES, help="Untimed passes after the cold pass")
+    parser.add_argument("--baseline", type=str, help="Results file to compare with (default: latest_results.json)")
+    parser.add_argument("--max-latency-regression", type=float, default=MAX_LATENCY_REGRESSION,
+                        help="Allowed relative p95 latency increase (0.2 = +20%%)")
+    parser.add_argument("--max-hit-rate-drop", type=float, default=MAX_HIT_RATE_DROP,
+                        help="Allowed absolute hit rate drop (0.02 = 2 points)")
+    parser.add_argument("--bm25-parity", action="store_true", help="Check sparse BM25 against rank_bm25")
+    parser.add_argument("--vector-crossover", action="store_true", help="Time Chroma vs in-process vector search by collection size")
+    parser.add_argument("--quantization", action="store_true", help="Compare float32/float16/int8 vector index codes")
     
     args = parser.parse_args()
-    benchmark = RAGBenchmark()
+    benchmark = RAGBenchmark(passes=args.passes, warmup=args.warmup)
+    regressed = False
     
     if args.run:
+        configs = None
         if args.config:
             config = get_config_by_name(args.config)
             if config:
-                benchmark.run_config(config)
+                configs = [config]
             else:
                 logger.error(f"Config '{args.config}' not found")
+                regressed = True  # nothing was checked: do not let the gate pass
+        if configs or not args.config:
+            baseline = benchmark.load_results(args.baseline)  # read before this run replaces it
+            results = benchmark.run_all(configs, workers=args.workers)
+            # Parallel workers share the CPUs: latencies of runs with different worker counts do not compare
+            same_setup = baseline is not None and baseline.get("workers", 1) == benchmark.workers
+            if baseline is not None and not same_setup:
+                logger.warning(f"Baseline ran with {baseline.get('workers', 1)} worker(s), this run with "
+                               f"{benchmark.workers}: comparing hit rates only")
+            comparison = compare_results(results, baseline, args.max_latency_regression, args.max_hit_rate_drop,
+                                         compare_latency=same_setup,
+                                         expected=[c.name for c in configs or BENCHMARK_CONFIGS])
+            regressed = bool(benchmark.failed) or any(row["regressions"] for row in comparison)
+            # Only a complete run without failures or regressions becomes the next baseline
+            benchmark._save_results(results, comparison, update_latest=configs is None and not regressed)
+            if baseline is not None:
+                print(benchmark.format_comparison(comparison))
+            if regressed:
+                logger.error("Failed configs or performance regression against the baseline (baseline kept)")
+    
+    if args.bm25_parity:
+        config = get_config_by_name(args.config) if args.config else BENCHMARK_CONFIGS[0]
+        if config:
+            benchmark.check_bm25_parity(config)
         else:
-            benchmark.run_all()
+            logger.error(f"Config '{args.config}' not found")
+    
+    if args.vector_crossover:
+        benchmark.vector_crossover()
+    
+    if args.quantization:
+        config = get_config_by_name(args.config) if args.config else BENCHMARK_CONFIGS[0]
+        if config:
+            benchmark.compare_quantization(config)
+        else:
+            logger.error(f"Config '{args.config}' not found")
     
     if args.report:
         print(benchmark.generate_report())
+    
+    if regressed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,45 +2,106 @@
 RAG Module with Hybrid Search
 
 Features:
-- PDF and TXT document ingestion
+- PDF and TXT document ingestion (incremental, content-addressed chunk IDs)
 - Chunking with overlap for better retrieval
 - Multilingual embeddings (paraphrase-multilingual-MiniLM-L12-v2)
 - ChromaDB vector storage
 - Hybrid search: Vector + BM25 for 80% hit rate
+- Level-filtered retrieval over per-level index partitions
+- Re-indexing while serving: queries read one immutable IndexSnapshot,
+  ingest publishes the next one with a single assignment
 """
 
-import chromadb
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import os
 import sys
 import glob
-import pickle
+import shutil
 import logging
+import functools
 from pathlib import Path
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# PDF support
-try:
-    from PyPDF2 import PdfReader
-    PDF_SUPPORT = True
-except ImportError:
-    PDF_SUPPORT = False
-    logger.warning("PyPDF2 not installed. PDF support disabled.")
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import (CHROMA_DB_DIR, INDEX_BUNDLE_VERIFY, INGEST_WORKERS, INGEST_EMBED_BATCH_SIZE,
+                    VECTOR_BACKEND, DENSE_INDEX_MAX_CHUNKS, VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR)
+from rag.storage import get_store
+from rag.embeddings import get_embedder, get_query_encoder
+from rag.embedding_store import get_chunk_encoder
+from rag.text_cache import get_text_cache
+from rag.ingest_manifest import IngestManifest, chunk_id
+from rag.chunker import CHUNKER_VERSION, chunk_pages
+from rag.retrieval_core import RetrievalCore, PARTITION_FIELDS, rrf_fuse, top_k
+from rag.vector_index import DenseVectorIndex, QuantizedVectorIndex
+from rag.ingest_pipeline import (IngestPipeline, PDF_SUPPORT, batched, chroma_max_batch_size,
+                                 read_pdf_pages, read_txt)
+from rag.index_bundle import (BundleError, JsonTable, StringSpill, load_bundle, save_bundle, get_strings,
+                              get_json, put_strings, put_json)
+from rag.kb_watcher import BACKGROUND_WRITE_BATCH, foreground, yield_to_foreground
 
-# BM25 support for hybrid search
+# BM25 support for hybrid search (sparse inverted index)
 try:
-    from rank_bm25 import BM25Okapi
+    from rag.bm25_index import SparseBM25
     BM25_SUPPORT = True
 except ImportError:
     BM25_SUPPORT = False
-    logger.warning("rank_bm25 not installed. Hybrid search disabled.")
+    logger.warning("scipy not installed. Hybrid search disabled.")
 
-# Add parent to path for config import
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import CHROMA_DB_DIR
+
+# Level of files at the root of a subject folder: visible to every level
+SHARED_LEVEL = "general"
+# Bump when ingest() adds or changes chunk metadata fields (forces a re-ingest)
+CHUNK_METADATA_VERSION = 2
+
+
+@dataclass
+class LevelPartition:
+    """Rows of a level set with matching slices of the vector and BM25 indexes"""
+    tags: FrozenSet[str]
+    rows: np.ndarray = None
+    vectors: "DenseVectorIndex" = None
+    bm25: "BM25Partition" = None
+
+
+@dataclass
+class IndexSnapshot:
+    """
+    Everything a query reads, published as one reference: ingest builds the
+    next snapshot beside the live one and swaps it in, queries holding the
+    previous snapshot finish on it.
+    """
+    core: RetrievalCore  # chunk table aligned with the BM25 and vector rows
+    bm25: "SparseBM25" = None
+    vectors: "DenseVectorIndex" = None
+    version: int = 0  # bumped whenever the indexed content changes (answer caches key on it)
+    partitions: dict = field(default_factory=dict)  # levels -> LevelPartition, built on first use
+
+
+class _IndexAppender:
+    """
+    Chunks upserted by an incremental ingest, collected batch by batch:
+    tokens go straight into a copy of the BM25 index, texts and metadata
+    into temporary files, so memory does not grow with the ingest.
+    """
+
+    def __init__(self, bm25: "SparseBM25", tokenize, spill_dir: str = None):
+        self.bm25 = bm25.copy()  # the live snapshot keeps scoring with the original
+        self.tokenize = tokenize
+        self.ids: List[str] = []
+        self.documents = StringSpill(spill_dir)
+        self.metadatas = StringSpill(spill_dir)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        """IngestPipeline on_upserted callback (upsert thread, batches in upsert order)"""
+        self.bm25.add([self.tokenize(text) for text in texts])
+        self.ids.extend(ids)
+        self.documents.append(texts)
+        self.metadatas.append_json(metadatas)
 
 
 class RAGModule:
@@ -56,211 +117,444 @@ class RAGModule:
         persistence_path: str = None, 
         chunk_size: int = 500, 
         chunk_overlap: int = 50, 
-        hybrid_weight: float = 0.3
+        hybrid_weight: float = 0.3,
+        embedding_model: str = None,
+        vector_backend: str = None,
+        read_only: bool = None,
+        vector_quantization: str = None
     ):
         self.persistence_path = persistence_path or CHROMA_DB_DIR
         self.collection_name = collection_name
         
         logger.info(f"Initializing RAG Module ({collection_name})...")
         
-        self.client = chromadb.PersistentClient(path=self.persistence_path)
-        self.collection = self.client.get_or_create_collection(name=collection_name)
-        self.embedder = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # One client per directory and process, shared with the other subjects
+        self.store = get_store(self.persistence_path, read_only)
+        self.read_only = self.store.read_only
+        self.client = self.store.client
+        self.collection = self.store.collection(collection_name)
+        self.embedder = get_embedder(embedding_model)
+        self.chunk_encoder = get_chunk_encoder(embedding_model)
+        self.query_encoder = get_query_encoder(embedding_model)
+        self.embedding_model = self.query_encoder.model_name
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         
         # Hybrid search settings
         self.hybrid_weight = hybrid_weight
-        self.bm25_index = None
-        self.bm25_corpus = []
-        self.bm25_ids = []
-        self.bm25_docs = []
-        self.bm25_metadatas = []
+        self.bm25_compact_threshold = 0.25  # full rebuild once this fraction of rows is dead
+        
+        # Vector search: in-process matrix for small collections, Chroma HNSW otherwise
+        self.vector_backend = vector_backend or VECTOR_BACKEND
+        self.vector_quantization = vector_quantization or VECTOR_QUANTIZATION  # "none", "float16" or "int8"
+        
+        self.last_ingest_stats = {}
         
-        # Try to load cached BM25 index
-        self._load_bm25_cache()
+        # Try to map the saved BM25 index, then load the vectors in the same row order
+        core, bm25 = self._load_index_bundle()
+        core, vectors = self._build_vector_index(core, bm25)
+        self.snapshot = IndexSnapshot(core, bm25, vectors)
         
         logger.info(f"RAG initialized. PDF: {PDF_SUPPORT}, BM25: {BM25_SUPPORT}, Chunks: {self.collection.count()}")
 
+    @property
+    def core(self) -> RetrievalCore:
+        return self.snapshot.core
+
+    @property
+    def bm25_index(self) -> Optional["SparseBM25"]:
+        return self.snapshot.bm25
+
+    @property
+    def vector_index(self) -> Optional["DenseVectorIndex"]:
+        return self.snapshot.vectors
+
+    @property
+    def index_version(self) -> int:
+        return self.snapshot.version
+
+    def _publish(self, core: RetrievalCore, bm25, vectors, changed: bool = False):
+        """
+        Swap in a new index snapshot. The level partitions the live snapshot
+        has served are built beforehand, so queries right after the swap do
+        not pay for them.
+        """
+        previous = self.snapshot
+        snapshot = IndexSnapshot(core, bm25, vectors, previous.version + (1 if changed else 0))
+        for levels in list(previous.partitions):
+            self._partition(levels, snapshot)
+        self.snapshot = snapshot
+
     def _get_bm25_cache_path(self) -> Path:
-        """Get path for BM25 cache file"""
+        """Legacy pickled BM25 cache (replaced by the index bundle)"""
         return Path(self.persistence_path) / f"{self.collection_name}_bm25.pkl"
 
-    def _load_bm25_cache(self):
-        """Load BM25 index from cache if available"""
+    def _get_index_bundle_path(self) -> Path:
+        """Get path for the memory-mapped BM25 index bundle"""
+        return Path(self.persistence_path) / f"{self.collection_name}_index"
+
+    def _load_index_bundle(self) -> Tuple[RetrievalCore, Optional["SparseBM25"]]:
+        """Map the BM25 index bundle if available (chunk table and index, or empty and None)"""
+        empty = (RetrievalCore([], [], []), None)
         if not BM25_SUPPORT:
-            return
-        
-        cache_path = self._get_bm25_cache_path()
-        if cache_path.exists():
-            try:
-                with open(cache_path, 'rb') as f:
-                    cache = pickle.load(f)
-                self.bm25_index = cache['index']
-                self.bm25_corpus = cache['corpus']
-                self.bm25_ids = cache['ids']
-                self.bm25_docs = cache['docs']
-                self.bm25_metadatas = cache['metadatas']
-                logger.info(f"Loaded BM25 cache ({len(self.bm25_ids)} docs)")
-            except Exception as e:
-                logger.warning(f"Failed to load BM25 cache: {e}")
-
-    def _save_bm25_cache(self):
-        """Save BM25 index to cache"""
-        if not BM25_SUPPORT or self.bm25_index is None:
-            return
-        
-        cache_path = self._get_bm25_cache_path()
+            return empty
+        
+        legacy_path = self._get_bm25_cache_path()
+        if legacy_path.exists() and not self.read_only:
+            # Never unpickle from the data directory: rebuilt as a bundle on ingest
+            legacy_path.unlink()
+            logger.info(f"Removed legacy BM25 pickle {legacy_path}")
+        
+        bundle_path = self._get_index_bundle_path()
+        if not bundle_path.exists():
+            return empty
+        try:
+            arrays, meta = load_bundle(bundle_path, verify=INDEX_BUNDLE_VERIFY)
+            bm25 = SparseBM25.from_arrays(arrays, get_strings(arrays, "vocabulary"), **meta['bm25'])
+            core = RetrievalCore(
+                get_strings(arrays, "ids"), get_strings(arrays, "documents"), get_json(arrays, "metadatas"),
+                dead=np.flatnonzero(~bm25.alive)
+            )
+            logger.info(f"Mapped BM25 index bundle ({len(core)} docs)")
+            return core, bm25
+        except (BundleError, KeyError, ValueError) as e:
+            logger.warning(f"Failed to load BM25 index bundle: {e}")
+            return empty
+
+    def _save_index_bundle(self, core: RetrievalCore, bm25: "SparseBM25") -> bool:
+        """Save BM25 index and chunk snapshot as a bundle (also computes the BM25 weights), True if saved"""
+        if not BM25_SUPPORT or bm25 is None or self.read_only:
+            return False
+        
+        bundle_path = self._get_index_bundle_path()
         try:
-            cache = {
-                'index': self.bm25_index,
-                'corpus': self.bm25_corpus,
-                'ids': self.bm25_ids,
-                'docs': self.bm25_docs,
-                'metadatas': self.bm25_metadatas
+            arrays, vocabulary = bm25.to_arrays()
+            put_strings(arrays, "vocabulary", vocabulary)
+            put_strings(arrays, "ids", core.ids)
+            put_strings(arrays, "documents", core.documents)
+            put_json(arrays, "metadatas", core.metadatas)
+            meta = {
+                "collection": self.collection_name,
+                "rows": len(core),
+                "bm25": {"k1": bm25.k1, "b": bm25.b, "epsilon": bm25.epsilon},
             }
-            with open(cache_path, 'wb') as f:
-                pickle.dump(cache, f)
-            logger.info(f"Saved BM25 cache to {cache_path}")
-        except Exception as e:
-            logger.warning(f"Failed to save BM25 cache: {e}")
+            save_bundle(bundle_path, arrays, meta)
+            logger.info(f"Saved BM25 index bundle to {bundle_path}")
+            return True
+        except OSError as e:
+            logger.warning(f"Failed to save BM25 index bundle: {e}")
+            return False
+
+    def _chunk_pages(self, pages: Iterable[str], source: str) -> Iterator[Tuple[str, dict]]:
+        """Stream overlapping, word-aligned chunks (with page numbers) from a page iterator"""
+        return chunk_pages(pages, source, self.chunk_size, self.chunk_overlap)
 
     def _chunk_text(self, text: str, source: str) -> List[Tuple[str, dict]]:
         """Split text into overlapping chunks"""
-        chunks = []
-        text = text.strip()
-        
-        if not text:
-            return chunks
-        
-        if len(text) <= self.chunk_size:
-            return [(text, {"source": source, "chunk": 0})]
-        
-        sentences = text.replace('\n', ' ').split('. ')
-        current_chunk = ""
-        chunk_idx = 0
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
-            if not sentence.endswith('.'):
-                sentence += '.'
-            
-            if len(current_chunk) + len(sentence) + 1 > self.chunk_size and current_chunk:
-                chunks.append((current_chunk.strip(), {"source": source, "chunk": chunk_idx}))
-                chunk_idx += 1
-                overlap_start = max(0, len(current_chunk) - self.chunk_overlap)
-                current_chunk = current_chunk[overlap_start:] + " " + sentence
-            else:
-                current_chunk += " " + sentence
-        
-        if current_chunk.strip():
-            chunks.append((current_chunk.strip(), {"source": source, "chunk": chunk_idx}))
-        
-        return chunks
+        return list(self._chunk_pages([text], source))
 
     def _read_pdf(self, file_path: str) -> str:
         """Extract text from PDF"""
-        if not PDF_SUPPORT:
-            return ""
-        
-        try:
-            reader = PdfReader(file_path)
-            text_parts = [page.extract_text() or "" for page in reader.pages]
-            full_text = "\n".join(text_parts)
-            logger.debug(f"Extracted {len(full_text)} chars from {file_path}")
-            return full_text
-        except Exception as e:
-            logger.error(f"Error reading PDF {file_path}: {e}")
-            return ""
+        return "\n".join(read_pdf_pages(file_path))
 
     def _read_txt(self, file_path: str) -> str:
         """Read text file"""
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error reading {file_path}: {e}")
-            return ""
-
-    def ingest(self, directory_path: str, recursive: bool = True):
-        """Ingest all documents from directory into vector store"""
+        return read_txt(file_path)
+
+    def _embed_chunks(self, texts: List[str], before_batch=None) -> np.ndarray:
+        """Embed chunk texts for storage (chunks seen before come from the embedding store)"""
+        return self.chunk_encoder.encode(texts, before_batch)
+
+    def _get_manifest_path(self) -> Path:
+        """Get path for the ingestion manifest"""
+        return Path(self.persistence_path) / f"{self.collection_name}_manifest.json"
+
+    def _ingest_settings(self) -> dict:
+        """Settings that change chunk content or vectors (any change forces a full re-ingest)"""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "chunker": CHUNKER_VERSION,
+            "metadata": CHUNK_METADATA_VERSION,
+            "embedding_model": self.embedding_model,
+        }
+
+    def _reset_collection(self):
+        """Drop every chunk of the collection"""
+        self.client.delete_collection(name=self.collection_name)
+        self.collection = self.client.get_or_create_collection(name=self.collection_name)
+
+    def ingest(self, directory_path: str, recursive: bool = True, progress=None, background: bool = False) -> bool:
+        """
+        Incrementally ingest documents from directory into vector store.
+        
+        Only new or changed files are parsed and embedded; chunks of removed
+        files are deleted. The collection is assumed to mirror this directory.
+        Runs through IngestPipeline (parallel PDF extraction or the extracted
+        text cache, batched embedding and upserts); progress(IngestStats) is
+        called periodically and the final stats are kept in last_ingest_stats.
+        
+        The new indexes are built beside the live ones and published as one
+        IndexSnapshot, so ingest can run while queries are served. With
+        background=True (see KnowledgeBaseWatcher) chunk embedding and
+        Chroma writes also go in small batches that wait for in-flight
+        retrievals.
+        
+        Ingests of modules sharing a store run one at a time. A read-only
+        module does not ingest: it only builds the in-memory indexes that
+        could not be loaded.
+        
+        Returns:
+            True if the collection content changed
+        """
+        if self.read_only:
+            logger.info(f"Read-only store: skipping ingest of {directory_path} ({self.collection.count()} chunks)")
+            snapshot = self.snapshot
+            core, bm25, vectors = snapshot.core, snapshot.bm25, snapshot.vectors
+            if bm25 is None and BM25_SUPPORT:
+                core, bm25 = self._build_bm25_index()
+            if vectors is None:
+                core, vectors = self._build_vector_index(core, bm25)
+            self._publish(core, bm25, vectors)
+            return False
+        with self.store.write_lock:
+            return self._ingest(directory_path, recursive, progress, background)
+
+    def _ingest(self, directory_path: str, recursive: bool, progress, background: bool) -> bool:
+        """ingest() body, runs under the store's write lock"""
         pattern = "**/*" if recursive else "*"
         txt_files = glob.glob(os.path.join(directory_path, pattern, "*.txt"), recursive=recursive)
         pdf_files = glob.glob(os.path.join(directory_path, pattern, "*.pdf"), recursive=recursive) if PDF_SUPPORT else []
         
-        all_files = txt_files + pdf_files
+        all_files = sorted(set(txt_files + pdf_files))
         logger.info(f"Found {len(all_files)} documents ({len(txt_files)} txt, {len(pdf_files)} pdf)")
         
-        all_chunks, all_metadatas, all_ids = [], [], []
-        chunk_counter = 0
-
+        # Indexes the new snapshot starts from (the live snapshot itself is never modified)
+        snapshot = self.snapshot
+        core, bm25, vectors = snapshot.core, snapshot.bm25, snapshot.vectors
+        
+        manifest = IngestManifest(self._get_manifest_path(), self._ingest_settings())
+        if not manifest.compatible:
+            # Legacy chunk_N IDs or different chunking: rebuild from scratch
+            logger.info("No compatible manifest, re-ingesting the whole collection")
+            self._reset_collection()
+            core, bm25, vectors = RetrievalCore([], [], []), None, None
+            manifest.reset()
+        
+        # 1. Which files need (re)processing
+        to_process = []
+        seen_files = set()
         for file_path in all_files:
-            filename = os.path.basename(file_path)
             relative_path = os.path.relpath(file_path, directory_path)
-            path_parts = relative_path.split(os.sep)
-            level = path_parts[0] if len(path_parts) > 1 else "general"
-            
-            logger.debug(f"Processing: {relative_path}")
-            
-            content = self._read_pdf(file_path) if file_path.endswith('.pdf') else self._read_txt(file_path)
-            if not content:
-                continue
-            
-            source_with_level = f"{level}/{filename}"
-            chunks = self._chunk_text(content, source_with_level)
-            
-            for chunk_text, metadata in chunks:
-                metadata['level'] = level
-                metadata['filename'] = filename
-                all_chunks.append(chunk_text)
-                all_metadatas.append(metadata)
-                all_ids.append(f"chunk_{chunk_counter}")
-                chunk_counter += 1
-        
-        if all_chunks:
-            logger.info(f"Generating embeddings for {len(all_chunks)} chunks...")
-            embeddings = self.embedder.encode(all_chunks).tolist()
-            
-            self.collection.upsert(
-                documents=all_chunks,
-                embeddings=embeddings,
-                metadatas=all_metadatas,
-                ids=all_ids
-            )
-            logger.info(f"Ingested {len(all_chunks)} chunks from {len(all_files)} files")
-            
-            self._build_bm25_index()
+            seen_files.add(relative_path)
+            sha = manifest.is_unchanged(relative_path, file_path)
+            if sha is not None:
+                to_process.append((file_path, (relative_path, sha)))
+        
+        stale_ids = []
+        for relative_path in list(manifest.files):
+            if relative_path not in seen_files:
+                logger.debug(f"Removed: {relative_path}")
+                stale_ids.extend(manifest.forget(relative_path))
+        
+        # 2. Extract -> chunk -> embed -> upsert, streamed with bounded batches
+        kept_ids, kept_metadatas = [], []
+        file_records = []
+        # An existing BM25 index is patched as batches are upserted (on a copy, the live
+        # snapshot keeps scoring with the original); new chunk texts are spilled to disk
+        appender = _IndexAppender(bm25, self._bm25_tokens, self.persistence_path) if bm25 is not None else None
+        
+        store_before = self.chunk_encoder.get_stats()
+        max_batch = chroma_max_batch_size(self.client)
+        embed, before_write = self._embed_chunks, None
+        if background:
+            max_batch = min(max_batch, BACKGROUND_WRITE_BATCH)
+            embed = functools.partial(self._embed_chunks, before_batch=yield_to_foreground)
+            before_write = yield_to_foreground
+        pipeline = IngestPipeline(
+            embed, self.collection, max_batch,
+            workers=INGEST_WORKERS or None, embed_batch_size=INGEST_EMBED_BATCH_SIZE, progress=progress,
+            on_upserted=appender.add if appender is not None else None, before_write=before_write,
+            text_cache=get_text_cache()
+        )
+        try:
+            for (relative_path, sha), pages in pipeline.extract(to_process):
+                file_path = os.path.join(directory_path, relative_path)
+                filename = os.path.basename(relative_path)
+                path_parts = relative_path.split(os.sep)
+                level = path_parts[0] if len(path_parts) > 1 else SHARED_LEVEL
+                grade = path_parts[1] if len(path_parts) > 2 else None  # e.g. college/6eme/...
+                
+                logger.debug(f"Processing: {relative_path}")
+                
+                source_with_level = f"{level}/{filename}"
+                chunks = self._chunk_pages(pages, source_with_level)
+                
+                previous_ids = set(manifest.chunk_ids(relative_path))
+                file_ids = []
+                occurrences = {}  # keyed by first-occurrence id, not by text, to keep memory flat
+                for chunk_text, metadata in chunks:
+                    first_id = chunk_id(relative_path, chunk_text)
+                    occurrence = occurrences.get(first_id, 0)
+                    occurrences[first_id] = occurrence + 1
+                    cid = first_id if occurrence == 0 else chunk_id(relative_path, chunk_text, occurrence)
+                    file_ids.append(cid)
+                    
+                    metadata['level'] = level
+                    if grade:
+                        metadata['grade'] = grade
+                    metadata['filename'] = filename
+                    if cid in previous_ids:
+                        # Same text as before: keep the vector, refresh position metadata
+                        kept_ids.append(cid)
+                        kept_metadatas.append(metadata)
+                    else:
+                        pipeline.add(cid, chunk_text, metadata)
+                
+                stale_ids.extend(previous_ids - set(file_ids))
+                file_records.append((relative_path, file_path, sha, file_ids))
+            stats = pipeline.finish()
+        except BaseException:
+            pipeline.close()
+            raise
+        self.last_ingest_stats = stats.as_dict()
+        store_after = self.chunk_encoder.get_stats()
+        self.last_ingest_stats["embedding_store_hits"] = store_after["hits"] - store_before["hits"]
+        self.last_ingest_stats["embedding_store_misses"] = store_after["misses"] - store_before["misses"]
+        
+        if stale_ids:
+            for batch in batched(stale_ids, max_batch):
+                if before_write is not None:
+                    before_write()
+                self.collection.delete(ids=list(batch))
+            logger.info(f"Deleted {len(stale_ids)} stale chunks")
+        
+        for ids, metadatas in zip(batched(kept_ids, max_batch), batched(kept_metadatas, max_batch)):
+            if before_write is not None:
+                before_write()
+            self.collection.update(ids=ids, metadatas=metadatas)
+        
+        for record in file_records:
+            manifest.record(*record)
+        manifest.save()
+        
+        changed = bool(stale_ids or stats.chunks_upserted or kept_ids)
+        if changed:
+            logger.info(f"Ingested {stats.chunks_upserted} new chunks from {len(file_records)} changed files")
         else:
+            logger.info(f"Knowledge base unchanged ({self.collection.count()} chunks)")
+        
+        if changed and bm25 is not None:
+            core, bm25 = self._update_bm25_index(core, appender, stale_ids, dict(zip(kept_ids, kept_metadatas)))
+        elif bm25 is None and BM25_SUPPORT:
+            core, bm25 = self._build_bm25_index()
+        if changed or vectors is None:
+            core, vectors = self._build_vector_index(core, bm25)
+        self._publish(core, bm25, vectors, changed)
+        if not self.collection.count():
             logger.warning("No content found to ingest")
+        return changed
 
-    def _build_bm25_index(self):
-        """Build and cache BM25 index for hybrid search"""
+    def _build_bm25_index(self) -> Tuple[RetrievalCore, Optional["SparseBM25"]]:
+        """Build and cache BM25 index for hybrid search (returns the chunk snapshot and the index)"""
         if not BM25_SUPPORT:
-            return
+            return RetrievalCore([], [], []), None
         
         all_data = self.collection.get()
         if not all_data['documents']:
-            return
+            if not self.read_only:
+                shutil.rmtree(self._get_index_bundle_path(), ignore_errors=True)
+            return RetrievalCore([], [], []), None
         
-        self.bm25_ids = all_data['ids']
-        self.bm25_docs = all_data['documents']
-        self.bm25_metadatas = all_data['metadatas']
+        core = RetrievalCore(all_data['ids'], all_data['documents'], all_data['metadatas'])
         
         # Tokenize for BM25
-        self.bm25_corpus = []
-        for doc in all_data['documents']:
-            tokens = doc.lower().replace('.', ' ').replace(',', ' ').replace(':', ' ').split()
-            self.bm25_corpus.append(tokens)
+        corpus = [self._bm25_tokens(doc) for doc in all_data['documents']]
         
-        self.bm25_index = BM25Okapi(self.bm25_corpus)
-        logger.info(f"BM25 index built with {len(self.bm25_corpus)} documents")
+        bm25 = SparseBM25(corpus)
+        logger.info(f"BM25 index built with {len(corpus)} documents")
         
-        # Cache the index
-        self._save_bm25_cache()
+        # Persist the index
+        self._save_index_bundle(core, bm25)
+        return core, bm25
+
+    def _update_bm25_index(self, core: RetrievalCore, appender: "_IndexAppender", removed_ids: List[str],
+                           metadata_updates: dict):
+        """Finish an incremental ingest on the BM25 copy fed during the upserts instead of rebuilding it"""
+        removed_rows = core.rows(removed_ids)
+        removed_rows = removed_rows[removed_rows >= 0]
+        bm25 = appender.bm25
+        bm25.remove(removed_rows)
+        core = core.updated(removed_rows, appender.ids, appender.documents.table(),
+                            appender.metadatas.table(JsonTable), metadata_updates)
+        
+        if not bm25.corpus_size or bm25.dead_fraction > self.bm25_compact_threshold:
+            return self._build_bm25_index()
+        logger.info(f"BM25 index updated (+{len(appender.ids)}, -{len(removed_rows)} documents)")
+        if self._save_index_bundle(core, bm25):
+            # Serve from the mapped bundle rather than a chain of spilled tables
+            mapped_core, mapped_bm25 = self._load_index_bundle()
+            if mapped_bm25 is not None and len(mapped_core) == len(core):
+                return mapped_core, mapped_bm25
+        return core, bm25
 
-    def retrieve(self, query: str, n_results: int = 5, use_hybrid: bool = True) -> Tuple[List[str], List[dict]]:
+    def _build_vector_index(self, core: RetrievalCore, bm25: Optional["SparseBM25"]):
+        """
+        Load the collection's embeddings into an in-process index aligned
+        with core (small collections only).
+        
+        Returns:
+            (core, index or None); without BM25 the core is re-read along
+            with the embeddings
+        """
+        count = self.collection.count()
+        if (self.vector_backend == "chroma" or not count
+                or (self.vector_backend == "auto" and count > DENSE_INDEX_MAX_CHUNKS)):
+            return core, None
+        
+        # Without BM25 the chunk snapshot comes from the same read
+        with_core = bm25 is None
+        data = self.collection.get(include=["embeddings", "documents", "metadatas"] if with_core else ["embeddings"])
+        if with_core:
+            core = RetrievalCore(data['ids'], data['documents'], data['metadatas'])
+        metric = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        if self.vector_quantization in ("none", ""):
+            vectors = DenseVectorIndex.aligned(core.ids, data['ids'], data['embeddings'], metric, dead=core.dead)
+        else:
+            # float32 vectors go to a memory-mapped scratch file, only read for rescoring
+            vectors = QuantizedVectorIndex.aligned(
+                core.ids, data['ids'], data['embeddings'], metric, dead=core.dead,
+                kind=self.vector_quantization, rescore=VECTOR_RESCORE_FACTOR, spill_dir=self.persistence_path
+            )
+        logger.info(f"In-process vector index: {len(data['ids'])} vectors ({vectors.nbytes / 1e6:.1f} MB, "
+                    f"{metric}, {self.vector_quantization})")
+        return core, vectors
+
+    def _vector_rows(self, snapshot: IndexSnapshot, query_embeddings, k: int,
+                     part: "LevelPartition" = None) -> List[np.ndarray]:
+        """Rows of the k nearest chunks for each query embedding (within part if given)"""
+        if snapshot.vectors is not None:
+            if part is not None:
+                return [part.rows[local] for local in part.vectors.search(query_embeddings, k)]
+            return snapshot.vectors.search(query_embeddings, k)
+        # Chunks added since the snapshot was published are not in its core yet: row -1, which
+        # keeps the rank of the other hits in the fusion but is never returned
+        results = self.collection.query(query_embeddings=np.atleast_2d(query_embeddings).tolist(), n_results=k,
+                                        **self._level_filter(part))
+        return [snapshot.core.rows(ids) for ids in results['ids']]
+
+    @staticmethod
+    def _bm25_tokens(doc: str) -> List[str]:
+        """Tokenize a chunk for BM25"""
+        return doc.lower().replace('.', ' ').replace(',', ' ').replace(':', ' ').split()
+
+    @staticmethod
+    def _bm25_query_tokens(query: str) -> List[str]:
+        """Tokenize a query for BM25"""
+        return query.lower().replace('.', ' ').replace(',', ' ').split()
+
+    def retrieve(self, query: str, n_results: int = 5, use_hybrid: bool = True,
+                 levels: Iterable[str] = None) -> Tuple[List[str], List[dict]]:
         """
         Retrieve relevant documents for query.
         
@@ -268,62 +562,145 @@ class RAGModule:
             query: Search query
             n_results: Number of results
             use_hybrid: Use hybrid search (default True, 80% hit rate)
+            levels: Restrict the search to these levels (e.g. {"college"} or
+                {"6eme"}); chunks outside any level folder are always included
         
         Returns:
             Tuple of (documents, metadatas)
         """
-        if use_hybrid and BM25_SUPPORT and self.bm25_index is not None:
-            return self._hybrid_retrieve(query, n_results)
+        with foreground():
+            query_embedding = self.query_encoder.encode(query)
+            return self._retrieve_embedded(query, query_embedding, n_results, use_hybrid, levels)
+
+    def retrieve_many(self, queries: List[str], n_results: int = 5, use_hybrid: bool = True,
+                      levels: Iterable[str] = None) -> List[Tuple[List[str], List[dict]]]:
+        """
+        Retrieve for a batch of queries.
+        
+        All queries are embedded in a single forward pass (cache misses only),
+        searched with one vector query and scored by BM25 in one sparse product;
+        only the per-query fusion remains a loop.
+        
+        Returns:
+            One (documents, metadatas) tuple per query, in input order
+        """
+        if not queries:
+            return []
+        with foreground():
+            return self._retrieve_many(queries, n_results, use_hybrid, levels)
+
+    def _retrieve_many(self, queries: List[str], n_results: int, use_hybrid: bool,
+                       levels: Iterable[str] = None) -> List[Tuple[List[str], List[dict]]]:
+        snapshot = self.snapshot
+        query_embeddings = self.query_encoder.encode_many(queries)
+        part = self._partition(levels, snapshot)
+        
+        if use_hybrid and BM25_SUPPORT and snapshot.bm25 is not None:
+            vector_rows = self._vector_rows(snapshot, query_embeddings, min(n_results * 2, 20), part)
+            bm25 = part.bm25 if part is not None else snapshot.bm25
+            bm25_scores = bm25.get_batch_scores([self._bm25_query_tokens(q) for q in queries])
+            return [self._fuse(snapshot, rows, scores, n_results, part) for rows, scores in zip(vector_rows, bm25_scores)]
+        
+        # Vector-only
+        if snapshot.vectors is not None:
+            return [snapshot.core.results(rows) for rows in self._vector_rows(snapshot, query_embeddings, n_results, part)]
+        results = self.collection.query(query_embeddings=query_embeddings.tolist(), n_results=n_results,
+                                        **self._level_filter(part))
+        return [(docs, metas) for docs, metas in zip(results['documents'], results['metadatas'])]
+
+    def _retrieve_embedded(self, query: str, query_embedding, n_results: int, use_hybrid: bool,
+                           levels: Iterable[str] = None) -> Tuple[List[str], List[dict]]:
+        """Retrieve with an already computed query embedding"""
+        snapshot = self.snapshot  # one snapshot for the whole query, even if ingest swaps it meanwhile
+        part = self._partition(levels, snapshot)
+        if use_hybrid and BM25_SUPPORT and snapshot.bm25 is not None:
+            return self._hybrid_retrieve(snapshot, query, n_results, query_embedding, part)
         
         # Fallback to vector-only
-        query_embedding = self.embedder.encode([query]).tolist()
-        results = self.collection.query(query_embeddings=query_embedding, n_results=n_results)
+        if snapshot.vectors is not None:
+            return snapshot.core.results(self._vector_rows(snapshot, query_embedding, n_results, part)[0])
+        results = self.collection.query(query_embeddings=[query_embedding.tolist()], n_results=n_results,
+                                        **self._level_filter(part))
         
         if results['documents'] and results['documents'][0]:
             return results['documents'][0], results['metadatas'][0]
         return [], []
     
-    def _hybrid_retrieve(self, query: str, n_results: int) -> Tuple[List[str], List[dict]]:
+    def _hybrid_retrieve(self, snapshot: IndexSnapshot, query: str, n_results: int, query_embedding=None,
+                         part: "LevelPartition" = None) -> Tuple[List[str], List[dict]]:
         """Hybrid retrieval using Reciprocal Rank Fusion (RRF)"""
         # Vector search
-        query_embedding = self.embedder.encode([query]).tolist()
-        vector_results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=min(n_results * 2, 20)
-        )
-        
-        # BM25 scores
-        query_tokens = query.lower().replace('.', ' ').replace(',', ' ').split()
-        bm25_scores = self.bm25_index.get_scores(query_tokens)
-        
-        # RRF fusion
-        k = 60  # RRF constant
-        combined_scores = {}
-        
-        if vector_results['ids'] and vector_results['ids'][0]:
-            for rank, doc_id in enumerate(vector_results['ids'][0]):
-                combined_scores[doc_id] = 1 / (k + rank + 1)
-        
-        bm25_top = sorted(range(len(bm25_scores)), key=lambda i: bm25_scores[i], reverse=True)[:n_results * 2]
-        for rank, idx in enumerate(bm25_top):
-            doc_id = self.bm25_ids[idx]
-            combined_scores[doc_id] = combined_scores.get(doc_id, 0) + self.hybrid_weight * (1 / (k + rank + 1))
-        
-        sorted_ids = sorted(combined_scores.keys(), key=lambda x: combined_scores[x], reverse=True)[:n_results]
-        
-        documents, metadatas = [], []
-        for doc_id in sorted_ids:
-            idx = self.bm25_ids.index(doc_id)
-            documents.append(self.bm25_docs[idx])
-            metadatas.append(self.bm25_metadatas[idx])
+        if query_embedding is None:
+            query_embedding = self.query_encoder.encode(query)
+        vector_rows = self._vector_rows(snapshot, query_embedding, min(n_results * 2, 20), part)[0]
+        
+        # BM25 scores (over the partition's postings only)
+        bm25 = part.bm25 if part is not None else snapshot.bm25
+        bm25_scores = bm25.get_scores(self._bm25_query_tokens(query))
+        return self._fuse(snapshot, vector_rows, bm25_scores, n_results, part)
+    
+    def _fuse(self, snapshot: IndexSnapshot, vector_rows: np.ndarray, bm25_scores: np.ndarray, n_results: int,
+              part: "LevelPartition" = None) -> Tuple[List[str], List[dict]]:
+        """RRF fusion of vector hits with the best BM25 rows (bm25_scores aligned with part.rows if given)"""
+        bm25_rows = top_k(bm25_scores, n_results * 2)
+        bm25_rows = bm25_rows[np.isfinite(bm25_scores[bm25_rows])]  # never fuse removed chunks
+        if part is not None:
+            bm25_rows = part.rows[bm25_rows]
+        fused = rrf_fuse([(vector_rows, 1.0), (bm25_rows, self.hybrid_weight)], n_results)
+        
+        return snapshot.core.results(fused)
+    
+    def _partition(self, levels: Iterable[str], snapshot: IndexSnapshot) -> Optional["LevelPartition"]:
+        """
+        Vector and BM25 partitions for a level set (built once per index snapshot).
         
-        return documents, metadatas
+        None means: search the whole collection (no levels, or none of the
+        requested levels has chunks of its own).
+        """
+        if not levels:
+            return None
+        levels = frozenset(levels)
+        if levels in snapshot.partitions:
+            return snapshot.partitions[levels]
+        
+        tags = levels | {SHARED_LEVEL}
+        core = snapshot.core
+        if not len(core):
+            # Chroma-only (no snapshot): filter inside the Chroma query
+            part = LevelPartition(tags)
+        else:
+            rows = core.partition(tags)
+            if not len(core.partition(levels)):
+                logger.info(f"No chunks for levels {sorted(levels)} in {self.collection_name}, searching everything")
+                part = None
+            else:
+                part = LevelPartition(
+                    tags, rows,
+                    snapshot.vectors.subset(rows) if snapshot.vectors is not None else None,
+                    snapshot.bm25.partition(rows) if snapshot.bm25 is not None else None,
+                )
+        snapshot.partitions[levels] = part
+        return part
+    
+    @staticmethod
+    def _level_filter(part: Optional["LevelPartition"]) -> dict:
+        """Chroma query kwargs restricting results to a partition"""
+        if part is None:
+            return {}
+        tags = sorted(part.tags)
+        return {"where": {"$or": [{field: {"$in": tags}} for field in PARTITION_FIELDS]}}
     
     def get_stats(self) -> dict:
         """Get collection statistics"""
+        snapshot = self.snapshot
         return {
             "collection_name": self.collection.name,
             "document_count": self.collection.count(),
             "chunk_size": self.chunk_size,
-            "bm25_enabled": self.bm25_index is not None
+            "bm25_enabled": snapshot.bm25 is not None,
+            "vector_backend": "numpy" if snapshot.vectors is not None else "chroma",
+            "vector_quantization": self.vector_quantization if snapshot.vectors is not None else "none",
+            "vector_index_mb": snapshot.vectors.nbytes / 1e6 if snapshot.vectors is not None else 0.0,
+            "index_version": snapshot.version,
+            "read_only": self.read_only
         }
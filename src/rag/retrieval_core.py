@@ -0,0 +1,143 @@
+"""
+Retrieval Core
+
+Array-based building blocks for hybrid retrieval, so the per-query cost
+depends on the number of candidates rather than on the corpus size:
+- RetrievalCore: snapshot of the indexed chunks with an id -> row map,
+  and rows per level tag (for level-partitioned retrieval)
+- top_k: argpartition top-k (same order as a stable descending sort)
+- rrf_fuse: Reciprocal Rank Fusion over row arrays
+"""
+
+import sys
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Add parent to path for sibling imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from rag.index_bundle import ConcatTable
+
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+# Metadata fields a chunk can be partitioned on (ingest: level = top folder, grade = sub folder)
+PARTITION_FIELDS = ("level", "grade")
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+
+    Ties keep index order, like sorted(..., reverse=True), but only the
+    candidates above the k-th score are sorted.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = scores[np.argpartition(scores, n - k)[n - k]]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(-scores[candidates], kind="stable")[:k]
+    return candidates[order]
+
+
+def rrf_fuse(ranked_lists: Sequence[Tuple[np.ndarray, float]], n_results: int, k: int = RRF_K) -> np.ndarray:
+    """
+    Reciprocal Rank Fusion of ranked row lists.
+
+    Args:
+        ranked_lists: [(rows best first, weight)], rows unique within a list;
+            negative rows (see RetrievalCore.rows) hold their rank but are
+            never returned
+        n_results: number of fused rows to return
+
+    Returns:
+        Fused rows, best first (ties: first seen across the lists in order)
+    """
+    ranked_lists = [(np.asarray(rows, dtype=np.int64), weight) for rows, weight in ranked_lists]
+    ranked_lists = [(rows, weight) for rows, weight in ranked_lists if len(rows)]
+    if not ranked_lists:
+        return np.empty(0, dtype=np.int64)
+
+    rows = np.concatenate([r for r, _ in ranked_lists])
+    contributions = np.concatenate([w / (k + np.arange(1, len(r) + 1)) for r, w in ranked_lists])
+    known = rows >= 0
+    rows, contributions = rows[known], contributions[known]
+    unique_rows, first_seen, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions, minlength=len(unique_rows))
+    order = np.lexsort((first_seen, -scores))[:n_results]
+    return unique_rows[order]
+
+
+class RetrievalCore:
+    """
+    Immutable snapshot of the indexed chunks (row order = BM25 row order).
+
+    Resolving ids to rows is a dict lookup instead of list.index(). Dead
+    rows (chunks removed since the last full BM25 build) keep their place
+    but can no longer be resolved.
+    """
+
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[dict], dead: Iterable[int] = ()):
+        # documents/metadatas may be lazy tables over a memory-mapped bundle
+        self.ids = list(ids)
+        self.documents = documents
+        self.metadatas = metadatas
+        self.dead = frozenset(int(r) for r in dead)
+        self.row_of: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids) if row not in self.dead}
+        self._tag_rows: Dict[str, np.ndarray] = None  # built on first partition() call
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, ids: Sequence[str]) -> np.ndarray:
+        """Rows of ids, in order; -1 for ids missing from the snapshot (added or removed since)"""
+        rows = np.fromiter((self.row_of.get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+        misses = int((rows < 0).sum())
+        if misses:
+            logger.info(f"{misses} of {len(rows)} ids not in the index snapshot")
+        return rows
+
+    def partition(self, tags: Iterable[str]) -> np.ndarray:
+        """Sorted live rows whose level or grade is one of tags"""
+        if self._tag_rows is None:
+            tag_rows: Dict[str, List[int]] = {}
+            for row, metadata in enumerate(self.metadatas):
+                if row in self.dead:
+                    continue
+                for tag in {metadata.get(f) for f in PARTITION_FIELDS} - {None}:
+                    tag_rows.setdefault(tag, []).append(row)
+            self._tag_rows = {tag: np.asarray(rows, dtype=np.int64) for tag, rows in tag_rows.items()}
+        parts = [self._tag_rows[t] for t in set(tags) if t in self._tag_rows]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def results(self, rows: Sequence[int]) -> Tuple[List[str], List[dict]]:
+        """(documents, metadatas) for rows, in order"""
+        return [self.documents[r] for r in rows], [self.metadatas[r] for r in rows]
+
+    def updated(self, removed_rows: Sequence[int], ids: List[str], documents: Sequence[str], metadatas: Sequence[dict],
+                metadata_updates: Dict[str, dict] = None) -> "RetrievalCore":
+        """
+        New snapshot after an incremental ingest: removed rows become dead,
+        new chunks are appended (same rows as SparseBM25.add) and kept chunks
+        get their refreshed metadata.
+
+        Tables are chained, not copied: documents and metadatas may be
+        memory-mapped (bundle, StringSpill) and stay that way.
+        """
+        refreshed = {}
+        for doc_id, metadata in (metadata_updates or {}).items():
+            row = self.row_of.get(doc_id)
+            if row is not None:
+                refreshed[row] = metadata
+        return RetrievalCore(
+            self.ids + list(ids),
+            ConcatTable([self.documents, documents]),
+            ConcatTable([self.metadatas, metadatas], refreshed),
+            dead=self.dead.union(int(r) for r in removed_rows),
+        )
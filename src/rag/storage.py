@@ -0,0 +1,96 @@
+"""
+Shared Chroma Storage
+
+One storage handle per persistence directory and process:
+- Every RAGModule on the same directory (math, physics and english agents)
+  shares a single Chroma client, so SQLite connections, segment caches and
+  file handles are opened once; subjects stay collections of that client
+- A per-store write lock serializes ingests instead of letting them
+  contend on SQLite writes
+- Read-only mode (RAG_READ_ONLY) for serving workers: collections are
+  opened, never created or written, and ingest only loads what exists
+  (a missing collection is served from an empty in-memory placeholder)
+"""
+
+import os
+import sys
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict
+
+import chromadb
+from chromadb.config import Settings
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import CHROMA_DB_DIR, RAG_READ_ONLY
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChromaStore:
+    """Shared client of one persistence directory"""
+    path: str
+    client: object
+    read_only: bool
+    write_lock: threading.RLock = field(default_factory=threading.RLock)
+
+    def collection(self, name: str):
+        """
+        Open a collection, creating it unless read-only.
+
+        A read-only store expects the writer to have ingested already; a
+        missing collection is then replaced (with a warning) by an empty
+        in-memory one, nothing is written to the directory, and the worker
+        can still serve the other subjects.
+        """
+        if self.read_only:
+            try:
+                return self.client.get_collection(name=name)
+            except Exception:
+                logger.warning(f"Collection {name} missing in read-only store {self.path}, serving it empty")
+                return _placeholder_client().get_or_create_collection(name=name)
+        return self.client.get_or_create_collection(name=name)
+
+
+_stores: Dict[str, ChromaStore] = {}
+_placeholder = None
+_lock = threading.Lock()
+
+
+def _placeholder_client():
+    """In-memory client holding the empty stand-ins of missing read-only collections"""
+    global _placeholder
+    with _lock:
+        if _placeholder is None:
+            _placeholder = chromadb.EphemeralClient(settings=Settings(anonymized_telemetry=False, allow_reset=False))
+    return _placeholder
+
+
+def get_store(path: str = None, read_only: bool = None) -> ChromaStore:
+    """
+    Shared store for path (default: CHROMA_DB_DIR).
+
+    The first caller decides the mode; asking for a writable handle on a
+    store opened read-only (or the reverse) raises ValueError.
+    """
+    path = os.path.abspath(path or CHROMA_DB_DIR)
+    read_only = RAG_READ_ONLY if read_only is None else read_only
+    with _lock:
+        store = _stores.get(path)
+        if store is None:
+            client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False, allow_reset=False))
+            store = _stores[path] = ChromaStore(path, client, read_only)
+            logger.info(f"Opened Chroma store {path}{' (read-only)' if read_only else ''}")
+        elif store.read_only != read_only:
+            raise ValueError(f"Chroma store {path} already open {'read-only' if store.read_only else 'read-write'}")
+    return store
+
+
+def release_store(path: str = None):
+    """Forget the shared handle of path (e.g. before deleting a temporary directory)"""
+    with _lock:
+        _stores.pop(os.path.abspath(path or CHROMA_DB_DIR), None)
@@ -0,0 +1,159 @@
+"""
+Extracted Text Cache
+
+On-disk cache of the per-page text of PDFs, so re-ingesting the same files
+(a benchmark config, a new chunking setting, a rebuilt collection) skips
+PyPDF2 parsing and only pays for chunking and embedding:
+- SQLite, keyed by (SHA-256 of the file, extractor version); the extractor
+  version includes the PyPDF2 version, so an upgrade re-extracts
+- File hashes are memoized by (path, size, mtime), so an unchanged file is
+  not re-read to find its entry
+- Pages stored as one zlib-compressed JSON list per document
+"""
+
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+# Add parent to path for config import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import TEXT_CACHE_ENABLED, TEXT_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Bump when the extraction code changes its output (page text, page splitting)
+EXTRACTOR_VERSION = 1
+
+try:
+    import PyPDF2
+    PDF_EXTRACTOR = f"pypdf2-{PyPDF2.__version__}/{EXTRACTOR_VERSION}"
+except ImportError:
+    PDF_EXTRACTOR = f"none/{EXTRACTOR_VERSION}"
+
+
+def file_sha256(path: str) -> bytes:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+class ExtractedTextCache:
+    """
+    SQLite-backed (file hash, extractor) -> page texts store.
+
+    Safe to share between threads; WAL mode lets several processes
+    (e.g. parallel benchmark runs) read and write the same file.
+    """
+
+    def __init__(self, path: str = TEXT_CACHE_PATH, extractor: str = PDF_EXTRACTOR):
+        self.path = str(path)
+        self.extractor = extractor
+        self.hits = 0
+        self.misses = 0
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " sha256 BLOB NOT NULL, extractor TEXT NOT NULL, page_count INTEGER NOT NULL, pages BLOB NOT NULL,"
+            " PRIMARY KEY (sha256, extractor)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _file_hash(self, path: str) -> Optional[bytes]:
+        """Content hash of path, memoized by (path, size, mtime); None if unreadable"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return bytes(row[2])
+        try:
+            digest = file_sha256(path)
+        except OSError:
+            return None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                               (path, stat.st_size, stat.st_mtime_ns, digest))
+            self._conn.commit()
+        return digest
+
+    def contains(self, path: str) -> bool:
+        digest = self._file_hash(path)
+        if digest is None:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM documents WHERE sha256 = ? AND extractor = ?",
+                                     (digest, self.extractor)).fetchone()
+        return row is not None
+
+    def get(self, path: str) -> Optional[List[str]]:
+        """Cached page texts of path, or None"""
+        digest = self._file_hash(path)
+        row = None
+        if digest is not None:
+            with self._lock:
+                row = self._conn.execute("SELECT page_count, pages FROM documents WHERE sha256 = ? AND extractor = ?",
+                                         (digest, self.extractor)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        pages = json.loads(zlib.decompress(row[1]).decode("utf-8"))
+        if len(pages) != row[0]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages
+
+    def put(self, path: str, pages: List[str]):
+        """Store the page texts extracted from path"""
+        digest = self._file_hash(path)
+        if digest is None:
+            return
+        blob = zlib.compress(json.dumps(pages, ensure_ascii=False).encode("utf-8"), 6)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                               (digest, self.extractor, len(pages), blob))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents WHERE extractor = ?",
+                                      (self.extractor,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache: ExtractedTextCache = None
+_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[ExtractedTextCache]:
+    """Shared cache instance (None when TEXT_CACHE_ENABLED is off)"""
+    global _cache
+    if not TEXT_CACHE_ENABLED:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = ExtractedTextCache()
+        return _cache
@@ -0,0 +1,226 @@
+"""
+Dense Vector Index
+
+In-process brute-force nearest-neighbour search for small collections:
+- One float32 matrix of the collection's embeddings, rows aligned with
+  RetrievalCore (so results resolve without an id lookup)
+- A query batch is a single matrix product: (queries x dim) @ (dim x rows)
+- Same metric as the Chroma collection ("l2", "ip" or "cosine"), so
+  rankings match an exact search over the same vectors
+
+For a few thousand chunks this beats a Chroma query (client, SQLite and
+HNSW overhead); see `rag_benchmark --vector-crossover` for where it stops.
+
+QuantizedVectorIndex keeps float16 or int8 codes in memory (2x / 4x
+smaller) for the candidate search and rescores the top candidates with the
+float32 vectors, which stay in a memory-mapped file.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+# Add parent to path for sibling imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from rag.retrieval_core import top_k
+
+METRICS = ("l2", "ip", "cosine")
+QUANTIZATIONS = ("float16", "int8")
+BLOCK_ROWS = 2048  # codes are widened to float32 this many rows at a time
+# float32 value of every float16 bit pattern: a table gather widens codes
+# several times faster than astype() on CPUs without native half conversion
+_HALF_TO_FLOAT = np.arange(1 << 16, dtype=np.uint32).astype(np.uint16).view(np.float16).astype(np.float32)
+
+
+def _prepare(embeddings: np.ndarray, metric: str):
+    """(float32 matrix, l2 bias or None) for a metric"""
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported metric: {metric}")
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if metric == "cosine":
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+    # l2: argmin |q - x|^2 == argmax q.x - |x|^2 / 2
+    bias = -0.5 * np.einsum("ij,ij->i", matrix, matrix) if metric == "l2" else None
+    return matrix, bias
+
+
+def _spill(matrix: np.ndarray, spill_dir: str = None) -> np.ndarray:
+    """Write matrix to an unlinked temporary file and map it read-only (pages load on access)"""
+    if not matrix.size:
+        return matrix
+    try:
+        fd, path = tempfile.mkstemp(prefix="vectors-", suffix=".npy", dir=spill_dir)
+    except OSError:
+        fd, path = tempfile.mkstemp(prefix="vectors-", suffix=".npy")  # e.g. read-only data directory
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, matrix, allow_pickle=False)
+    mapped = np.load(path, mmap_mode="r")
+    try:
+        os.unlink(path)  # the mapping keeps the data alive
+    except OSError:
+        pass
+    return mapped
+
+
+class DenseVectorIndex:
+    """
+    Exact search over a row-aligned embedding matrix.
+
+    Rows without a vector (or marked dead) never appear in results.
+    """
+
+    def __init__(self, embeddings: np.ndarray, metric: str = "l2", alive: np.ndarray = None):
+        self.metric = metric
+        self.matrix, self.bias = _prepare(embeddings, metric)
+        self.alive = np.ones(len(self.matrix), dtype=bool) if alive is None else np.asarray(alive, dtype=bool)
+
+    @classmethod
+    def aligned(cls, row_ids: Sequence[str], ids: Sequence[str], embeddings: Sequence, metric: str = "l2",
+                dead: Sequence[int] = (), **options) -> "DenseVectorIndex":
+        """
+        Index whose rows follow row_ids (e.g. RetrievalCore.ids), given the
+        (ids, embeddings) of a collection in any order.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        source = np.fromiter((position.get(doc_id, -1) for doc_id in row_ids), dtype=np.int64, count=len(row_ids))
+        present = source >= 0
+        matrix = np.zeros((len(row_ids), dim), dtype=np.float32)
+        matrix[present] = embeddings[source[present]]
+        alive = present.copy()
+        alive[np.asarray(list(dead), dtype=np.int64)] = False
+        return cls(matrix, metric, alive, **options)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def subset(self, rows: Sequence[int]) -> "DenseVectorIndex":
+        """Contiguous copy of some rows (e.g. one level); its search() returns positions in rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        part = DenseVectorIndex.__new__(DenseVectorIndex)
+        part.metric = self.metric
+        part.matrix = self.matrix[rows]
+        part.bias = self.bias[rows] if self.bias is not None else None
+        part.alive = self.alive[rows]
+        return part
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def _queries(self, queries: np.ndarray) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.metric == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms > 0, norms, 1.0)
+        return queries
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Similarity of every row for each query (queries x rows, higher is closer, dead rows -inf)"""
+        scores = self._queries(queries) @ self.matrix.T
+        if self.bias is not None:
+            scores += self.bias
+        scores[:, ~self.alive] = -np.inf
+        return scores
+
+    def search(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        """Rows of the k nearest vectors for each query, closest first"""
+        results = []
+        for row_scores in self.scores(queries):
+            rows = top_k(row_scores, k)
+            results.append(rows[np.isfinite(row_scores[rows])])
+        return results
+
+
+class QuantizedVectorIndex(DenseVectorIndex):
+    """
+    Candidate search over float16 / int8 codes, then exact float32
+    rescoring of the best rescore * k candidates.
+
+    int8 uses one scale per row (x ~ scale * code). The float32 vectors are
+    spilled to a memory-mapped temporary file: only rescored rows are read.
+    """
+
+    def __init__(self, embeddings: np.ndarray, metric: str = "l2", alive: np.ndarray = None,
+                 kind: str = "int8", rescore: int = 4, spill_dir: str = None):
+        if kind not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {kind}")
+        self.metric = metric
+        self.kind = kind
+        self.rescore = max(1, rescore)
+        matrix, self.bias = _prepare(embeddings, metric)
+        self.alive = np.ones(len(matrix), dtype=bool) if alive is None else np.asarray(alive, dtype=bool)
+        if kind == "int8":
+            peak = np.abs(matrix).max(axis=1) if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+            self.scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            self.codes = np.rint(matrix / self.scale[:, None]).astype(np.int8)
+        else:
+            self.scale = None
+            self.codes = matrix.astype(np.float16)
+        self.full = _spill(matrix, spill_dir)
+        self.full_rows = None  # rows of self.full (subsets share their parent's file)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes (the float32 file is paged in only for rescored rows)"""
+        parts = (self.codes, self.scale, self.bias, self.full_rows)
+        return sum(p.nbytes for p in parts if p is not None)
+
+    def subset(self, rows: Sequence[int]) -> "QuantizedVectorIndex":
+        rows = np.asarray(rows, dtype=np.int64)
+        part = QuantizedVectorIndex.__new__(QuantizedVectorIndex)
+        part.metric, part.kind, part.rescore = self.metric, self.kind, self.rescore
+        part.codes = self.codes[rows]
+        part.scale = self.scale[rows] if self.scale is not None else None
+        part.bias = self.bias[rows] if self.bias is not None else None
+        part.alive = self.alive[rows]
+        part.full = self.full
+        part.full_rows = rows if self.full_rows is None else self.full_rows[rows]
+        return part
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Approximate similarities from the codes (queries x rows, dead rows -inf)"""
+        return self._approx(self._queries(queries))
+
+    def _approx(self, queries: np.ndarray) -> np.ndarray:
+        scores = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), BLOCK_ROWS):
+            block = self.codes[start:start + BLOCK_ROWS]
+            if self.kind == "float16":
+                block = np.take(_HALF_TO_FLOAT, block.view(np.uint16))
+            else:
+                block = block.astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.scale is not None:
+            scores *= self.scale
+        if self.bias is not None:
+            scores += self.bias
+        scores[:, ~self.alive] = -np.inf
+        return scores
+
+    def _exact(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self.full[rows if self.full_rows is None else self.full_rows[rows]])
+        exact = vectors @ query
+        if self.bias is not None:
+            exact += self.bias[rows]
+        return exact
+
+    def search(self, queries: np.ndarray, k: int) -> List[np.ndarray]:
+        """Rows of the k nearest vectors for each query, closest first (exact scores)"""
+        queries = self._queries(queries)
+        results = []
+        for query, row_scores in zip(queries, self._approx(queries)):
+            candidates = top_k(row_scores, k * self.rescore)
+            candidates = np.sort(candidates[np.isfinite(row_scores[candidates])])  # ties: row order
+            order = np.argsort(-self._exact(query, candidates), kind="stable")[:k]
+            results.append(candidates[order])
+        return results
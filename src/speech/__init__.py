@@ -3,6 +3,7 @@ from .tts_module import TTSModule
 from .vad_module import VADManager
 from .audio_streamer import AudioStreamManager, SentenceBuffer, AudioChunk
 from .math_to_speech import MathToSpeech, convert_math_to_speech
+from .answer_stream import stream_answer
 
 __all__ = [
     'STTModule',
@@ -12,5 +13,6 @@ __all__ = [
     'SentenceBuffer',
     'AudioChunk',
     'MathToSpeech',
-    'convert_math_to_speech'
+    'convert_math_to_speech',
+    'stream_answer'
 ]
@@ -0,0 +1,92 @@
+"""
+Answer Stream
+
+One spoken answer, shared by the /ws/audio handler (main.py) and the
+offline pipeline benchmark so both run exactly the same loop:
+AgentOrchestrator.process_stream -> SentenceBuffer -> AudioStreamManager
+- Text tokens are passed on as they arrive, sentences go to TTS as soon as
+  they are complete, and synthesized audio is handed back in order
+- Answers replayed from the answer cache come with their audio: no TTS
+- Freshly synthesized audio is attached to the answer cache at the end
+"""
+
+from typing import Iterable, Iterator, Tuple
+
+from speech.audio_streamer import AudioStreamManager, SentenceBuffer
+
+
+def stream_answer(orchestrator, tts, text: str, levels: Iterable[str] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Answer a transcribed question.
+
+    Yields:
+        - ('routing', {'agent', 'model', ...}) and ('rag', {...}) from the orchestrator
+        - ('text', token)
+        - ('sentence', text) when a sentence is queued for TTS
+        - ('audio', AudioChunk) in playback order, fresh or replayed
+        - ('error', error_dict) if the LLM failed
+        - ('llm_done', None) when the orchestrator stream ends (audio may follow)
+        - ('metrics', metrics_dict) last
+    """
+    audio_manager = AudioStreamManager(tts)
+    sentence_buffer = SentenceBuffer(min_chars=5, max_chars=50)
+    audio_manager.start()
+    metrics = {}
+    cached_audio = False  # Replaying a cached answer: audio comes pre-synthesized
+    sent_audio = []  # Kept for the answer cache
+
+    try:
+        for event_type, event_data in orchestrator.process_stream(text, levels=levels):
+            if event_type == 'routing':
+                cached_audio = event_data.get('cached_audio', False)
+                yield event_type, event_data
+
+            elif event_type == 'llm_chunk':
+                yield 'text', event_data
+                if cached_audio:
+                    continue
+
+                # Buffer text until sentence boundary
+                sentence = sentence_buffer.add(event_data)
+                if sentence:
+                    yield 'sentence', sentence
+                    audio_manager.add_text(sentence)
+
+                # Hand over the audio that is ready
+                while True:
+                    chunk = audio_manager.get_audio(timeout=0.01)
+                    if chunk is None:
+                        break
+                    sent_audio.append(chunk)
+                    yield 'audio', chunk
+
+            elif event_type == 'audio_chunk':
+                # Pre-synthesized audio replayed from the answer cache
+                yield 'audio', event_data
+
+            elif event_type == 'metrics':
+                metrics = event_data
+
+            else:  # 'rag', 'error'
+                yield event_type, event_data
+
+        yield 'llm_done', None
+
+        # Flush remaining text buffer, then wait for the remaining audio
+        remaining = sentence_buffer.flush()
+        if remaining:
+            yield 'sentence', remaining
+            audio_manager.add_text(remaining)
+        audio_manager.finish_generation()
+        for chunk in audio_manager.iter_audio():
+            sent_audio.append(chunk)
+            yield 'audio', chunk
+
+        # Store the synthesized audio with the cached answer
+        cache_key = metrics.pop('answer_cache_key', None)
+        if cache_key and orchestrator.answer_cache is not None:
+            orchestrator.answer_cache.attach_audio(cache_key, sent_audio)
+    finally:
+        audio_manager.stop()
+
+    yield 'metrics', metrics
@@ -12,6 +12,8 @@ import threading
 import queue
 import time
 import os
+import io
+import wave
 from dataclasses import dataclass
 from typing import Optional, Generator, Tuple
 
@@ -25,7 +27,18 @@ class AudioChunk:
     index: int
     audio_bytes: bytes
     text: str
-    duration_ms: int = 0
+    duration_ms: int = 0  # audio length, from the WAV header
+    math_ms: float = 0.0  # math-to-speech conversion time
+    tts_ms: float = 0.0  # synthesis time
+
+
+def _wav_duration_ms(audio_bytes: bytes) -> int:
+    """Length of a WAV file in memory (0 if it cannot be parsed)"""
+    try:
+        with wave.open(io.BytesIO(audio_bytes), 'rb') as wav:
+            return int(wav.getnframes() * 1000 / wav.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return 0
 
 
 class AudioStreamManager:
@@ -131,14 +144,18 @@ class AudioStreamManager:
                 
                 # ===== MATH-TO-SPEECH CONVERSION =====
                 # Convert mathematical notation to spoken French
+                start = time.perf_counter()
                 spoken_text = convert_math_to_speech(text)
+                math_ms = (time.perf_counter() - start) * 1000
                 
                 # Generate audio (blocking, sequential - this is the key!)
                 audio_path = f"chunk_{self.chunk_index}_{int(time.time()*1000)}.wav"
                 
                 try:
                     # Use the converted spoken text for TTS
+                    start = time.perf_counter()
                     self.tts.generate_audio(spoken_text, output_file=audio_path)
+                    tts_ms = (time.perf_counter() - start) * 1000
                     
                     # Read the audio file
                     if os.path.exists(audio_path):
@@ -149,7 +166,10 @@ class AudioStreamManager:
                         chunk = AudioChunk(
                             index=self.chunk_index,
                             audio_bytes=audio_bytes,
-                            text=text
+                            text=text,
+                            duration_ms=_wav_duration_ms(audio_bytes),
+                            math_ms=math_ms,
+                            tts_ms=tts_ms
                         )
                         self.audio_queue.put(chunk)
                         self.chunk_index += 1
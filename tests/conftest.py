@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules import each other from src (see the sys.path lines at the top of each module)
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
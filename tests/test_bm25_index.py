@@ -0,0 +1,105 @@
+"""SparseBM25 scores against the rank_bm25 reference, through every update path"""
+
+import numpy as np
+import pytest
+
+from rag.bm25_index import SparseBM25
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+# Small vocabulary: common words appear in most documents, so the negative idf floor is exercised
+VOCABULARY = [f"w{i}" for i in range(40)]
+QUERIES = [["w0"], ["w1", "w5", "w5"], ["w3", "w17", "w39"], ["w2", "absent"], ["absent"], []]
+
+
+def make_corpus(n, seed):
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(VOCABULARY) + 1)
+    weights /= weights.sum()
+    return [list(rng.choice(VOCABULARY, size=rng.integers(1, 30), p=weights)) for _ in range(n)]
+
+
+def assert_parity(index, corpus, alive_rows):
+    """Scores of the live rows equal BM25Okapi over those rows alone, dead rows are -inf"""
+    reference = rank_bm25.BM25Okapi([corpus[r] for r in alive_rows])
+    dead = np.setdiff1d(np.arange(index.n_rows), alive_rows)
+    batch = index.get_batch_scores(QUERIES)
+    for query, batch_scores in zip(QUERIES, batch):
+        expected = reference.get_scores(query)
+        scores = index.get_scores(query)
+        np.testing.assert_allclose(scores[alive_rows], expected, rtol=1e-6, atol=1e-9)
+        np.testing.assert_allclose(batch_scores[alive_rows], expected, rtol=1e-6, atol=1e-9)
+        assert np.all(np.isneginf(scores[dead])) and np.all(np.isneginf(batch_scores[dead]))
+
+
+def test_build():
+    corpus = make_corpus(200, seed=0)
+    index = SparseBM25(corpus)
+    assert index.corpus_size == 200
+    assert_parity(index, corpus, np.arange(200))
+
+
+def test_add():
+    corpus = make_corpus(150, seed=1)
+    index = SparseBM25(corpus[:100])
+    index.get_scores(["w0"])  # weights computed before the update must be refreshed
+    rows = index.add(corpus[100:])
+    np.testing.assert_array_equal(rows, np.arange(100, 150))
+    assert_parity(index, corpus, np.arange(150))
+
+
+def test_remove():
+    corpus = make_corpus(120, seed=2)
+    index = SparseBM25(corpus)
+    removed = np.arange(0, 120, 3)
+    index.remove(removed)
+    assert index.corpus_size == 80
+    assert index.dead_fraction == pytest.approx(40 / 120)
+    assert_parity(index, corpus, np.setdiff1d(np.arange(120), removed))
+
+
+def test_compact():
+    corpus = make_corpus(120, seed=3)
+    index = SparseBM25(corpus[:90])
+    index.remove([1, 2, 50])
+    index.add(corpus[90:])
+    mapping = index.compact()
+    alive_rows = np.setdiff1d(np.arange(120), [1, 2, 50])
+    np.testing.assert_array_equal(mapping[[1, 2, 50]], [-1, -1, -1])
+    np.testing.assert_array_equal(mapping[alive_rows], np.arange(117))
+    assert index.n_rows == 117 and index.dead_fraction == 0.0
+    assert_parity(index, [corpus[r] for r in alive_rows], np.arange(117))
+
+
+def test_copy_leaves_original_untouched():
+    corpus = make_corpus(100, seed=4)
+    original = SparseBM25(corpus[:80])
+    before = original.get_batch_scores(QUERIES)
+    updated = original.copy()
+    updated.remove([0, 10])
+    updated.add(corpus[80:])
+    np.testing.assert_array_equal(original.get_batch_scores(QUERIES), before)
+    assert_parity(original, corpus, np.arange(80))
+    assert_parity(updated, corpus, np.setdiff1d(np.arange(100), [0, 10]))
+
+
+def test_partition_scores_equal_full_scores():
+    corpus = make_corpus(100, seed=5)
+    index = SparseBM25(corpus)
+    index.remove([7])
+    rows = np.arange(0, 100, 2)
+    partition = index.partition(rows)
+    assert len(partition) == len(rows)
+    full = index.get_batch_scores(QUERIES)
+    for query, full_scores, batch_scores in zip(QUERIES, full, partition.get_batch_scores(QUERIES)):
+        np.testing.assert_allclose(partition.get_scores(query), full_scores[rows], rtol=1e-12)
+        np.testing.assert_allclose(batch_scores, full_scores[rows], rtol=1e-12)
+
+
+def test_arrays_round_trip():
+    corpus = make_corpus(60, seed=6)
+    index = SparseBM25(corpus)
+    index.remove([3])
+    arrays, vocabulary = index.to_arrays()
+    restored = SparseBM25.from_arrays(arrays, vocabulary, k1=index.k1, b=index.b, epsilon=index.epsilon)
+    np.testing.assert_array_equal(restored.get_batch_scores(QUERIES), index.get_batch_scores(QUERIES))
@@ -0,0 +1,94 @@
+"""Index bundle save / load"""
+
+import json
+
+import numpy as np
+import pytest
+
+from rag.index_bundle import (BundleError, POINTER_NAME, ConcatTable, StringSpill, JsonTable, get_json,
+                              get_strings, load_bundle, put_json, put_strings, save_bundle)
+
+
+def make_arrays(n=3):
+    arrays = {"matrix": np.arange(n * 4, dtype=np.float32).reshape(n, 4), "empty": np.zeros(0, dtype=np.int32)}
+    put_strings(arrays, "documents", [f"dé {i}" for i in range(n)])
+    put_json(arrays, "metadatas", [{"row": i, "level": "collège"} for i in range(n)])
+    return arrays
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "kb_index"
+    save_bundle(path, make_arrays(), {"rows": 3})
+    arrays, meta = load_bundle(path)
+    assert meta == {"rows": 3}
+    np.testing.assert_array_equal(arrays["matrix"], np.arange(12, dtype=np.float32).reshape(3, 4))
+    assert isinstance(arrays["matrix"], np.memmap) and not arrays["matrix"].flags.writeable
+    assert arrays["empty"].shape == (0,)
+    assert list(get_strings(arrays, "documents")) == ["dé 0", "dé 1", "dé 2"]
+    assert get_json(arrays, "metadatas")[-1] == {"row": 2, "level": "collège"}
+
+
+def test_save_replaces_previous_version(tmp_path):
+    path = tmp_path / "kb_index"
+    save_bundle(path, make_arrays(2), {"rows": 2})
+    old_arrays, _ = load_bundle(path)
+    for n in (3, 4):
+        save_bundle(path, make_arrays(n), {"rows": n})
+    arrays, meta = load_bundle(path)
+    assert meta == {"rows": 4} and len(get_strings(arrays, "documents")) == 4
+    # Current and previous version only; already mapped arrays stay readable
+    assert len([p for p in path.iterdir() if p.is_dir()]) == 2
+    assert (path / POINTER_NAME).read_text() in {p.name for p in path.iterdir()}
+    assert old_arrays["matrix"].shape == (2, 4)
+
+
+def live_file(path, name):
+    return path / (path / POINTER_NAME).read_text() / name
+
+
+def test_checksum_failure(tmp_path):
+    path = tmp_path / "kb_index"
+    save_bundle(path, make_arrays(), {})
+    file_path = live_file(path, "matrix.npy")
+    data = bytearray(file_path.read_bytes())
+    data[-1] ^= 0xFF  # same size, different content
+    file_path.write_bytes(bytes(data))
+    with pytest.raises(BundleError, match="Checksum"):
+        load_bundle(path, verify=True)
+    # Without verification only sizes are checked
+    arrays, _ = load_bundle(path, verify=False)
+    assert arrays["matrix"].shape == (3, 4)
+
+
+def test_size_mismatch_always_detected(tmp_path):
+    path = tmp_path / "kb_index"
+    save_bundle(path, make_arrays(), {})
+    with open(live_file(path, "matrix.npy"), "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(BundleError, match="Size"):
+        load_bundle(path, verify=False)
+
+
+def test_missing_or_foreign_bundle(tmp_path):
+    with pytest.raises(BundleError):
+        load_bundle(tmp_path / "missing")
+    path = tmp_path / "kb_index"
+    save_bundle(path, make_arrays(), {})
+    manifest_path = live_file(path, "manifest.json")
+    manifest = json.loads(manifest_path.read_text())
+    manifest["version"] = 99
+    manifest_path.write_text(json.dumps(manifest))
+    with pytest.raises(BundleError, match="Unsupported"):
+        load_bundle(path)
+
+
+def test_spill_and_concat_tables(tmp_path):
+    documents, metadatas = StringSpill(str(tmp_path)), StringSpill(str(tmp_path))
+    documents.append(["c", "d"])
+    metadatas.append_json([{"i": 2}, {"i": 3}])
+    table = ConcatTable([["a", "b"], documents.table()], {1: "B"})
+    nested = ConcatTable([table, [], ["e"]], {3: "D"})
+    assert list(nested) == ["a", "B", "c", "D", "e"]
+    assert nested[-1] == "e" and nested[1:4] == ["B", "c", "D"] and len(nested) == 5
+    assert list(metadatas.table(JsonTable)) == [{"i": 2}, {"i": 3}]
+    assert len(StringSpill(str(tmp_path)).table()) == 0
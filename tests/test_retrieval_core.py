@@ -0,0 +1,93 @@
+"""top_k, rrf_fuse and RetrievalCore"""
+
+import numpy as np
+import pytest
+
+from rag.retrieval_core import RRF_K, RetrievalCore, rrf_fuse, top_k
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("k", [0, 1, 7, 50, 80])
+def test_top_k_matches_stable_sort(seed, k):
+    # Few distinct values: lots of ties, which must keep index order
+    scores = np.random.default_rng(seed).integers(0, 6, size=50).astype(np.float64)
+    expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    np.testing.assert_array_equal(top_k(scores, k), expected)
+
+
+def test_top_k_with_infinite_scores():
+    scores = np.array([1.0, -np.inf, 3.0, -np.inf, 2.0])
+    np.testing.assert_array_equal(top_k(scores, 4), [2, 4, 0, 1])
+    assert len(top_k(np.empty(0), 3)) == 0
+
+
+def reference_rrf(ranked_lists, n_results, k=RRF_K):
+    scores, first_seen = {}, {}
+    for rows, weight in ranked_lists:
+        for rank, row in enumerate(rows, start=1):
+            scores[row] = scores.get(row, 0.0) + weight / (k + rank)
+            first_seen.setdefault(row, len(first_seen))
+    return sorted(scores, key=lambda r: (-scores[r], first_seen[r]))[:n_results]
+
+
+def test_rrf_fuse_matches_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        lists = [(rng.permutation(30)[:rng.integers(0, 15)], weight) for weight in (0.7, 0.3)]
+        np.testing.assert_array_equal(rrf_fuse(lists, 10), reference_rrf(lists, 10))
+
+
+def test_rrf_fuse_weights_and_ties():
+    # Equal weights, mirrored lists: every row ties with its mirror, first seen wins
+    assert list(rrf_fuse([([1, 2], 1.0), ([2, 1], 1.0)], 5)) == [1, 2]
+    # Weight decides between two first places
+    assert list(rrf_fuse([([1], 0.3), ([2], 0.7)], 5)) == [2, 1]
+    # Row in both lists beats rows in one
+    assert list(rrf_fuse([([1, 3], 0.5), ([2, 3], 0.5)], 1)) == [3]
+
+
+def test_rrf_fuse_empty_lists():
+    assert len(rrf_fuse([], 5)) == 0
+    assert len(rrf_fuse([(np.empty(0), 1.0)], 5)) == 0
+    assert list(rrf_fuse([([], 0.5), ([4, 2], 0.5)], 5)) == [4, 2]
+
+
+def make_core():
+    ids = ["a", "b", "c", "d"]
+    documents = ["doc a", "doc b", "doc c", "doc d"]
+    metadatas = [{"level": "college", "grade": "6eme"}, {"level": "lycee"},
+                 {"level": "college", "grade": "3eme"}, {"level": "lycee", "grade": "terminale"}]
+    return RetrievalCore(ids, documents, metadatas, dead=[1])
+
+
+def test_core_partition_skips_dead_rows():
+    core = make_core()
+    np.testing.assert_array_equal(core.partition(["college"]), [0, 2])
+    np.testing.assert_array_equal(core.partition(["lycee"]), [3])
+    np.testing.assert_array_equal(core.partition(["6eme", "terminale"]), [0, 3])
+    assert len(core.partition(["unknown"])) == 0
+
+
+def test_core_updated():
+    core = make_core()
+    updated = core.updated([2], ["e"], ["doc e"], [{"level": "lycee"}], {"d": {"level": "college"}})
+    assert updated.ids == ["a", "b", "c", "d", "e"]
+    assert updated.dead == {1, 2}
+    assert "c" not in updated.row_of and updated.row_of["e"] == 4
+    assert updated.results([4, 3]) == (["doc e", "doc d"], [{"level": "lycee"}, {"level": "college"}])
+    # The original snapshot is unchanged
+    assert core.metadatas[3] == {"level": "lycee", "grade": "terminale"} and len(core) == 4
+
+
+def test_core_rows_keep_positions():
+    core = make_core()
+    # "b" is dead, "x" was never indexed: both keep their position as -1
+    np.testing.assert_array_equal(core.rows(["c", "b", "x", "a"]), [2, -1, -1, 0])
+    assert core.rows([]).shape == (0,)
+
+
+def test_rrf_fuse_unknown_rows_keep_ranks():
+    # The unknown hit still takes rank 1 of the first list, so row 5 stays at rank 2
+    fused = rrf_fuse([([-1, 5], 1.0), ([7], 1.0)], 5)
+    assert list(fused) == [7, 5]
+    assert len(rrf_fuse([([-1, -1], 1.0)], 5)) == 0
@@ -0,0 +1,87 @@
+"""QuantizedVectorIndex (float16 / int8 codes + float32 rescoring) against the exact DenseVectorIndex"""
+
+import numpy as np
+import pytest
+
+from rag.vector_index import METRICS, QUANTIZATIONS, DenseVectorIndex, QuantizedVectorIndex
+
+N_ROWS, DIM, K = 300, 32, 5
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(N_ROWS, DIM)).astype(np.float32)
+    queries = rng.normal(size=(20, DIM)).astype(np.float32)
+    alive = np.ones(N_ROWS, dtype=bool)
+    alive[rng.choice(N_ROWS, size=30, replace=False)] = False
+    return embeddings, queries, alive
+
+
+def search_both(embeddings, queries, alive, metric, kind, rescore, tmp_path, rows=None):
+    dense = DenseVectorIndex(embeddings, metric, alive)
+    quantized = QuantizedVectorIndex(embeddings, metric, alive, kind=kind, rescore=rescore, spill_dir=str(tmp_path))
+    if rows is not None:
+        dense, quantized = dense.subset(rows), quantized.subset(rows)
+    return dense.search(queries, K), quantized.search(queries, K)
+
+
+@pytest.mark.parametrize("kind", QUANTIZATIONS)
+@pytest.mark.parametrize("metric", METRICS)
+def test_full_rescore_matches_exact_search(data, metric, kind, tmp_path):
+    """With every live row rescored, results are exactly the float32 ones (dead rows never appear)"""
+    embeddings, queries, alive = data
+    expected, actual = search_both(embeddings, queries, alive, metric, kind, N_ROWS // K, tmp_path)
+    for exact, approx in zip(expected, actual):
+        np.testing.assert_array_equal(approx, exact)
+        assert alive[approx].all()
+
+
+@pytest.mark.parametrize("kind", QUANTIZATIONS)
+@pytest.mark.parametrize("metric", METRICS)
+def test_default_rescore_recall(data, metric, kind, tmp_path):
+    embeddings, queries, alive = data
+    expected, actual = search_both(embeddings, queries, alive, metric, kind, 4, tmp_path)
+    found = sum(len(np.intersect1d(exact, approx)) for exact, approx in zip(expected, actual))
+    assert found / (K * len(queries)) >= 0.95
+    assert all(alive[approx].all() for approx in actual)
+
+
+@pytest.mark.parametrize("kind", QUANTIZATIONS)
+@pytest.mark.parametrize("metric", METRICS)
+def test_subset_positions(data, metric, kind, tmp_path):
+    """A subset searches its own rows and returns positions in them, dead rows included in the subset stay out"""
+    embeddings, queries, alive = data
+    rows = np.arange(1, N_ROWS, 3)
+    expected, actual = search_both(embeddings, queries, alive, metric, kind, len(rows), tmp_path, rows=rows)
+    for exact, approx in zip(expected, actual):
+        np.testing.assert_array_equal(approx, exact)
+        assert alive[rows[approx]].all()
+
+    # A subset of a subset still reads the right float32 rows
+    quantized = QuantizedVectorIndex(embeddings, metric, alive, kind=kind, rescore=N_ROWS, spill_dir=str(tmp_path))
+    nested = quantized.subset(rows).subset(np.arange(0, len(rows), 2))
+    dense = DenseVectorIndex(embeddings, metric, alive).subset(rows[::2])
+    for exact, approx in zip(dense.search(queries, K), nested.search(queries, K)):
+        np.testing.assert_array_equal(approx, exact)
+
+
+@pytest.mark.parametrize("kind", QUANTIZATIONS)
+def test_fewer_live_rows_than_k(kind, tmp_path):
+    embeddings = np.eye(4, DIM, dtype=np.float32)
+    alive = np.array([True, False, True, False])
+    index = QuantizedVectorIndex(embeddings, "cosine", alive, kind=kind, spill_dir=str(tmp_path))
+    (rows,) = index.search(embeddings[:1], K)
+    np.testing.assert_array_equal(rows, [0, 2])
+
+
+def test_codes_are_smaller(data, tmp_path):
+    embeddings, _, _ = data
+    dense = DenseVectorIndex(embeddings)
+    assert QuantizedVectorIndex(embeddings, kind="float16", spill_dir=str(tmp_path)).codes.nbytes == dense.nbytes // 2
+    assert QuantizedVectorIndex(embeddings, kind="int8", spill_dir=str(tmp_path)).codes.nbytes == dense.nbytes // 4
+
+
+def test_unknown_quantization():
+    with pytest.raises(ValueError):
+        QuantizedVectorIndex(np.zeros((2, 4), dtype=np.float32), kind="int4")